@@ -1,19 +1,17 @@
 import os
 import logging
-from openai import OpenAI
 from enum import Enum
 import json
 from datetime import datetime
+from llm_cache import cached_llm_call
+import llm_cache
+import ai_pool
+import providers
+import chunking
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
-ANTHROPIC_API_KEY = os.environ.get("ANTHROPIC_API_KEY")
-MISTRAL_API_KEY = os.environ.get("MISTRAL_API_KEY")
-
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
 
 class AIModel(Enum):
     GPT4O_MINI = "gpt-4o-mini"  # Lighter model for simple tasks
@@ -21,10 +19,16 @@ class AIModel(Enum):
     CLAUDE = "claude-2"  # Anthropic's model for alternative perspectives
     MISTRAL = "mistral-large"  # Mistral's model for additional insights
 
-def create_chain_prompt(content: str, previous_insights: list = None) -> str:
+def create_chain_prompt(content: str, previous_insights: list = None, previous_interactions: list = None) -> str:
     """Create a context-aware prompt incorporating previous insights."""
     base_prompt = f"Analyze this content: '{content}'\n\n"
     
+    if previous_interactions:
+        base_prompt += "Earlier conversation about this note:\n"
+        for interaction in previous_interactions:
+            base_prompt += f"- {interaction['model']}: {interaction['content']}\n"
+        base_prompt += "\nContinue from this conversation rather than repeating it.\n\n"
+    
     if previous_insights:
         base_prompt += "Previous AI insights:\n"
         for insight in previous_insights:
@@ -33,207 +37,425 @@ def create_chain_prompt(content: str, previous_insights: list = None) -> str:
     
     return base_prompt
 
-def chain_llm_responses(content: str, previous_interactions: list = None) -> dict:
+CHAIN_MODE = os.environ.get("AI_CHAIN_MODE", "parallel")  # 'parallel' or 'sequential'
+
+def _gpt4_chain_step(prompt: str) -> str:
+    return providers.complete("chain_step", [{"role": "user", "content": prompt}], AIModel.GPT4O.value, 500)
+
+def _perspective_step(model: str, prompt: str) -> str:
+    return providers.complete("chain_step", [{"role": "user", "content": prompt}], model, 500)
+
+def _perspective_models() -> list:
+    """Alternative-perspective models whose provider is configured."""
+    return providers.available_models([AIModel.CLAUDE.value, AIModel.MISTRAL.value])
+
+def stream_chat(prompt: str, model: str = AIModel.GPT4O.value, max_tokens: int = 500):
+    """Yield completion text deltas as they arrive from the routed provider."""
+    yield from providers.stream("stream", [{"role": "user", "content": prompt}], model, max_tokens)
+
+def create_merge_prompt(content: str, insights: list) -> str:
+    """Create a prompt that reconciles independent perspectives into one view."""
+    prompt = f"Content: '{content}'\n\nIndependent AI perspectives:\n"
+    for insight in insights:
+        prompt += f"- {insight['model']}: {insight['content']}\n"
+    prompt += "\nMerge these perspectives into one coherent analysis, noting agreements and disagreements.\n"
+    return prompt
+
+def chain_llm_responses(content: str, previous_interactions: list = None,
+                        mode: str = None, timeout: float = ai_pool.AI_CALL_TIMEOUT) -> dict:
     """Chain responses from multiple LLMs for comprehensive analysis."""
+    if (mode or CHAIN_MODE) == "parallel":
+        first = ai_pool.submit(_gpt4_chain_step, create_chain_prompt(content, [], previous_interactions))
+        return collect_parallel_chain(content, first, previous_interactions, timeout)
+
     insights = []
     
     # First analysis with GPT-4
-    gpt4_prompt = create_chain_prompt(content, insights)
-    gpt4_response = openai_client.chat.completions.create(
-        model=AIModel.GPT4O.value,
-        messages=[{"role": "user", "content": gpt4_prompt}],
-        max_tokens=500
-    )
+    gpt4_prompt = create_chain_prompt(content, insights, previous_interactions)
     insights.append({
         "model": "GPT-4",
-        "content": gpt4_response.choices[0].message.content
+        "content": _gpt4_chain_step(gpt4_prompt)
     })
     
     # Additional analysis with other models
-    models_to_use = [
-        (AIModel.CLAUDE.value, ANTHROPIC_API_KEY),
-        (AIModel.MISTRAL.value, MISTRAL_API_KEY)
-    ]
-    
-    for model, api_key in models_to_use:
-        if api_key:
-            prompt = create_chain_prompt(content, insights)
-            # Implement model-specific API calls here
-            # This is a placeholder for the actual implementation
-            insights.append({
-                "model": model,
-                "content": f"Analysis from {model}"  # Placeholder
-            })
+    for model in _perspective_models():
+        prompt = create_chain_prompt(content, insights, previous_interactions)
+        insights.append({
+            "model": model,
+            "content": _perspective_step(model, prompt)
+        })
     
-    return {"chain_response": insights}
+    return {"chain_response": insights, "errors": []}
 
+def collect_parallel_chain(content: str, first_step, previous_interactions: list = None,
+                           timeout: float = ai_pool.AI_CALL_TIMEOUT) -> dict:
+    """Finish a parallel chain whose first GPT-4 step is already running.
+
+    The other models run concurrently as independent perspectives on the
+    first step's insight, then one merge call reconciles them.  Failed or
+    slow calls are reported in ``errors`` and the rest is still returned.
+    """
+    insights, errors = [], []
+
+    result, error = ai_pool.collect(first_step, timeout)
+    if error:
+        errors.append({"model": "GPT-4", "error": error})
+    else:
+        insights.append({"model": "GPT-4", "content": result})
+
+    perspective_prompt = create_chain_prompt(content, insights, previous_interactions)
+    futures = [(model, ai_pool.submit(_perspective_step, model, perspective_prompt))
+               for model in _perspective_models()]
+    perspectives = []
+    for model, future in futures:
+        result, error = ai_pool.collect(future, timeout)
+        if error:
+            errors.append({"model": model, "error": error})
+        else:
+            perspectives.append({"model": model, "content": result})
+    insights.extend(perspectives)
+
+    if perspectives and len(insights) > 1:
+        merge = ai_pool.submit(_gpt4_chain_step, create_merge_prompt(content, insights))
+        result, error = ai_pool.collect(merge, timeout)
+        if error:
+            errors.append({"model": "GPT-4 (merge)", "error": error})
+        else:
+            insights.append({"model": "GPT-4 (merge)", "content": result})
+
+    return {"chain_response": insights, "errors": errors}
+
+@cached_llm_call("get_note_suggestions")
 def get_note_suggestions(content: str, model: str = AIModel.GPT4O_MINI.value) -> str:
     prompt = f"Based on this note content: '{content}', suggest improvements and related topics."
-    response = openai_client.chat.completions.create(
-        model=model,
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=100
-    )
-    return response.choices[0].message.content
+    return providers.complete("get_note_suggestions", [{"role": "user", "content": prompt}], model, 100)
 
+@cached_llm_call("categorize_note")
 def categorize_note(content: str, model: str = AIModel.GPT4O_MINI.value) -> str:
     prompt = f"Categorize this note content into one word: '{content}'"
-    response = openai_client.chat.completions.create(
-        model=model,
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=20
-    )
-    return response.choices[0].message.content.strip()
+    return providers.complete("categorize_note", [{"role": "user", "content": prompt}], model, 20).strip()
 
+@cached_llm_call("suggest_tags")
 def suggest_tags(content: str, model: str = AIModel.GPT4O_MINI.value) -> list:
     prompt = f"Extract 3-5 relevant single-word tags from this note content. Return only the tags separated by commas: '{content}'"
-    response = openai_client.chat.completions.create(
-        model=model,
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=50
-    )
-    tags = [tag.strip() for tag in response.choices[0].message.content.split(',')]
+    text = providers.complete("suggest_tags", [{"role": "user", "content": prompt}], model, 50)
+    tags = [tag.strip() for tag in text.split(',')]
     return tags[:5]  # Ensure we don't exceed 5 tags
 
+def _ask(task: str, prompt: str, model: str, max_tokens: int) -> str:
+    return providers.complete(task, [{"role": "user", "content": prompt}], model, max_tokens)
+
+@cached_llm_call("enhance_note", version=2)
 def enhance_note(content: str, model: str = AIModel.GPT4O.value) -> str:
-    prompt = f"Enhance this note by improving grammar and clarity: '{content}'"
-    response = openai_client.chat.completions.create(
-        model=model,
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=200
-    )
-    return response.choices[0].message.content
+    """Improve grammar and clarity; long notes are rewritten chunk by chunk, concurrently."""
+    tokens = chunking.count_tokens(content, model)
+    model = chunking.choose_model(model, tokens)
+    if not chunking.needs_chunking(tokens):
+        prompt = f"Enhance this note by improving grammar and clarity: '{content}'"
+        return _ask("enhance_note", prompt, model, chunking.output_budget(tokens, 1.3, 200, 4096))
+
+    # Chunks are rewritten independently and joined, so they must not overlap.
+    chunks = chunking.split(content, model, overlap_tokens=0)
+
+    def enhance_chunk(chunk, index, total):
+        prompt = (f"This is part {index + 1} of {total} of a longer note. Enhance it by improving grammar "
+                  f"and clarity. Return only the rewritten part: '{chunk}'")
+        budget = chunking.output_budget(chunking.count_tokens(chunk, model), 1.3, 200, 4096)
+        return _ask("enhance_note", prompt, model, budget)
 
+    return "\n\n".join(chunking.map_concurrent(enhance_chunk, chunks))
+
+@cached_llm_call("summarize_note", version=2)
 def summarize_note(content: str, model: str = AIModel.GPT4O.value) -> str:
-    prompt = f"Provide a concise summary of this note content in 2-3 sentences: '{content}'"
-    response = openai_client.chat.completions.create(
-        model=model,
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=100
-    )
-    return response.choices[0].message.content
+    """Summarize in 2-3 sentences; long notes are summarized per chunk and then combined."""
+    tokens = chunking.count_tokens(content, model)
+    model = chunking.choose_model(model, tokens)
+    if not chunking.needs_chunking(tokens):
+        prompt = f"Provide a concise summary of this note content in 2-3 sentences: '{content}'"
+        return _ask("summarize_note", prompt, model, 100)
 
-def expand_idea(content: str, model: str = AIModel.GPT4O.value) -> dict:
-    """Expand an idea with detailed analysis and related concepts."""
-    prompt = f"""Analyze and expand this idea in detail. Provide:
+    def summarize_chunk(chunk, index, total):
+        prompt = (f"Summarize part {index + 1} of {total} of a longer note in 3-5 sentences, "
+                  f"keeping names, figures and conclusions: '{chunk}'")
+        return _ask("summarize_note", prompt, model, 200)
+
+    def combine(parts):
+        numbered = "\n".join(f"{i + 1}. {part}" for i, part in enumerate(parts))
+        prompt = ("These are summaries of consecutive parts of one note. Combine them into a concise "
+                  f"summary of the whole note in 2-3 sentences:\n{numbered}")
+        return _ask("summarize_note", prompt, model, 150)
+
+    return chunking.map_reduce(content, model, summarize_chunk, combine)
+
+def expand_idea_prompt(content: str) -> str:
+    return f"""Analyze and expand this idea in detail. Provide:
     1. Main concept explanation
     2. Key implications
     3. Potential applications
     4. Related concepts
     5. Possible challenges
     Idea: '{content}'"""
+
+@cached_llm_call("expand_idea", version=2)
+def expand_idea(content: str, model: str = AIModel.GPT4O.value) -> dict:
+    """Expand an idea with detailed analysis and related concepts."""
+    prompt = expand_idea_prompt(content)
     
-    response = openai_client.chat.completions.create(
-        model=model,
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=500
-    )
-    return {"expanded": response.choices[0].message.content}
+    model = chunking.choose_model(model, chunking.count_tokens(content, model))
+    text = providers.complete("expand_idea", [{"role": "user", "content": prompt}], model, 500)
+    return {"expanded": text}
 
-def analyze_concept(content: str, model: str = AIModel.GPT4O.value) -> dict:
-    """Provide deep analysis of a concept or idea."""
-    prompt = f"""Perform a comprehensive analysis of this concept:
+def analyze_concept_prompt(content: str) -> str:
+    return f"""Perform a comprehensive analysis of this concept:
     1. Core components
     2. Underlying principles
     3. Real-world applications
     4. Advantages and limitations
     5. Innovation potential
     Concept: '{content}'"""
-    
-    response = openai_client.chat.completions.create(
-        model=model,
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=400
-    )
-    return {"analysis": response.choices[0].message.content}
 
-def generate_related_ideas(content: str, model: str = AIModel.GPT4O.value) -> dict:
-    """Generate related ideas and concepts for brainstorming."""
-    prompt = f"""Generate 5 related ideas or concepts that could expand or complement this thought:
+@cached_llm_call("analyze_concept", version=2)
+def analyze_concept(content: str, model: str = AIModel.GPT4O.value) -> dict:
+    """Provide deep analysis of a concept or idea; long notes are map-reduced over chunks."""
+    tokens = chunking.count_tokens(content, model)
+    model = chunking.choose_model(model, tokens)
+    if not chunking.needs_chunking(tokens):
+        return {"analysis": _ask("analyze_concept", analyze_concept_prompt(content), model, 400)}
+
+    def extract(chunk, index, total):
+        prompt = (f"This is part {index + 1} of {total} of a longer note. List its key points about the "
+                  f"concept's components, principles, applications, advantages, limitations and "
+                  f"innovation potential as concise bullets: '{chunk}'")
+        return _ask("analyze_concept", prompt, model, 300)
+
+    def combine(parts):
+        return _ask("analyze_concept", analyze_concept_prompt("\n\n".join(parts)), model, 600)
+
+    return {"analysis": chunking.map_reduce(content, model, extract, combine)}
+
+def related_ideas_prompt(content: str) -> str:
+    return f"""Generate 5 related ideas or concepts that could expand or complement this thought:
     1. Direct extensions
     2. Alternative approaches
     3. Complementary concepts
     4. Innovative applications
     5. Future possibilities
     Original idea: '{content}'"""
+
+@cached_llm_call("generate_related_ideas", version=2)
+def generate_related_ideas(content: str, model: str = AIModel.GPT4O.value) -> dict:
+    """Generate related ideas and concepts for brainstorming."""
+    prompt = related_ideas_prompt(content)
     
-    response = openai_client.chat.completions.create(
-        model=model,
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=300
-    )
-    return {"related_ideas": response.choices[0].message.content}
+    model = chunking.choose_model(model, chunking.count_tokens(content, model))
+    text = providers.complete("generate_related_ideas", [{"role": "user", "content": prompt}], model, 300)
+    return {"related_ideas": text}
 
-def create_mind_map_suggestions(content: str, model: str = AIModel.GPT4O.value) -> dict:
-    """Generate mind map structure suggestions for the given content."""
-    prompt = f"""Create a mind map structure for this concept with:
+def mind_map_prompt(content: str) -> str:
+    return f"""Create a mind map structure for this concept with:
     1. Central theme
     2. Main branches (4-6)
     3. Sub-branches (2-3 per main branch)
     4. Key connections
     5. Growth directions
     Content: '{content}'"""
+
+@cached_llm_call("create_mind_map_suggestions", version=2)
+def create_mind_map_suggestions(content: str, model: str = AIModel.GPT4O.value) -> dict:
+    """Generate mind map structure suggestions for the given content."""
+    prompt = mind_map_prompt(content)
     
-    response = openai_client.chat.completions.create(
-        model=model,
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=400
+    model = chunking.choose_model(model, chunking.count_tokens(content, model))
+    text = providers.complete("create_mind_map_suggestions", [{"role": "user", "content": prompt}], model, 400)
+    return {"mind_map": text}
+
+BATCH_NOTE_CHARS = 1500  # Per-note excerpt length for batch classification
+
+def categorize_notes_batch(contents: list, model: str = AIModel.GPT4O_MINI.value) -> list:
+    """Categorize and tag several notes in one call.
+
+    Returns one ``{"category": str, "tags": list}`` dict per input, in order;
+    entries the model skipped come back empty.
+    """
+    numbered = "\n\n".join(
+        f"Note {i}:\n{content[:BATCH_NOTE_CHARS]}" for i, content in enumerate(contents)
+    )
+    prompt = f"""For each note below, give a one-word category and 3-5 relevant single-word tags.
+    Respond with a JSON object of the form
+    {{"results": [{{"index": 0, "category": "...", "tags": ["...", "..."]}}]}}
+    with one entry per note.
+
+    {numbered}"""
+    text = providers.complete("categorize_notes_batch", [{"role": "user", "content": prompt}], model,
+                              60 * len(contents) + 50, response_format={"type": "json_object"})
+    results = [{"category": "", "tags": []} for _ in contents]
+    try:
+        parsed = json.loads(text)
+    except (TypeError, ValueError):
+        logger.warning("Batch categorization returned invalid JSON")
+        return results
+    for item in parsed.get("results", []):
+        index = item.get("index")
+        if isinstance(index, int) and 0 <= index < len(contents):
+            results[index] = {
+                "category": str(item.get("category", "")).strip()[:50],
+                "tags": [str(tag).strip() for tag in item.get("tags", []) if str(tag).strip()][:5]
+            }
+    return results
+
+# JSON schema for the combined analysis; also sent to the API as a strict
+# structured-output format so the model cannot return anything else.
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "category": {"type": "string"},
+        "tags": {"type": "array", "items": {"type": "string"}},
+        "summary": {"type": "string"},
+        "suggestions": {"type": "string"}
+    },
+    "required": ["category", "tags", "summary", "suggestions"],
+    "additionalProperties": False
+}
+
+class AnalysisError(ValueError):
+    """Raised when the combined analysis does not match ``ANALYSIS_SCHEMA``."""
+
+def validate_analysis(data) -> dict:
+    """Check ``data`` against ``ANALYSIS_SCHEMA`` and return a cleaned copy."""
+    if not isinstance(data, dict):
+        raise AnalysisError("Analysis must be a JSON object")
+    missing = [key for key in ANALYSIS_SCHEMA["required"] if key not in data]
+    if missing:
+        raise AnalysisError(f"Analysis is missing: {', '.join(missing)}")
+    for key, spec in ANALYSIS_SCHEMA["properties"].items():
+        value = data[key]
+        if spec["type"] == "string" and not isinstance(value, str):
+            raise AnalysisError(f"Analysis field '{key}' must be a string")
+        if spec["type"] == "array" and not (isinstance(value, list) and all(isinstance(item, str) for item in value)):
+            raise AnalysisError(f"Analysis field '{key}' must be a list of strings")
+    return {
+        "category": data["category"].strip().split()[0][:50] if data["category"].strip() else "",
+        "tags": [tag.strip() for tag in data["tags"] if tag.strip()][:5],
+        "summary": data["summary"].strip(),
+        "suggestions": data["suggestions"].strip()
+    }
+
+@cached_llm_call("analyze_note")
+def analyze_note(content: str, model: str = AIModel.GPT4O_MINI.value) -> dict:
+    """Categorize, tag, summarize and suggest improvements in one call.
+
+    The parts are also written to the caches of ``categorize_note``,
+    ``suggest_tags``, ``summarize_note`` and ``get_note_suggestions`` for the
+    same content and model, so those routes answer without another call.
+    """
+    prompt = f"""Analyze this note and respond in JSON with:
+    - "category": one word describing the note
+    - "tags": 3-5 relevant single-word tags
+    - "summary": a concise summary in 2-3 sentences
+    - "suggestions": suggested improvements and related topics, in a few sentences
+    Note: '{content}'"""
+    text = providers.complete("analyze_note", [{"role": "user", "content": prompt}], model, 400, response_format={
+        "type": "json_schema",
+        "json_schema": {"name": "note_analysis", "schema": ANALYSIS_SCHEMA, "strict": True}
+    })
+    try:
+        parsed = json.loads(text)
+    except (TypeError, ValueError):
+        raise AnalysisError("Analysis response was not valid JSON")
+    analysis = validate_analysis(parsed)
+    fan_out_analysis(content, model, analysis)
+    return analysis
+
+def fan_out_analysis(content: str, model: str, analysis: dict):
+    """Seed the single-task helper caches from a combined analysis."""
+    parts = (
+        (categorize_note, "categorize_note", analysis["category"]),
+        (suggest_tags, "suggest_tags", analysis["tags"]),
+        (summarize_note, "summarize_note", analysis["summary"]),
+        (get_note_suggestions, "get_note_suggestions", analysis["suggestions"]),
     )
-    return {"mind_map": response.choices[0].message.content}
+    for helper, name, value in parts:
+        if value:
+            llm_cache.store(helper.cache_key(content, model), name, model, value)
+
+def cached_analysis(content: str, model: str = AIModel.GPT4O_MINI.value):
+    """Return a previously computed analysis for ``content``, without calling the API."""
+    hit, value = llm_cache.lookup(analyze_note.cache_key(content, model))
+    return value if hit else None
 
 def transcribe_audio(audio_path: str) -> str:
+    """Return the transcript of ``audio_path``, or an empty string on failure."""
+    result = transcribe_audio_segments(audio_path)
+    return result["text"] if result else ""
+
+def transcribe_audio_segments(audio_path: str):
+    """Return ``{'text', 'segments', 'errors'}`` for ``audio_path``, or None on failure.
+
+    Long recordings are split at pauses and transcribed in parallel; see
+    ``transcription.py``.
+    """
+    from transcription import transcribe_file
+
     if not os.path.exists(audio_path):
         logger.error(f"Audio file not found at path: {audio_path}")
-        return ""
-        
+        return None
+
     try:
         file_size = os.path.getsize(audio_path)
         logger.info(f"Processing audio file of size: {file_size} bytes")
-        
-        with open(audio_path, "rb") as audio_file:
-            response = openai_client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                language="en",
-                response_format="text",
-                temperature=0.2
-            )
-            
-        if not response:
+
+        result = transcribe_file(audio_path)
+        if not result["text"]:
             logger.warning("Transcription returned empty text")
-            return ""
-            
-        logger.info(f"Transcription successful: {response[:100]}...")
-        return response
-        
+            return None
+
+        logger.info(f"Transcription successful: {result['text'][:100]}...")
+        return result
+
     except Exception as e:
         logger.error(f"Error in transcription: {str(e)}", exc_info=True)
-        return ""
+        return None
+
+def _run_with_chain(base_fn, content: str, previous_interactions: list = None,
+                    mode: str = None, timeout: float = ai_pool.AI_CALL_TIMEOUT):
+    """Run ``base_fn`` alongside the chain, overlapping it with the first chain step."""
+    if (mode or CHAIN_MODE) != "parallel":
+        return base_fn(content), chain_llm_responses(content, previous_interactions, mode="sequential")
 
-def expand_idea_with_chain(content: str, previous_interactions: list = None) -> dict:
+    base = ai_pool.submit(base_fn, content)
+    first = ai_pool.submit(_gpt4_chain_step, create_chain_prompt(content, [], previous_interactions))
+    chain_response = collect_parallel_chain(content, first, previous_interactions, timeout)
+    base_analysis, error = ai_pool.collect(base, timeout)
+    if error and not chain_response["chain_response"]:
+        raise RuntimeError(error)
+    if error:
+        chain_response["errors"].append({"model": AIModel.GPT4O.value, "error": error})
+    return base_analysis or {}, chain_response
+
+def expand_idea_with_chain(content: str, previous_interactions: list = None, mode: str = None) -> dict:
     """Expand an idea using chained LLM responses."""
-    base_analysis = expand_idea(content)
-    chain_response = chain_llm_responses(content, previous_interactions)
+    base_analysis, chain_response = _run_with_chain(expand_idea, content, previous_interactions, mode)
     
     return {
-        "expanded": base_analysis["expanded"],
+        "expanded": base_analysis.get("expanded", ""),
         "chain_insights": chain_response["chain_response"],
         "metadata": {
             "models_used": [model["model"] for model in chain_response["chain_response"]],
+            "errors": chain_response["errors"],
             "timestamp": datetime.utcnow().isoformat()
         }
     }
 
-def analyze_concept_with_chain(content: str, previous_interactions: list = None) -> dict:
+def analyze_concept_with_chain(content: str, previous_interactions: list = None, mode: str = None) -> dict:
     """Analyze a concept using chained LLM responses."""
-    base_analysis = analyze_concept(content)
-    chain_response = chain_llm_responses(content, previous_interactions)
+    base_analysis, chain_response = _run_with_chain(analyze_concept, content, previous_interactions, mode)
     
     return {
-        "analysis": base_analysis["analysis"],
+        "analysis": base_analysis.get("analysis", ""),
         "chain_insights": chain_response["chain_response"],
         "metadata": {
             "models_used": [model["model"] for model in chain_response["chain_response"]],
+            "errors": chain_response["errors"],
             "timestamp": datetime.utcnow().isoformat()
         }
-    }
\ No newline at end of file
+    }
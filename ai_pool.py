@@ -0,0 +1,64 @@
+"""Bounded thread pool for running independent AI calls concurrently."""
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+AI_POOL_SIZE = int(os.environ.get("AI_POOL_SIZE", 8))
+AI_CALL_TIMEOUT = float(os.environ.get("AI_CALL_TIMEOUT", 45))  # seconds
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=AI_POOL_SIZE, thread_name_prefix="ai-pool")
+    return _executor
+
+
+def submit(fn, *args, **kwargs):
+    """Run ``fn`` on the pool inside a fresh app context, if one is active.
+
+    Each task gets its own app context (and therefore its own scoped DB
+    session) rather than sharing the caller's, which is not thread-safe.
+    """
+    app = current_app._get_current_object() if has_app_context() else None
+
+    def run():
+        if app is None:
+            return fn(*args, **kwargs)
+        with app.app_context():
+            return fn(*args, **kwargs)
+
+    future = get_executor().submit(run)
+    future.submitted_at = time.monotonic()
+    return future
+
+
+def collect(future, timeout: float = AI_CALL_TIMEOUT):
+    """Return ``(result, error)`` for ``future`` without raising.
+
+    ``timeout`` is measured from submission, so collecting several futures in
+    turn does not stack their deadlines.  A call that misses its deadline is
+    reported as an error; the worker thread finishes in the background and
+    its result is discarded.
+    """
+    elapsed = time.monotonic() - getattr(future, "submitted_at", time.monotonic())
+    try:
+        return future.result(timeout=max(0.0, timeout - elapsed)), None
+    except FutureTimeoutError:
+        future.cancel()
+        logger.warning(f"AI call timed out after {timeout}s")
+        return None, f"timed out after {timeout:g}s"
+    except Exception as e:
+        logger.error(f"AI call failed: {str(e)}")
+        return None, str(e)
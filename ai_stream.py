@@ -0,0 +1,183 @@
+"""Server-Sent Events streaming for the long-running AI endpoints.
+
+Each model call is its own named stream inside one SSE response.  Streams in
+the same stage run concurrently on the AI pool and their token events are
+interleaved as they arrive, so the first token reaches the browser as soon as
+any model produces one.  Base streams pick their model with
+``chunking.choose_model`` like the buffered helpers, and completed texts are
+written to the LLM cache under the same keys those helpers use.
+"""
+import json
+import time
+import queue
+import logging
+from datetime import datetime
+
+import ai_pool
+import llm_cache
+import ai_helper
+import chunking
+from ai_helper import AIModel
+
+logger = logging.getLogger(__name__)
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _spec(stream_id: str, model: str, prompt: str = None, max_tokens: int = 500,
+          cached_helper=None, cache_content: str = None, result_key: str = None, call=None,
+          cache_model: str = None) -> dict:
+    return {
+        "id": stream_id,
+        "model": model,
+        "cache_model": cache_model or model,
+        "prompt": prompt,
+        "max_tokens": max_tokens,
+        "cached_helper": cached_helper,
+        "cache_content": cache_content,
+        "result_key": result_key,
+        "call": call,
+    }
+
+
+def _pump(spec: dict, events: queue.Queue):
+    """Run one stream, pushing ``(event, stream_id, payload)`` tuples onto ``events``."""
+    stream_id = spec["id"]
+    try:
+        key = None
+        helper = spec["cached_helper"]
+        if helper is not None:
+            key = helper.cache_key(spec["cache_content"], spec["cache_model"])
+            hit, value = llm_cache.lookup(key)
+            if hit:
+                text = value[spec["result_key"]]
+                events.put(("token", stream_id, text))
+                events.put(("done", stream_id, text))
+                return
+
+        if spec["call"] is not None:
+            text = spec["call"]()
+            events.put(("token", stream_id, text))
+        else:
+            chunks = []
+            for delta in ai_helper.stream_chat(spec["prompt"], spec["model"], spec["max_tokens"]):
+                chunks.append(delta)
+                events.put(("token", stream_id, delta))
+            text = "".join(chunks)
+
+        if key is not None and text:
+            llm_cache.store(key, helper.__name__, spec["cache_model"], {spec["result_key"]: text})
+        events.put(("done", stream_id, text))
+    except Exception as e:
+        logger.error(f"Stream {stream_id} failed: {str(e)}")
+        events.put(("error", stream_id, str(e)))
+
+
+def run_stage(specs: list, results: dict, errors: list, timeout: float = ai_pool.AI_CALL_TIMEOUT):
+    """Run ``specs`` concurrently, yielding SSE frames; fills ``results``/``errors``."""
+    events = queue.Queue()
+    pending = {}
+    for spec in specs:
+        yield sse_event("start", {"stream": spec["id"], "model": spec["model"]})
+        ai_pool.submit(_pump, spec, events)
+        pending[spec["id"]] = spec
+
+    deadline = time.monotonic() + timeout
+    while pending:
+        try:
+            event, stream_id, payload = events.get(timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Empty:
+            for stream_id in pending:
+                error = f"timed out after {timeout:g}s"
+                errors.append({"model": stream_id, "error": error})
+                yield sse_event("error", {"stream": stream_id, "error": error})
+            break
+
+        if event == "token":
+            yield sse_event("token", {"stream": stream_id, "text": payload})
+        elif event == "done":
+            results[stream_id] = payload
+            pending.pop(stream_id, None)
+            yield sse_event("done", {"stream": stream_id, "content": payload})
+        else:
+            errors.append({"model": stream_id, "error": payload})
+            pending.pop(stream_id, None)
+            yield sse_event("error", {"stream": stream_id, "error": payload})
+
+
+def stream_chain(kind: str, content: str, previous_interactions: list = None, on_complete=None,
+                 timeout: float = ai_pool.AI_CALL_TIMEOUT):
+    """Stream ``expand`` or ``analyze`` plus the multi-model chain.
+
+    Mirrors the stages of ``ai_helper.collect_parallel_chain`` and finishes
+    with a ``complete`` event carrying the same payload as the buffered
+    endpoint.
+    """
+    requested = AIModel.GPT4O.value
+    tokens = chunking.count_tokens(content, requested)
+    model = chunking.choose_model(requested, tokens)
+    if kind == "expand":
+        base = _spec("base", model, ai_helper.expand_idea_prompt(content), 500,
+                     ai_helper.expand_idea, content, "expanded", cache_model=requested)
+    else:
+        base = _spec("base", model, ai_helper.analyze_concept_prompt(content), 400,
+                     ai_helper.analyze_concept, content, "analysis", cache_model=requested)
+        if chunking.needs_chunking(tokens):
+            # Long notes take the chunked map-reduce path, which does not stream.
+            base["call"] = lambda: ai_helper.analyze_concept(content)["analysis"]
+
+    results, errors = {}, []
+    first = _spec("GPT-4", AIModel.GPT4O.value, ai_helper.create_chain_prompt(content, [], previous_interactions))
+    yield from run_stage([base, first], results, errors, timeout)
+
+    insights = [{"model": "GPT-4", "content": results["GPT-4"]}] if "GPT-4" in results else []
+    perspective_prompt = ai_helper.create_chain_prompt(content, insights, previous_interactions)
+    perspectives = [
+        _spec(model, model, call=lambda model=model: ai_helper._perspective_step(model, perspective_prompt))
+        for model in ai_helper._perspective_models()
+    ]
+    if perspectives:
+        yield from run_stage(perspectives, results, errors, timeout)
+        insights.extend({"model": spec["id"], "content": results[spec["id"]]}
+                        for spec in perspectives if spec["id"] in results)
+
+    if len(insights) > 1 and any(spec["id"] in results for spec in perspectives):
+        merge = _spec("GPT-4 (merge)", AIModel.GPT4O.value, ai_helper.create_merge_prompt(content, insights))
+        yield from run_stage([merge], results, errors, timeout)
+        if merge["id"] in results:
+            insights.append({"model": merge["id"], "content": results[merge["id"]]})
+
+    payload = {
+        base["result_key"]: results.get("base", ""),
+        "chain_insights": insights,
+        "metadata": {
+            "models_used": [insight["model"] for insight in insights],
+            "errors": errors,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+    }
+    if on_complete and (results.get("base") or insights):
+        on_complete(payload)
+    yield sse_event("complete", payload)
+
+
+def stream_single(kind: str, content: str, model: str, on_complete=None,
+                  timeout: float = ai_pool.AI_CALL_TIMEOUT):
+    """Stream the ``related`` ideas or ``mind_map`` helper as a single stream."""
+    chosen = chunking.choose_model(model, chunking.count_tokens(content, model))
+    if kind == "related":
+        spec = _spec("base", chosen, ai_helper.related_ideas_prompt(content), 300,
+                     ai_helper.generate_related_ideas, content, "related_ideas", cache_model=model)
+    else:
+        spec = _spec("base", chosen, ai_helper.mind_map_prompt(content), 400,
+                     ai_helper.create_mind_map_suggestions, content, "mind_map", cache_model=model)
+
+    results, errors = {}, []
+    yield from run_stage([spec], results, errors, timeout)
+
+    payload = {spec["result_key"]: results.get("base", ""), "metadata": {"errors": errors}}
+    if on_complete and "base" in results:
+        on_complete(payload)
+    yield sse_event("complete", payload)
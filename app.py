@@ -1,9 +1,26 @@
+"""Application setup.
+
+``create_app()`` wires extensions, models, routes and CLI commands onto
+``app`` once per process and touches neither the database nor any LLM
+SDK, so it is cheap enough to run under ``gunicorn --preload``; each
+forked worker then disposes of any connections inherited from the parent
+and opens its own.  The schema is managed by ``flask --app main migrate``
+(or at startup with ``SCHEMA_AUTO_MIGRATE=1``, e.g. for local runs).
+
+Background job workers start with the app, so jobs left pending by a
+restart run without waiting for a new submission, and restart in every
+forked child.  CLI commands do not start them.
+"""
 import os
+import logging
+import click
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from sqlalchemy.orm import DeclarativeBase
 
+SCHEMA_AUTO_MIGRATE = os.environ.get("SCHEMA_AUTO_MIGRATE", "0") == "1"
+
 class Base(DeclarativeBase):
     pass
 
@@ -18,11 +35,53 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_pre_ping": True,
 }
 
-db.init_app(app)
-login_manager.init_app(app)
-login_manager.login_view = 'login'
+def create_app():
+    """Configure and return ``app``; later calls return it unchanged."""
+    if "sqlalchemy" in app.extensions:
+        return app
+    logging.basicConfig(level=logging.INFO)
+
+    db.init_app(app)
+    login_manager.init_app(app)
+    login_manager.login_view = 'login'
+
+    import metrics
+    metrics.init_app(app)
 
-with app.app_context():
     import models
+    import identity
     import routes
-    db.create_all()
+
+    from jobs import worker_pool
+    from commands import register_commands
+    worker_pool.init_app(app)
+    register_commands(app)
+
+    if SCHEMA_AUTO_MIGRATE:
+        import schema
+        with app.app_context():
+            schema.ensure_schema()
+
+    from jobs import AI_JOB_AUTOSTART
+    # Not for CLI commands such as ``migrate``: they would claim jobs and exit mid-run.
+    if AI_JOB_AUTOSTART and click.get_current_context(silent=True) is None:
+        worker_pool.start()
+    return app
+
+def dispose_engines():
+    """Drop pooled connections inherited across a fork without closing the parent's sockets."""
+    if "sqlalchemy" not in app.extensions:
+        return
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+def restart_workers():
+    """Give a forked child its own job workers if the parent had started them."""
+    if "sqlalchemy" not in app.extensions:
+        return
+    from jobs import worker_pool
+    worker_pool.after_fork()
+
+os.register_at_fork(after_in_child=dispose_engines)
+os.register_at_fork(after_in_child=restart_workers)
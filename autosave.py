@@ -0,0 +1,160 @@
+"""Delta saves of notes with optimistic concurrency.
+
+Every change to a note's title or content bumps ``note.version`` (see the
+``before_flush`` hook below); the version doubles as the note's ETag.  The
+editor sends only what changed since the version it last synced:
+
+- ``content_ops``: splices ``{start, delete, insert, before, after}``
+  applied in order, where ``start`` is a UTF-16 offset (as JavaScript
+  counts) and ``before``/``after`` are a little surrounding text;
+- ``title`` with the ``title_base`` it replaces;
+- ``tags_add`` / ``tags_remove``.
+
+Against the current version the splices apply at their offsets.  Against
+a stale one they are merged: each splice is relocated by finding its
+deleted text and context nearest its offset in the current content, the
+title only if nobody else changed it, and tag deltas as given.  Anything
+that cannot be placed unambiguously raises ``PatchConflict``.
+"""
+import re
+import logging
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from models import Note
+from tags import set_note_tags
+import fingerprints
+
+logger = logging.getLogger(__name__)
+
+MAX_OPS = 200
+VERSIONED_COLUMNS = ("title", "content")
+
+
+class PatchError(ValueError):
+    """Raised for malformed patches."""
+
+
+class PatchConflict(ValueError):
+    """Raised when a patch against a stale version cannot be merged."""
+
+
+def etag(note) -> str:
+    return f'"v{note.version or 1}"'
+
+
+def parse_etag(value):
+    """The version in an ``If-Match`` value such as ``"v12"`` or ``W/"v12"``, else None."""
+    match = re.fullmatch(r'\s*(?:W/)?"v(\d+)"\s*', value or "")
+    return int(match.group(1)) if match else None
+
+
+def utf16_index(text: str, offset: int) -> int:
+    """The ``str`` index of UTF-16 code-unit ``offset`` in ``text``."""
+    if text.isascii():
+        return min(offset, len(text))
+    head = text.encode("utf-16-le")[:2 * offset]
+    return len(head.decode("utf-16-le", errors="ignore"))
+
+
+def _nearest(text: str, needle: str, hint: int):
+    """Start of the occurrence of ``needle`` in ``text`` closest to ``hint``; None if absent or tied."""
+    if text.startswith(needle, hint):
+        return hint
+    best, best_distance, tied = None, None, False
+    position = text.find(needle)
+    while position != -1:
+        distance = abs(position - hint)
+        if best_distance is None or distance < best_distance:
+            best, best_distance, tied = position, distance, False
+        elif distance == best_distance:
+            tied = True
+        position = text.find(needle, position + 1)
+    return None if tied else best
+
+
+def _validate(ops):
+    if not isinstance(ops, list) or len(ops) > MAX_OPS:
+        raise PatchError(f"content_ops must be a list of at most {MAX_OPS} splices")
+    for op in ops:
+        if not isinstance(op, dict) or not isinstance(op.get("start"), int) or op["start"] < 0:
+            raise PatchError("Each splice needs a non-negative integer start")
+        for key in ("delete", "insert", "before", "after"):
+            if not isinstance(op.get(key, ""), str):
+                raise PatchError(f"Splice field {key} must be a string")
+
+
+def apply_ops(text: str, ops: list, exact: bool) -> str:
+    """Apply splices to ``text``; ``exact`` when ``text`` is the version they were made against."""
+    for op in ops:
+        before, delete, after = op.get("before", ""), op.get("delete", ""), op.get("after", "")
+        start = utf16_index(text, op["start"])
+        if exact:
+            if not text.startswith(delete, start):
+                raise PatchError(f"Splice at {op['start']} does not match the note's content")
+        else:
+            if not (before or delete or after):
+                raise PatchConflict("Splice has no context to place it by")
+            found = _nearest(text, before + delete + after, start - len(before))
+            if found is None:
+                raise PatchConflict(f"Could not place the edit near offset {op['start']}")
+            start = found + len(before)
+        text = text[:start] + op.get("insert", "") + text[start + len(delete):]
+    return text
+
+
+def apply_patch(note, data: dict, base_version: int) -> bool:
+    """Apply a delta ``data`` made against ``base_version`` to ``note``; returns True if it was merged.
+
+    Nothing is written to ``note`` unless the whole patch applies.  Tags
+    are resolved as the note owner's, whoever is editing.
+    """
+    exact = base_version == (note.version or 1)
+    ops = data.get("content_ops") or []
+    _validate(ops)
+
+    content = note.content
+    if ops:
+        content = apply_ops(note.content, ops, exact)
+        expected = data.get("content_length")
+        if exact and expected is not None and len(content.encode("utf-16-le")) // 2 != expected:
+            raise PatchError("Patched content length does not match")
+
+    title = note.title
+    if "title" in data:
+        title = (data.get("title") or "").strip()
+        if not title:
+            raise PatchError("Title cannot be empty")
+        if not exact and note.title != data.get("title_base") and note.title != title:
+            raise PatchConflict("The title was changed elsewhere")
+
+    add, remove = data.get("tags_add") or [], data.get("tags_remove") or []
+    if not isinstance(add, list) or not isinstance(remove, list) or \
+            not all(isinstance(name, str) for name in add + remove):
+        raise PatchError("tags_add and tags_remove must be lists of names")
+
+    # Tags first: loading them after the text changed would autoflush the note early.
+    if add or remove:
+        current = [tag.name for tag in note.tags]
+        removed = {name.strip() for name in remove}
+        desired = [name for name in current if name not in removed] + [name for name in add if name not in current]
+        set_note_tags(note, desired, note.user_id)
+    if title != note.title:
+        note.title = title
+    if content != note.content:
+        note.content = content
+        fingerprints.stamp(note)
+    return not exact
+
+
+@event.listens_for(Session, "before_flush")
+def _bump_versions(session, flush_context, instances):
+    for obj in session.dirty:
+        if not isinstance(obj, Note):
+            continue
+        state = inspect(obj)
+        if state.attrs.version.history.has_changes():
+            continue
+        if any(state.attrs[column].history.has_changes() for column in VERSIONED_COLUMNS):
+            obj.version = (obj.version or 1) + 1
@@ -0,0 +1,447 @@
+"""Reproducible load benchmark against a seeded database and a fake LLM server.
+
+Seeds users, notes, tags, shares and AI interaction threads from a fixed
+random seed, starts ``fake_llm_server`` with a latency/failure profile,
+and drives scripted scenarios through the app in-process with concurrent
+clients.  Each scenario reports throughput, p50/p95/p99 latency, status
+codes and SQL statements per request; results are written as JSON
+(tagged with the git commit) so runs can be compared::
+
+    python benchmark.py --profile realistic --requests 200 --concurrency 8
+    python benchmark.py --compare bench_results/<earlier run>.json
+
+``auth_poll`` hits a login-protected endpoint that does no work of its
+own, so it measures what authentication costs per request; compare a run
+with ``IDENTITY_CACHE_TTL=0`` against one with the cache, or with
+``IDENTITY_SESSION_FAST_PATH=1``.
+
+``startup`` instead spawns ``--startup-runs`` fresh interpreters that
+import ``main`` and serve one request, and reports the cold-start time,
+the first request's latency and the SQL statements run at startup.
+
+The app is configured from the environment at import, so the benchmark
+sets ``DATABASE_URL`` (default: a throwaway SQLite file) and the provider
+base URLs before importing it.  Provider keys from the environment are
+replaced with dummies, so no request leaves the machine.
+"""
+import io
+import os
+import sys
+import json
+import math
+import time
+import wave
+import random
+import argparse
+import threading
+import subprocess
+from datetime import datetime, timedelta
+
+SCENARIOS = ("index", "edit_note", "suggest_tags", "expand_chain", "transcribe", "auth_poll", "startup")
+DEFAULT_DB_PATH = os.path.join(os.environ.get("TMPDIR", "/tmp"), "notes-bench.db")
+RESULTS_DIR = "bench_results"
+PASSWORD = "bench-password"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Seeded load benchmark with a fake LLM backend.")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS,
+                        help="scenario to run (repeatable; default: all)")
+    parser.add_argument("--requests", type=int, default=100, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent clients")
+    parser.add_argument("--profile", default="fast", help="fake LLM latency/failure profile")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--notes", type=int, default=200, help="notes per user")
+    parser.add_argument("--tags", type=int, default=30, help="distinct tags per user")
+    parser.add_argument("--shares", type=int, default=20, help="notes shared per user")
+    parser.add_argument("--threads", type=int, default=20, help="AI interaction threads per user")
+    parser.add_argument("--startup-runs", type=int, default=5, help="fresh processes for the startup scenario")
+    parser.add_argument("--warm", action="store_true",
+                        help="repeat identical AI inputs so the LLM cache answers (default: unique inputs)")
+    parser.add_argument("--database-url", default=os.environ.get("BENCH_DATABASE_URL"),
+                        help="database to seed; must be empty unless --reset (default: a temp SQLite file)")
+    parser.add_argument("--reset", action="store_true", help="drop all tables in --database-url first")
+    parser.add_argument("--output", help=f"result file (default: {RESULTS_DIR}/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args, llm_url: str):
+    """Point the app at the bench database and the fake server; must run before importing ``app``."""
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        if os.path.exists(DEFAULT_DB_PATH):
+            os.remove(DEFAULT_DB_PATH)
+        os.environ["DATABASE_URL"] = f"sqlite:///{DEFAULT_DB_PATH}"
+    os.environ["OPENAI_BASE_URL"] = f"{llm_url}/v1"
+    os.environ["ANTHROPIC_BASE_URL"] = llm_url
+    os.environ["MISTRAL_BASE_URL"] = llm_url
+    for key in ("OPENAI_API_KEY", "ANTHROPIC_API_KEY", "MISTRAL_API_KEY"):
+        os.environ[key] = "bench"
+    os.environ.pop("LLM_ROUTE_DEFAULT", None)
+    os.environ.setdefault("SINGLEFLIGHT_DIR", os.path.join(os.environ.get("TMPDIR", "/tmp"), "notes-bench-locks"))
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile of ``values``."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(len(ordered) * pct / 100) - 1)]
+
+
+# --- Seeding ---------------------------------------------------------------
+
+WORDS = ("alpha beta gamma delta cloud data model network design research system pattern idea "
+         "method signal context theory practice market product strategy learning memory vector "
+         "graph search index cache latency budget growth team review release feature").split()
+
+
+def _paragraphs(rng: random.Random, count: int) -> str:
+    return "\n\n".join(
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 80))).capitalize() + "."
+        for _ in range(count)
+    )
+
+
+def seed(rng: random.Random, users: int, notes: int, tags: int, shares: int, threads: int) -> dict:
+    """Create the bench data set; returns ids the scenarios draw from."""
+    from werkzeug.security import generate_password_hash
+    from app import db
+    from models import User, Note, NoteShare, AIInteraction
+    from importer import import_notes
+
+    started = time.monotonic()
+    password_hash = generate_password_hash(PASSWORD)
+    user_ids = db.session.execute(
+        db.insert(User).returning(User.id, sort_by_parameter_order=True),
+        [{"username": f"bench{i}", "email": f"bench{i}@example.com", "password_hash": password_hash}
+         for i in range(users)]
+    ).scalars().all()
+    db.session.commit()
+
+    now = datetime.utcnow()
+    for user_id in user_ids:
+        vocabulary = [f"{rng.choice(WORDS)}{i}-u{user_id}" for i in range(tags)]  # tag names are unique
+        records = []
+        for n in range(notes):
+            created = now - timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+            records.append({
+                "title": f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {n}",
+                "content": _paragraphs(rng, max(1, int(rng.lognormvariate(0.7, 0.8)))),
+                "tags": rng.sample(vocabulary, k=min(len(vocabulary), rng.randint(0, 5))),
+                "category": rng.choice(WORDS).title(),
+                "created_at": created.isoformat(),
+                "updated_at": (created + timedelta(minutes=rng.randint(0, 600))).isoformat(),
+            })
+        for _ in import_notes(user_id, records):
+            pass
+
+    notes_by_user = {user_id: [] for user_id in user_ids}
+    for note_id, user_id in db.session.execute(db.select(Note.id, Note.user_id)):
+        notes_by_user[user_id].append(note_id)
+
+    share_rows = []
+    for user_id in user_ids:
+        others = [other for other in user_ids if other != user_id]
+        for note_id in rng.sample(notes_by_user[user_id], k=min(shares, len(notes_by_user[user_id]))):
+            if others:
+                share_rows.append({"note_id": note_id, "user_id": rng.choice(others),
+                                   "can_edit": rng.random() < 0.5, "shared_at": now})
+    if share_rows:
+        db.session.execute(db.insert(NoteShare), share_rows)
+
+    interactions = 0
+    for user_id in user_ids:
+        for note_id in rng.sample(notes_by_user[user_id], k=min(threads, len(notes_by_user[user_id]))):
+            parent_id = None
+            for depth in range(rng.randint(1, 5)):
+                parent_id = db.session.execute(db.insert(AIInteraction).returning(AIInteraction.id), {
+                    "note_id": note_id, "interaction_type": rng.choice(["expand", "analyze", "related"]),
+                    "content": _paragraphs(rng, 1), "model_used": "gpt-4o", "parent_id": parent_id,
+                    "created_at": now - timedelta(minutes=60 - depth), "interaction_metadata": {},
+                }).scalar_one()
+                interactions += 1
+    db.session.commit()
+    print(f"Seeded {len(user_ids)} users, {sum(map(len, notes_by_user.values()))} notes, "
+          f"{len(share_rows)} shares, {interactions} interactions in {time.monotonic() - started:.1f}s",
+          file=sys.stderr)
+    return {"user_ids": user_ids, "notes_by_user": notes_by_user}
+
+
+# --- Scenarios ------------------------------------------------------------
+
+def _wav(rng: random.Random, seconds: float = 6.0, rate: int = 16000) -> bytes:
+    """Mono 16-bit WAV of tones separated by short pauses."""
+    frames = bytearray()
+    for i in range(int(seconds * rate)):
+        in_pause = (i // (rate // 2)) % 4 == 3
+        sample = 0 if in_pause else int(8000 * math.sin(2 * math.pi * 220 * i / rate) + rng.randint(-200, 200))
+        frames += int(sample).to_bytes(2, "little", signed=True)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(rate)
+        out.writeframes(bytes(frames))
+    return buffer.getvalue()
+
+
+class Scenario:
+    """One scripted request; ``run`` returns the response."""
+
+    def __init__(self, name: str, data: dict, warm: bool, rng: random.Random):
+        self.name = name
+        self.data = data
+        self.warm = warm
+        self.audio = _wav(rng) if name == "transcribe" else None
+
+    def _text(self, rng: random.Random, iteration: int) -> str:
+        nonce = "" if self.warm else f" (run {iteration}-{rng.random():.12f})"
+        return f"An idea about distributed note taking with AI assistance{nonce}. " + _paragraphs(rng, 1)
+
+    def run(self, client, user_id: int, rng: random.Random, iteration: int):
+        notes = self.data["notes_by_user"][user_id]
+        if self.name == "index":
+            return client.get("/")
+        if self.name == "edit_note":
+            note_id = rng.choice(notes)
+            return client.post(f"/note/{note_id}/edit", data={
+                "title": f"Edited {iteration}",
+                "content": self._text(rng, iteration),
+                "tags[]": [f"{rng.choice(WORDS)}{rng.randint(0, 5)}-u{user_id}"],
+            })
+        if self.name == "suggest_tags":
+            params = {"note_id": rng.choice(notes), "model": "gpt-4o-mini"}
+            if not self.warm:
+                params["content"] = self._text(rng, iteration)
+            return client.get("/api/suggest-tags", query_string=params)
+        if self.name == "auth_poll":
+            return client.get("/api/ai-cache/stats")
+        if self.name == "expand_chain":
+            return client.get("/api/expand-idea-chain", query_string={
+                "content": self._text(rng, iteration), "note_id": rng.choice(notes)})
+        audio = self.audio if self.warm else self.audio + rng.randbytes(64)  # distinct content hash
+        return client.post("/api/transcribe", data={"audio": (io.BytesIO(audio), "bench.wav", "audio/wav")},
+                           content_type="multipart/form-data")
+
+
+def run_scenario(app, scenario: Scenario, user_ids: list, total: int, concurrency: int, seed_value: int) -> dict:
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    local = threading.local()
+
+    def count_query(*_):
+        if hasattr(local, "queries"):
+            local.queries += 1
+
+    event.listen(Engine, "after_cursor_execute", count_query)
+    samples, lock = [], threading.Lock()
+    counter = iter(range(total))
+
+    def worker(index: int):
+        rng = random.Random(seed_value * 1000 + index)
+        user_id = user_ids[index % len(user_ids)]
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session["_user_id"] = str(user_id)
+            session["_fresh"] = True
+        while True:
+            with lock:
+                iteration = next(counter, None)
+            if iteration is None:
+                return
+            local.queries = 0
+            started = time.perf_counter()
+            try:
+                status = scenario.run(client, user_id, rng, iteration).status_code
+            except Exception as e:
+                print(f"{scenario.name} request failed: {e}", file=sys.stderr)
+                status = 599
+            elapsed = time.perf_counter() - started
+            with lock:
+                samples.append((elapsed, status, local.queries))
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    wall = time.perf_counter() - started
+    event.remove(Engine, "after_cursor_execute", count_query)
+
+    latencies = [elapsed * 1000 for elapsed, _, _ in samples]
+    queries = [count for _, _, count in samples]
+    statuses = {}
+    for _, status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for _, status, _ in samples if status >= 500),
+        "status_codes": statuses,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(samples) / wall, 2) if wall else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "max": round(max(latencies), 2) if latencies else 0.0,
+        },
+        "sql_queries": {
+            "mean": round(sum(queries) / len(queries), 2) if queries else 0.0,
+            "p95": percentile(queries, 95),
+            "max": max(queries) if queries else 0,
+        },
+    }
+
+
+# Run in a fresh interpreter; the clock starts before anything is imported.
+STARTUP_PROBE = """
+import json, time
+started = time.perf_counter()
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+queries = []
+event.listen(Engine, "after_cursor_execute", lambda *args: queries.append(1))
+import main
+imported = time.perf_counter()
+status = main.app.test_client().get("/login").status_code
+served = time.perf_counter()
+print(json.dumps({"import_ms": (imported - started) * 1000, "first_request_ms": (served - imported) * 1000,
+                  "queries": len(queries), "status": status}))
+"""
+
+
+def run_startup(runs: int) -> dict:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        # Job workers start polling once the app is up; the probe measures the app itself.
+        probe = subprocess.run([sys.executable, "-c", STARTUP_PROBE], capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)),
+                               env=dict(os.environ, AI_JOB_AUTOSTART="0"))
+        total = (time.perf_counter() - started) * 1000
+        if probe.returncode != 0:
+            print(f"startup probe failed: {probe.stderr[-500:]}", file=sys.stderr)
+            samples.append({"import_ms": total, "first_request_ms": 0.0, "queries": 0, "status": 599, "total": total})
+            continue
+        samples.append(dict(json.loads(probe.stdout.strip().splitlines()[-1]), total=total))
+    imports = [sample["import_ms"] for sample in samples]
+    first = [sample["first_request_ms"] for sample in samples]
+    queries = [sample["queries"] for sample in samples]
+    statuses = {}
+    for sample in samples:
+        statuses[str(sample["status"])] = statuses.get(str(sample["status"]), 0) + 1
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for sample in samples if sample["status"] >= 500),
+        "status_codes": statuses,
+        "wall_seconds": round(sum(sample["total"] for sample in samples) / 1000, 3),
+        "throughput_rps": 0.0,
+        # For startup, "latency" is the time to import the app, before any request.
+        "latency_ms": {
+            "mean": round(sum(imports) / len(imports), 2) if imports else 0.0,
+            "p50": round(percentile(imports, 50), 2),
+            "p95": round(percentile(imports, 95), 2),
+            "p99": round(percentile(imports, 99), 2),
+            "max": round(max(imports), 2) if imports else 0.0,
+        },
+        "first_request_ms": {"p50": round(percentile(first, 50), 2), "max": round(max(first), 2) if first else 0.0},
+        "process_ms": {"p50": round(percentile([sample["total"] for sample in samples], 50), 2)},
+        "sql_queries": {
+            "mean": round(sum(queries) / len(queries), 2) if queries else 0.0,
+            "p95": percentile(queries, 95),
+            "max": max(queries) if queries else 0,
+        },
+    }
+
+
+def compare(current: dict, baseline: dict):
+    print(f"\nCompared with {baseline.get('commit')} ({baseline.get('timestamp')}):")
+    print(f"{'scenario':<14}{'p50 ms':>18}{'p95 ms':>18}{'rps':>16}{'sql/req':>16}")
+    for name, result in current["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if not old:
+            continue
+
+        def cell(new_value, old_value):
+            change = ((new_value - old_value) / old_value * 100) if old_value else 0.0
+            return f"{new_value:>9.1f} ({change:+5.0f}%)"
+
+        print(f"{name:<14}{cell(result['latency_ms']['p50'], old['latency_ms']['p50']):>18}"
+              f"{cell(result['latency_ms']['p95'], old['latency_ms']['p95']):>18}"
+              f"{cell(result['throughput_rps'], old['throughput_rps']):>16}"
+              f"{cell(result['sql_queries']['mean'], old['sql_queries']['mean']):>16}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    from fake_llm_server import FakeLLMServer, PROFILES
+
+    if args.profile not in PROFILES:
+        sys.exit(f"Unknown profile {args.profile}; choose from {', '.join(sorted(PROFILES))}")
+    server = FakeLLMServer(args.profile, seed=args.seed)
+    configure_environment(args, server.start())
+
+    from app import create_app, db
+    from models import User
+    import schema
+
+    app = create_app()
+    with app.app_context():
+        if args.reset:
+            db.drop_all()
+        schema.ensure_schema()
+        if db.session.query(User.id).first() is not None:
+            sys.exit("Bench database is not empty; pass --reset to drop its tables first")
+        rng = random.Random(args.seed)
+        data = seed(rng, args.users, args.notes, args.tags, args.shares, args.threads)
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "database": app.config["SQLALCHEMY_DATABASE_URI"].split("://", 1)[0],
+        "scenarios": {},
+    }
+    for name in args.scenario or SCENARIOS:
+        if name == "startup":
+            result = run_startup(args.startup_runs)
+        else:
+            scenario = Scenario(name, data, args.warm, random.Random(args.seed))
+            result = run_scenario(app, scenario, data["user_ids"], args.requests, args.concurrency, args.seed)
+        results["scenarios"][name] = result
+        latency = result["latency_ms"]
+        print(f"{name:<14} {result['throughput_rps']:>8.1f} rps  p50 {latency['p50']:>8.1f}ms  "
+              f"p95 {latency['p95']:>8.1f}ms  p99 {latency['p99']:>8.1f}ms  "
+              f"sql/req {result['sql_queries']['mean']:>6.1f}  errors {result['errors']}")
+    results["fake_llm"] = server.stats()
+    server.stop()
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{results['commit']}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
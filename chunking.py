@@ -0,0 +1,176 @@
+"""Token budgeting and map-reduce over long notes.
+
+Tokens are counted locally with ``tiktoken`` when it is installed, and
+estimated from the character count otherwise.  Notes past
+``LLM_CHUNK_THRESHOLD_TOKENS`` are split at paragraph, then sentence, then
+word boundaries into chunks of about ``LLM_CHUNK_TOKENS`` that overlap by
+``LLM_CHUNK_OVERLAP_TOKENS``; the chunks are processed concurrently and
+the partial results reduced, in rounds if they are still too long to
+combine in one call.  Small notes are moved to a cheaper model.
+"""
+import os
+import re
+import math
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import tiktoken
+except ImportError:  # optional; fall back to a character-based estimate
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+LLM_SMALL_NOTE_TOKENS = int(os.environ.get("LLM_SMALL_NOTE_TOKENS", 1000))
+LLM_SMALL_MODEL = os.environ.get("LLM_SMALL_MODEL", "gpt-4o-mini")
+LLM_CHUNK_THRESHOLD_TOKENS = int(os.environ.get("LLM_CHUNK_THRESHOLD_TOKENS", 4000))
+LLM_CHUNK_TOKENS = int(os.environ.get("LLM_CHUNK_TOKENS", 2000))
+LLM_CHUNK_OVERLAP_TOKENS = int(os.environ.get("LLM_CHUNK_OVERLAP_TOKENS", 150))
+LLM_CHUNK_CONCURRENCY = int(os.environ.get("LLM_CHUNK_CONCURRENCY", 4))
+CHARS_PER_TOKEN = 4  # English prose averages about four characters per token
+
+# Models that small notes are moved off of, to LLM_SMALL_MODEL.
+DOWNGRADE_MODELS = {"gpt-4o"}
+
+_encodings = {}
+_encodings_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _encoding(model: str):
+    if tiktoken is None:
+        return None
+    with _encodings_lock:
+        if model not in _encodings:
+            try:
+                try:
+                    _encodings[model] = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    _encodings[model] = tiktoken.get_encoding("o200k_base")
+            except Exception as e:  # e.g. the BPE file cannot be downloaded
+                logger.warning(f"tiktoken unavailable for {model}, estimating tokens: {str(e)}")
+                _encodings[model] = None
+        return _encodings[model]
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    encoding = _encoding(model)
+    if encoding is None:
+        return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+    return len(encoding.encode(text or "", disallowed_special=()))
+
+
+def choose_model(model: str, tokens: int) -> str:
+    """``LLM_SMALL_MODEL`` for small notes requested on a large default model, else ``model``."""
+    if model in DOWNGRADE_MODELS and tokens <= LLM_SMALL_NOTE_TOKENS:
+        return LLM_SMALL_MODEL
+    return model
+
+
+def needs_chunking(tokens: int) -> bool:
+    return tokens > LLM_CHUNK_THRESHOLD_TOKENS
+
+
+def output_budget(tokens: int, ratio: float, floor: int, cap: int) -> int:
+    """``max_tokens`` proportional to the input size, within ``[floor, cap]``."""
+    return max(floor, min(cap, math.ceil(tokens * ratio)))
+
+
+def _units(text: str, limit: int, model: str) -> list:
+    """Paragraphs, with any paragraph over ``limit`` tokens broken into sentences, then words."""
+    units = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if count_tokens(paragraph, model) <= limit:
+            units.append(paragraph)
+            continue
+        for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+            if count_tokens(sentence, model) <= limit:
+                units.append(sentence)
+                continue
+            words = sentence.split()
+            step = max(1, limit * CHARS_PER_TOKEN // 6)  # about six characters per word with its space
+            for i in range(0, len(words), step):
+                piece = " ".join(words[i:i + step])
+                if count_tokens(piece, model) <= limit:
+                    units.append(piece)
+                else:  # e.g. a long URL or base64 blob with no spaces
+                    width = limit * CHARS_PER_TOKEN // 2
+                    units.extend(piece[j:j + width] for j in range(0, len(piece), width))
+    return units
+
+
+def split(text: str, model: str = "gpt-4o", chunk_tokens: int = LLM_CHUNK_TOKENS,
+          overlap_tokens: int = LLM_CHUNK_OVERLAP_TOKENS) -> list:
+    """Split ``text`` into chunks of at most about ``chunk_tokens``.
+
+    Each chunk after the first starts with the trailing units of the
+    previous one, up to ``overlap_tokens``, so no boundary loses context.
+    """
+    chunks, current, current_tokens = [], [], 0
+    for unit in _units(text, chunk_tokens, model):
+        tokens = count_tokens(unit, model)
+        if current and current_tokens + tokens > chunk_tokens:
+            chunks.append("\n\n".join(current))
+            carried, carried_tokens = [], 0
+            for previous in reversed(current):
+                previous_tokens = count_tokens(previous, model)
+                if carried_tokens + previous_tokens > overlap_tokens:
+                    break
+                carried.insert(0, previous)
+                carried_tokens += previous_tokens
+            current, current_tokens = carried, carried_tokens
+        current.append(unit)
+        current_tokens += tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def get_executor() -> ThreadPoolExecutor:
+    # Separate from ai_pool: chunked helpers themselves run on the AI pool
+    # (e.g. alongside the chain) and must not wait on work queued behind them.
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=LLM_CHUNK_CONCURRENCY, thread_name_prefix="llm-chunk")
+    return _executor
+
+
+def map_concurrent(fn, items: list) -> list:
+    """``[fn(item, index, total) ...]`` computed concurrently, in order; the first error is raised."""
+    total = len(items)
+    futures = [get_executor().submit(fn, item, index, total) for index, item in enumerate(items)]
+    return [future.result() for future in futures]
+
+
+def map_reduce(content: str, model: str, map_fn, reduce_fn) -> str:
+    """Run ``map_fn(chunk, index, total)`` over the chunks of ``content`` and combine with ``reduce_fn(parts)``.
+
+    While the partial results are too long to combine in one call they are
+    reduced in groups first.
+    """
+    chunks = split(content, model)
+    parts = map_concurrent(map_fn, chunks)
+    rounds = 0
+    while len(parts) > 1 and needs_chunking(count_tokens("\n\n".join(parts), model)):
+        groups, group, group_tokens = [], [], 0
+        for part in parts:
+            tokens = count_tokens(part, model)
+            if group and group_tokens + tokens > LLM_CHUNK_TOKENS:
+                groups.append(group)
+                group, group_tokens = [], 0
+            group.append(part)
+            group_tokens += tokens
+        groups.append(group)
+        if len(groups) == len(parts):  # every part is already too long to pair up
+            break
+        parts = map_concurrent(lambda group, index, total: reduce_fn(group), groups)
+        rounds += 1
+    logger.info(f"Map-reduce over {len(chunks)} chunks with {rounds} intermediate round(s)")
+    return reduce_fn(parts)
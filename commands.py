@@ -0,0 +1,79 @@
+"""Flask CLI commands (``flask --app main <command>``)."""
+import click
+
+
+def register_commands(app):
+    @app.cli.command("migrate")
+    def migrate_command():
+        """Create missing tables, columns, indexes and search structures."""
+        from schema import ensure_schema
+
+        ensure_schema()
+        click.echo("Schema is up to date")
+
+    @app.cli.command("search-reindex")
+    def search_reindex_command():
+        """Rebuild the full-text search index for every note."""
+        from search import rebuild_search_index
+
+        click.echo(f"Indexed {rebuild_search_index()} notes")
+
+    @app.cli.command("tags-rebuild-usage")
+    def tags_rebuild_usage_command():
+        """Recompute per-user tag usage counts from note_tags."""
+        from tags import rebuild_tag_usage
+
+        click.echo(f"Rebuilt usage counts for {rebuild_tag_usage()} tags")
+
+    @app.cli.command("embeddings-rebuild")
+    def embeddings_rebuild_command():
+        """Re-embed every note with the configured embedder."""
+        from embeddings import rebuild_embeddings
+
+        click.echo(f"Embedded {rebuild_embeddings()} notes")
+
+    @app.cli.command("import-notes")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--user", "username", required=True, help="Username that will own the notes.")
+    @click.option("--format", "fmt", type=click.Choice(["ndjson", "zip"]), default=None,
+                  help="Input format; detected from the file name by default.")
+    @click.option("--chunk-size", type=int, default=None, help="Notes per transaction.")
+    @click.option("--categorize", is_flag=True, help="Queue AI categorization for imported notes.")
+    def import_notes_command(path, username, fmt, chunk_size, categorize):
+        """Bulk-import notes from an NDJSON file or a zip of Markdown files."""
+        from models import User
+        from importer import import_notes, open_records, IMPORT_CHUNK_SIZE
+
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            raise click.ClickException(f"No such user: {username}")
+        with open(path, "rb") as f:
+            records = open_records(f, path, fmt)
+            for progress in import_notes(user.id, records, chunk_size=chunk_size or IMPORT_CHUNK_SIZE,
+                                         categorize=categorize):
+                click.echo(
+                    f"{progress['imported']} imported, {progress['skipped']} skipped, "
+                    f"{progress['chunks']} chunks, {progress['jobs']} jobs queued ({progress['elapsed']}s)"
+                )
+
+    @app.cli.command("export-notes")
+    @click.option("--user", "username", required=True, help="Username whose data is exported.")
+    @click.option("--format", "fmt", type=click.Choice(["ndjson", "zip"]), default="ndjson")
+    @click.option("--since", default=None, help="Only export changes after this ISO timestamp.")
+    @click.option("--output", "-o", type=click.Path(dir_okay=False, writable=True), default="-",
+                  help="Output file; '-' writes to stdout.")
+    def export_notes_command(username, fmt, since, output):
+        """Export a user's notes, tags, shares and AI threads."""
+        from models import User
+        from exporter import export_stream, parse_since
+
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            raise click.ClickException(f"No such user: {username}")
+        try:
+            chunks = export_stream(user.id, fmt, parse_since(since))
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        with click.open_file(output, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
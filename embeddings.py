@@ -0,0 +1,367 @@
+"""Note embeddings and an in-memory per-user vector index for related notes.
+
+Embeddings are stored as little-endian float32 blobs in ``note_embedding``,
+one row per note and embedder.  Each process keeps a NumPy matrix of
+L2-normalized vectors per user, loaded on first use, so related-note
+lookups are a single matrix product.  Saves and deletes update the matrix
+in place.  A cheap ``count``/``max(updated_at)`` probe detects writes made
+by other workers, and the index is reloaded when they happen.
+
+The embedder is pluggable (``EMBEDDER``).  The default ``hashing`` embedder
+is a local feature-hashing model that needs no network access; ``openai``
+uses the embeddings API.
+"""
+import os
+import re
+import math
+import hashlib
+import logging
+import threading
+from collections import Counter, OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+from app import db
+from models import Note, NoteEmbedding
+
+logger = logging.getLogger(__name__)
+
+EMBEDDER = os.environ.get("EMBEDDER", "hashing")  # 'hashing' or 'openai'
+EMBEDDING_DIM = int(os.environ.get("EMBEDDING_DIM", 512))
+EMBEDDING_OPENAI_MODEL = os.environ.get("EMBEDDING_OPENAI_MODEL", "text-embedding-3-small")
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", 100))
+EMBEDDING_MAX_CHARS = int(os.environ.get("EMBEDDING_MAX_CHARS", 8000))
+EMBEDDING_INDEX_MAX_USERS = int(os.environ.get("EMBEDDING_INDEX_MAX_USERS", 256))
+RELATED_NOTES_LIMIT = 5
+
+_TOKEN_RE = re.compile(r"\w\w+")
+
+
+def note_text(title: str, content: str) -> str:
+    return f"{title or ''}\n{content or ''}"[:EMBEDDING_MAX_CHARS]
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+class HashingEmbedder:
+    """Offline embedder: signed feature hashing of words and word bigrams.
+
+    Weights are ``1 + log(tf)``, so notes sharing vocabulary score high on
+    cosine similarity.  Deterministic across processes and machines.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str) -> Counter:
+        words = _TOKEN_RE.findall(text.lower())
+        return Counter(words + [f"{a} {b}" for a, b in zip(words, words[1:])])
+
+    def embed(self, texts: list) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, count in self._features(text).items():
+                h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+                matrix[row, h % self.dim] += (1.0 + math.log(count)) * (1 if h >> 63 else -1)
+        return _normalize_rows(matrix)
+
+
+class OpenAIEmbedder:
+    """Embeddings from the OpenAI API, requested in batches."""
+
+    def __init__(self, model: str = EMBEDDING_OPENAI_MODEL, dim: int = EMBEDDING_DIM):
+        self.model = model
+        self.dim = dim
+        self.name = f"openai:{model}:{dim}"
+
+    def embed(self, texts: list) -> np.ndarray:
+        import llm_transport
+        import metrics
+
+        with metrics.llm_call("embeddings", "openai", self.model):
+            response = llm_transport.embed(model=self.model, input=texts, dimensions=self.dim)
+        if response.usage:
+            metrics.record_tokens("embeddings", "openai", self.model, response.usage.prompt_tokens, 0)
+        vectors = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        return _normalize_rows(np.asarray(vectors, dtype=np.float32))
+
+
+EMBEDDERS = {
+    "hashing": HashingEmbedder,
+    "openai": OpenAIEmbedder,
+}
+
+_embedder = None
+
+
+def register_embedder(name: str, factory):
+    """Make ``factory()`` available as ``EMBEDDER=name``."""
+    EMBEDDERS[name] = factory
+
+
+def get_embedder():
+    global _embedder
+    if _embedder is None:
+        if EMBEDDER not in EMBEDDERS:
+            raise ValueError(f"Unknown embedder: {EMBEDDER}")
+        _embedder = EMBEDDERS[EMBEDDER]()
+    return _embedder
+
+
+def to_blob(vector: np.ndarray) -> bytes:
+    return np.asarray(vector, dtype="<f4").tobytes()
+
+
+def from_blobs(blobs: list, dim: int) -> np.ndarray:
+    if not blobs:
+        return np.zeros((0, dim), dtype=np.float32)
+    return np.frombuffer(b"".join(blobs), dtype="<f4").reshape(len(blobs), dim).astype(np.float32)
+
+
+class VectorIndex:
+    """Row-major matrix of unit vectors with an id -> row map and cosine top-k."""
+
+    def __init__(self, dim: int, ids=None, matrix=None):
+        self.dim = dim
+        self._matrix = matrix if matrix is not None else np.zeros((0, dim), dtype=np.float32)
+        self._ids = list(ids or [])
+        self._rows = {note_id: row for row, note_id in enumerate(self._ids)}
+        self._size = len(self._ids)
+        self.lock = threading.Lock()
+        self.token = None
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, note_id):
+        return note_id in self._rows
+
+    def vector(self, note_id: int):
+        row = self._rows.get(note_id)
+        return None if row is None else self._matrix[row]
+
+    def upsert(self, note_id: int, vector: np.ndarray):
+        row = self._rows.get(note_id)
+        if row is None:
+            if self._size == len(self._matrix):
+                grown = np.zeros((max(16, 2 * len(self._matrix)), self.dim), dtype=np.float32)
+                grown[:self._size] = self._matrix[:self._size]
+                self._matrix = grown
+            row = self._size
+            self._size += 1
+            self._ids.append(note_id)
+            self._rows[note_id] = row
+        self._matrix[row] = vector
+
+    def remove(self, note_id: int):
+        row = self._rows.pop(note_id, None)
+        if row is None:
+            return
+        last = self._size - 1
+        if row != last:
+            # Move the last row into the gap so the live rows stay contiguous.
+            moved_id = self._ids[last]
+            self._matrix[row] = self._matrix[last]
+            self._ids[row] = moved_id
+            self._rows[moved_id] = row
+        self._ids.pop()
+        self._size -= 1
+
+    def top_k_many(self, queries: np.ndarray, k: int, exclude=None) -> list:
+        """Return, per query row, up to ``k`` ``(note_id, score)`` pairs, best first.
+
+        ``exclude`` is an optional per-query note id to skip (usually the
+        query note itself).
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if self._size == 0:
+            return [[] for _ in queries]
+        scores = self._matrix[:self._size] @ queries.T  # (n, m)
+        if exclude is not None:
+            for column, note_id in enumerate(exclude):
+                row = self._rows.get(note_id)
+                if row is not None:
+                    scores[row, column] = -np.inf
+        k = min(k, self._size)
+        top = np.argpartition(-scores, k - 1, axis=0)[:k]
+        results = []
+        for column in range(scores.shape[1]):
+            rows = top[:, column]
+            rows = rows[np.argsort(-scores[rows, column])]
+            results.append([
+                (self._ids[row], float(scores[row, column]))
+                for row in rows if np.isfinite(scores[row, column])
+            ])
+        return results
+
+    def top_k(self, query: np.ndarray, k: int, exclude: int = None) -> list:
+        return self.top_k_many(query, k, None if exclude is None else [exclude])[0]
+
+
+def _state_token(user_id: int, model: str):
+    """Cheap fingerprint of the stored embeddings for staleness checks."""
+    return tuple(db.session.execute(
+        db.select(db.func.count(), db.func.max(NoteEmbedding.updated_at)).where(
+            NoteEmbedding.user_id == user_id, NoteEmbedding.model == model
+        )
+    ).one())
+
+
+class IndexRegistry:
+    """LRU of per-user ``VectorIndex`` objects for this process."""
+
+    def __init__(self, max_users: int = EMBEDDING_INDEX_MAX_USERS):
+        self.max_users = max_users
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> VectorIndex:
+        embedder = get_embedder()
+        ensure_embeddings(user_id)
+        token = _state_token(user_id, embedder.name)
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is not None:
+                self._indexes.move_to_end(user_id)
+        if index is not None and index.token == token:
+            return index
+
+        rows = db.session.execute(
+            db.select(NoteEmbedding.note_id, NoteEmbedding.vector).where(
+                NoteEmbedding.user_id == user_id, NoteEmbedding.model == embedder.name
+            ).order_by(NoteEmbedding.note_id)
+        ).all()
+        index = VectorIndex(embedder.dim, [row.note_id for row in rows],
+                            from_blobs([row.vector for row in rows], embedder.dim))
+        index.token = token
+        with self._lock:
+            self._indexes[user_id] = index
+            self._indexes.move_to_end(user_id)
+            while len(self._indexes) > self.max_users:
+                self._indexes.popitem(last=False)
+        logger.info(f"Loaded vector index for user {user_id} ({len(index)} notes)")
+        return index
+
+    def loaded(self, user_id: int):
+        with self._lock:
+            return self._indexes.get(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+
+registry = IndexRegistry()
+
+
+def _content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _write_embeddings(user_id: int, notes: list):
+    """Embed ``(note_id, text)`` pairs in batches and upsert their rows; returns vectors by id."""
+    embedder = get_embedder()
+    vectors = {}
+    for start in range(0, len(notes), EMBEDDING_BATCH_SIZE):
+        batch = notes[start:start + EMBEDDING_BATCH_SIZE]
+        matrix = embedder.embed([text for _, text in batch])
+        note_ids = [note_id for note_id, _ in batch]
+        now = datetime.utcnow()
+        db.session.execute(db.delete(NoteEmbedding).where(NoteEmbedding.note_id.in_(note_ids)))
+        db.session.execute(db.insert(NoteEmbedding), [{
+            "note_id": note_id,
+            "user_id": user_id,
+            "model": embedder.name,
+            "dim": embedder.dim,
+            "vector": to_blob(vector),
+            "content_hash": _content_hash(text),
+            "updated_at": now
+        } for (note_id, text), vector in zip(batch, matrix)])
+        vectors.update(zip(note_ids, matrix))
+    db.session.commit()
+    return vectors
+
+
+def ensure_embeddings(user_id: int) -> int:
+    """Embed the user's notes that have no embedding for the current model yet."""
+    embedder = get_embedder()
+    missing = db.session.execute(
+        db.select(Note.id, Note.title, Note.content).where(
+            Note.user_id == user_id,
+            ~db.exists().where(NoteEmbedding.note_id == Note.id, NoteEmbedding.model == embedder.name)
+        ).order_by(Note.id)
+    ).all()
+    if missing:
+        _write_embeddings(user_id, [(row.id, note_text(row.title, row.content)) for row in missing])
+        logger.info(f"Embedded {len(missing)} notes for user {user_id}")
+    return len(missing)
+
+
+def update_note(note):
+    """Re-embed ``note`` after a save if its text changed, and update a loaded index."""
+    embedder = get_embedder()
+    text = note_text(note.title, note.content)
+    existing = db.session.get(NoteEmbedding, note.id)
+    if existing is not None and existing.model == embedder.name and existing.content_hash == _content_hash(text):
+        return
+    vector = _write_embeddings(note.user_id, [(note.id, text)])[note.id]
+    index = registry.loaded(note.user_id)
+    if index is not None:
+        with index.lock:
+            index.upsert(note.id, vector)
+            index.token = _state_token(note.user_id, embedder.name)
+
+
+def remove_note(note_id: int, user_id: int):
+    """Drop a note's embedding row in the caller's transaction.
+
+    Call ``sync_index`` after committing to drop it from a loaded index.
+    """
+    db.session.execute(db.delete(NoteEmbedding).where(NoteEmbedding.note_id == note_id))
+
+
+def sync_index(user_id: int, removed=()):
+    """Apply committed removals to a loaded index without a full reload."""
+    index = registry.loaded(user_id)
+    if index is None:
+        return
+    with index.lock:
+        for note_id in removed:
+            index.remove(note_id)
+        index.token = _state_token(user_id, get_embedder().name)
+
+
+def related_notes(user_id: int, note, k: int = RELATED_NOTES_LIMIT) -> list:
+    """Return the user's notes most similar to ``note`` as ``{'id', 'title', 'score'}`` dicts."""
+    index = registry.get(user_id)
+    with index.lock:
+        query = index.vector(note.id)
+        if query is None:
+            query = get_embedder().embed([note_text(note.title, note.content)])[0]
+        matches = index.top_k(query, k, exclude=note.id)
+    if not matches:
+        return []
+    titles = dict(db.session.execute(
+        db.select(Note.id, Note.title).where(Note.id.in_([note_id for note_id, _ in matches]))
+    ).all())
+    return [
+        {"id": note_id, "title": titles[note_id], "score": round(score, 4)}
+        for note_id, score in matches if note_id in titles
+    ]
+
+
+def rebuild_embeddings() -> int:
+    """Re-embed every note with the current embedder; returns the number embedded."""
+    db.session.execute(db.delete(NoteEmbedding))
+    db.session.commit()
+    registry.clear()
+    total = 0
+    for (user_id,) in db.session.execute(db.select(Note.user_id).distinct()).all():
+        total += ensure_embeddings(user_id)
+    return total
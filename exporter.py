@@ -0,0 +1,258 @@
+"""Streaming export of a user's notes, tags, shares and AI interaction threads.
+
+Notes are read through a server-side cursor (``yield_per``) as plain column
+rows, so nothing accumulates in the session identity map; tags, shares and
+interactions are fetched with one query per batch.  Output is produced
+incrementally as NDJSON lines or zip entries, keeping memory flat regardless
+of account size.
+
+``since`` makes the export incremental.  It then contains a ``deleted``
+tombstone for every note deleted after that time, followed by the full
+current record of every note that was edited or imported, or whose tags,
+shares or interactions changed.  Applying the tombstones and then
+replacing each listed note brings a copy up to date.  Changes that
+``Note.updated_at`` does not show are logged in ``note_change`` by
+``record_changes``.
+"""
+import os
+import re
+import json
+import zipfile
+import logging
+from datetime import datetime
+
+from app import db
+from models import Note, NoteShare, NoteChange, Tag, TagUsage, AIInteraction, User, note_tags
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 500))
+EXPORT_FORMATS = ("ndjson", "zip")
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def parse_since(value: str):
+    """Parse an ISO timestamp for incremental exports; raises ValueError if invalid."""
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).replace(tzinfo=None)
+
+
+def record_changes(note_ids, kind: str, owner_id: int = None):
+    """Log a ``kind`` change to ``note_ids`` (those ``owner_id`` owns, if given) in the caller's transaction.
+
+    Call it before deleting a note.  Notes not yet in the database are
+    skipped; a new note's timestamps already put it in the next export.
+    """
+    note_ids = list(note_ids)
+    if not note_ids:
+        return
+    now = datetime.utcnow()
+    notes = db.select(Note.id, Note.user_id, db.literal(kind, db.String), db.literal(now, db.DateTime)).where(
+        Note.id.in_(note_ids))
+    if owner_id is not None:
+        notes = notes.where(Note.user_id == owner_id)
+    # No autoflush: callers are often midway through changing the note.
+    with db.session.no_autoflush:
+        db.session.execute(db.insert(NoteChange).from_select(["note_id", "user_id", "kind", "changed_at"], notes))
+
+
+def _note_query(user_id: int, since):
+    query = db.select(
+        Note.id, Note.title, Note.content, Note.category, Note.created_at, Note.updated_at
+    ).where(Note.user_id == user_id)
+    if since is not None:
+        query = query.where(db.or_(
+            Note.updated_at > since,
+            db.exists().where(AIInteraction.note_id == Note.id, AIInteraction.created_at > since),
+            db.exists().where(NoteShare.note_id == Note.id, NoteShare.shared_at > since),
+            db.exists().where(NoteChange.note_id == Note.id, NoteChange.changed_at > since)
+        ))
+    return query.order_by(Note.id)
+
+
+def _related(note_ids: list):
+    """Return ``(tags, shares, interactions)`` dicts keyed by note id for one batch."""
+    tags, shares, interactions = {}, {}, {}
+    for note_id, name in db.session.execute(
+        db.select(note_tags.c.note_id, Tag.name).join(Tag, Tag.id == note_tags.c.tag_id)
+        .where(note_tags.c.note_id.in_(note_ids)).order_by(Tag.name)
+    ):
+        tags.setdefault(note_id, []).append(name)
+    for row in db.session.execute(
+        db.select(NoteShare.note_id, NoteShare.user_id, User.username, NoteShare.can_edit, NoteShare.shared_at)
+        .join(User, User.id == NoteShare.user_id)
+        .where(NoteShare.note_id.in_(note_ids)).order_by(NoteShare.id)
+    ):
+        shares.setdefault(row.note_id, []).append({
+            "user_id": row.user_id,
+            "username": row.username,
+            "can_edit": bool(row.can_edit),
+            "shared_at": _iso(row.shared_at)
+        })
+    for row in db.session.execute(
+        db.select(
+            AIInteraction.id, AIInteraction.note_id, AIInteraction.parent_id, AIInteraction.interaction_type,
+            AIInteraction.model_used, AIInteraction.content, AIInteraction.created_at,
+            AIInteraction.interaction_metadata
+        ).where(AIInteraction.note_id.in_(note_ids)).order_by(AIInteraction.id)
+    ):
+        interactions.setdefault(row.note_id, []).append({
+            "id": row.id,
+            "parent_id": row.parent_id,
+            "type": row.interaction_type,
+            "model": row.model_used,
+            "content": row.content,
+            "created_at": _iso(row.created_at),
+            "metadata": row.interaction_metadata or {}
+        })
+    return tags, shares, interactions
+
+
+def export_records(user_id: int, since=None, batch_size: int = EXPORT_BATCH_SIZE):
+    """Yield export records: a header, the user's tags, tombstones, one record per note, and a summary.
+
+    Interactions are listed flat in id order with ``parent_id`` links, so
+    threads can be rebuilt.  The header's ``generated_at`` is the value to
+    pass as ``since`` for the next incremental run.  Tags are always listed
+    in full; tombstones only appear in incremental exports.
+    """
+    generated_at = datetime.utcnow()
+    yield {
+        "type": "export",
+        "version": 2,
+        "user_id": user_id,
+        "since": _iso(since),
+        "incremental": since is not None,
+        "generated_at": _iso(generated_at)
+    }
+
+    tag_rows = db.session.execute(
+        db.select(Tag.name, Tag.created_at, db.func.coalesce(TagUsage.note_count, 0))
+        .outerjoin(TagUsage, TagUsage.tag_id == Tag.id)
+        .where(Tag.user_id == user_id).order_by(Tag.name)
+        .execution_options(yield_per=batch_size)
+    )
+    tag_total = 0
+    for name, created_at, note_count in tag_rows:
+        tag_total += 1
+        yield {"type": "tag", "name": name, "created_at": _iso(created_at), "note_count": note_count}
+
+    # Tombstones come before notes: SQLite may reuse a deleted note's id.
+    deleted_total = 0
+    if since is not None:
+        for note_id, deleted_at in db.session.execute(
+            db.select(NoteChange.note_id, db.func.max(NoteChange.changed_at))
+            .where(NoteChange.user_id == user_id, NoteChange.kind == "deleted", NoteChange.changed_at > since)
+            .group_by(NoteChange.note_id).order_by(NoteChange.note_id)
+        ):
+            deleted_total += 1
+            yield {"type": "deleted", "id": note_id, "deleted_at": _iso(deleted_at)}
+
+    note_total = 0
+    result = db.session.execute(_note_query(user_id, since).execution_options(yield_per=batch_size))
+    for batch in result.partitions():
+        tags, shares, interactions = _related([row.id for row in batch])
+        for row in batch:
+            note_total += 1
+            yield {
+                "type": "note",
+                "id": row.id,
+                "title": row.title,
+                "content": row.content,
+                "category": row.category,
+                "created_at": _iso(row.created_at),
+                "updated_at": _iso(row.updated_at),
+                "tags": tags.get(row.id, []),
+                "shares": shares.get(row.id, []),
+                "interactions": interactions.get(row.id, [])
+            }
+
+    logger.info(f"Exported {note_total} notes for user {user_id}")
+    yield {"type": "summary", "notes": note_total, "tags": tag_total, "deleted": deleted_total}
+
+
+def iter_ndjson(records):
+    """Encode records as NDJSON byte lines."""
+    for record in records:
+        yield (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+class _ChunkSink:
+    """Write-only, tell-able file object that hands written bytes back to a generator."""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _slug(title: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "-", title or "").strip("-").lower()[:60] or "note"
+
+
+def _markdown(note: dict) -> str:
+    """Render a note with front matter that ``importer.iter_markdown_zip`` reads back."""
+    lines = ["---", f"title: {note['title']}", f"tags: [{', '.join(note['tags'])}]"]
+    if note["category"]:
+        lines.append(f"category: {note['category']}")
+    lines += [f"created_at: {note['created_at']}", f"updated_at: {note['updated_at']}", "---", ""]
+    return "\n".join(lines) + note["content"]
+
+
+def iter_zip(records):
+    """Encode records as a zip archive streamed in pieces.
+
+    Each note becomes ``notes/<id>-<slug>.md`` plus ``notes/<id>.json`` with
+    its shares and interactions; tags, tombstones and the header/summary go
+    into ``tags.json``, ``deleted.json`` and ``manifest.json``.  Entries use data descriptors, so
+    the archive never needs to be seeked or held in memory.
+    """
+    sink = _ChunkSink()
+    manifest, tag_list, deleted = {}, [], []
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for record in records:
+            kind = record["type"]
+            if kind == "note":
+                archive.writestr(f"notes/{record['id']}-{_slug(record['title'])}.md", _markdown(record))
+                archive.writestr(f"notes/{record['id']}.json", json.dumps(record, ensure_ascii=False, indent=2))
+            elif kind == "tag":
+                tag_list.append(record)
+            elif kind == "deleted":
+                deleted.append(record)
+            else:
+                manifest.update({key: value for key, value in record.items() if key != "type"})
+            data = sink.drain()
+            if data:
+                yield data
+        archive.writestr("tags.json", json.dumps(tag_list, ensure_ascii=False, indent=2))
+        if manifest.get("incremental"):
+            archive.writestr("deleted.json", json.dumps(deleted, indent=2))
+        archive.writestr("manifest.json", json.dumps(manifest, indent=2))
+    yield sink.drain()
+
+
+def export_stream(user_id: int, fmt: str = "ndjson", since=None):
+    """Return a byte-chunk generator for a ``fmt`` export of ``user_id``'s data."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    records = export_records(user_id, since)
+    return iter_zip(records) if fmt == "zip" else iter_ndjson(records)
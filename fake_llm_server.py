@@ -0,0 +1,256 @@
+"""Local stand-in for the OpenAI, Anthropic and Mistral HTTP APIs.
+
+Serves chat completions (plain, JSON and streamed), Anthropic messages,
+Whisper transcriptions and embeddings with canned but well-formed
+answers, after a latency drawn from a named profile, and injects 5xx and
+429 failures at the profile's rates.  Point ``OPENAI_BASE_URL`` (and
+``ANTHROPIC_BASE_URL`` / ``MISTRAL_BASE_URL``) at it to run the app, or
+``benchmark.py``, without network access or API spend::
+
+    python fake_llm_server.py --port 8089 --profile realistic
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=x python main.py
+"""
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Latency in ms: base plus Gaussian jitter, with a fraction of slow-tail
+# requests; then a fraction of 500s and of 429s (with Retry-After).
+PROFILES = {
+    "instant": {"latency_ms": 0, "jitter_ms": 0, "tail_rate": 0, "tail_ms": 0, "error_rate": 0, "rate_limit_rate": 0},
+    "fast": {"latency_ms": 30, "jitter_ms": 10, "tail_rate": 0, "tail_ms": 0, "error_rate": 0, "rate_limit_rate": 0},
+    "realistic": {"latency_ms": 700, "jitter_ms": 250, "tail_rate": 0.05, "tail_ms": 4000,
+                  "error_rate": 0.01, "rate_limit_rate": 0.01},
+    "degraded": {"latency_ms": 1500, "jitter_ms": 700, "tail_rate": 0.15, "tail_ms": 8000,
+                 "error_rate": 0.1, "rate_limit_rate": 0.1},
+    "outage": {"latency_ms": 100, "jitter_ms": 50, "tail_rate": 0, "tail_ms": 0, "error_rate": 1.0, "rate_limit_rate": 0},
+}
+
+WORDS = ("idea concept insight pattern system design research method signal network model context "
+         "structure growth process theory practice example detail question answer").split()
+
+
+def _words(seed: str, count: int) -> list:
+    rng = random.Random(hashlib.sha256(seed.encode("utf-8")).hexdigest())
+    return [rng.choice(WORDS) for _ in range(count)]
+
+
+def _from_schema(schema: dict, seed: str):
+    kind = schema.get("type")
+    if kind == "object":
+        return {key: _from_schema(spec, seed + key) for key, spec in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [_from_schema(schema.get("items", {"type": "string"}), seed + str(i)) for i in range(3)]
+    if kind in ("integer", "number"):
+        return 1
+    if kind == "boolean":
+        return True
+    return " ".join(_words(seed, 6))
+
+
+def chat_reply(prompt: str, max_tokens: int, response_format: dict = None) -> str:
+    """A plausible reply for the app's prompts, deterministic in the prompt."""
+    if response_format and response_format.get("type") == "json_schema":
+        return json.dumps(_from_schema(response_format["json_schema"]["schema"], prompt))
+    if response_format:
+        notes = len(re.findall(r"^\s*Note \d+:", prompt, re.M))
+        return json.dumps({"results": [
+            {"index": i, "category": _words(prompt + str(i), 1)[0].title(), "tags": _words(prompt + str(i), 3)}
+            for i in range(notes)
+        ]})
+    if "separated by commas" in prompt:
+        return ", ".join(_words(prompt, 4))
+    if "one word" in prompt:
+        return _words(prompt, 1)[0].title()
+    return " ".join(_words(prompt, max(1, min(max_tokens or 100, 120) * 3 // 4)))
+
+
+class FakeLLMServer:
+    """Threaded HTTP server; ``start()`` runs it in the background and returns the base URL."""
+
+    def __init__(self, profile: str = "fast", host: str = "127.0.0.1", port: int = 0, seed: int = 0):
+        self.profile = dict(PROFILES[profile], name=profile)
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.counts = {"requests": 0, "errors": 0, "rate_limited": 0}
+        self.counts_lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fake-llm", daemon=True)
+        self.thread.start()
+        return self.url
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def stats(self) -> dict:
+        with self.counts_lock:
+            return dict(self.counts, profile=self.profile["name"])
+
+    def _count(self, name: str):
+        with self.counts_lock:
+            self.counts[name] += 1
+
+    def _draw(self):
+        """Return ``(delay_seconds, failure)`` where failure is None, 'error' or 'rate_limit'."""
+        profile = self.profile
+        with self.rng_lock:
+            delay = max(0.0, self.rng.gauss(profile["latency_ms"], profile["jitter_ms"]))
+            if self.rng.random() < profile["tail_rate"]:
+                delay += profile["tail_ms"]
+            roll = self.rng.random()
+        if roll < profile["error_rate"]:
+            return delay / 1000.0, "error"
+        if roll < profile["error_rate"] + profile["rate_limit_rate"]:
+            return delay / 1000.0, "rate_limit"
+        return delay / 1000.0, None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body, content_type: str = "application/json", headers: dict = None):
+                data = body if isinstance(body, bytes) else (
+                    body.encode("utf-8") if isinstance(body, str) else json.dumps(body).encode("utf-8"))
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.rstrip("/") == "/stats":
+                    self._send(200, server.stats())
+                else:
+                    self._send(404, {"error": {"message": "not found"}})
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                server._count("requests")
+                delay, failure = server._draw()
+                if "audio/transcriptions" in self.path:
+                    delay *= 1 + len(raw) / (32000 * 60)  # about a minute of 16 kHz mono per unit
+                time.sleep(delay)
+                if failure == "error":
+                    server._count("errors")
+                    return self._send(500, {"error": {"message": "injected failure", "type": "server_error"}})
+                if failure == "rate_limit":
+                    server._count("rate_limited")
+                    return self._send(429, {"error": {"message": "injected rate limit", "type": "rate_limit"}},
+                                      headers={"Retry-After": "0.5"})
+                if self.path.endswith("/chat/completions"):
+                    return self._chat(json.loads(raw or b"{}"))
+                if self.path.endswith("/messages"):
+                    return self._messages(json.loads(raw or b"{}"))
+                if self.path.endswith("/audio/transcriptions"):
+                    return self._transcription(raw)
+                if self.path.endswith("/embeddings"):
+                    return self._embeddings(json.loads(raw or b"{}"))
+                self._send(404, {"error": {"message": "not found"}})
+
+            def _chat(self, body: dict):
+                prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+                text = chat_reply(prompt, body.get("max_tokens"), body.get("response_format"))
+                usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4,
+                         "total_tokens": (len(prompt) + len(text)) // 4}
+                model = body.get("model", "gpt-4o")
+                if not body.get("stream"):
+                    return self._send(200, {
+                        "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()), "model": model,
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": text}}],
+                        "usage": usage,
+                    })
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                base = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                        "model": model}
+                events = [dict(base, choices=[{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}])
+                          for word in text.split()]
+                events.append(dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    events.append(dict(base, choices=[], usage=usage))
+                for event in events:
+                    self._chunk(f"data: {json.dumps(event)}\n\n")
+                    time.sleep(0.002)
+                self._chunk("data: [DONE]\n\n")
+                self._chunk("")
+
+            def _chunk(self, text: str):
+                data = text.encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def _messages(self, body: dict):
+                prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+                schema_hint = "JSON schema" in (body.get("system") or "")
+                text = json.dumps(_from_schema(json.loads(body["system"].split("JSON schema: ", 1)[1]), prompt)) \
+                    if schema_hint else chat_reply(prompt, body.get("max_tokens"))
+                self._send(200, {
+                    "id": "msg_fake", "type": "message", "role": "assistant", "model": body.get("model"),
+                    "content": [{"type": "text", "text": text}], "stop_reason": "end_turn",
+                    "usage": {"input_tokens": len(prompt) // 4, "output_tokens": len(text) // 4},
+                })
+
+            def _transcription(self, raw: bytes):
+                text = f"Transcript of {len(raw)} bytes: " + " ".join(_words(hashlib.sha256(raw).hexdigest(), 20))
+                if b'name="response_format"\r\n\r\ntext' in raw:
+                    return self._send(200, text, "text/plain; charset=utf-8")
+                self._send(200, {"text": text})
+
+            def _embeddings(self, body: dict):
+                inputs = body.get("input") or []
+                inputs = [inputs] if isinstance(inputs, str) else inputs
+                dim = int(body.get("dimensions") or 256)
+                data = []
+                for index, text in enumerate(inputs):
+                    rng = random.Random(hashlib.sha256(str(text).encode("utf-8")).hexdigest())
+                    data.append({"object": "embedding", "index": index,
+                                 "embedding": [rng.uniform(-1, 1) for _ in range(dim)]})
+                self._send(200, {"object": "list", "data": data, "model": body.get("model"),
+                                 "usage": {"prompt_tokens": sum(len(str(t)) // 4 for t in inputs), "total_tokens": 0}})
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="fast")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    server = FakeLLMServer(args.profile, args.host, args.port, args.seed)
+    print(f"Fake LLM server ({args.profile}) on {server.url}/v1", file=sys.stderr)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
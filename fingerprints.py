@@ -0,0 +1,195 @@
+"""Content fingerprints and threshold-driven background re-processing of notes.
+
+Each note carries an exact ``content_fingerprint`` (sha256 of normalized
+text) and a MinHash ``content_signature`` over word shingles.  For every
+derived result (``analysis``: category/tags/summary/suggestions, and
+``embedding``) ``note_task_state`` remembers the signature it was computed
+from.  On save the estimated change since then is compared with a per-task
+threshold; only tasks past it are queued for background recomputation, and
+until then the stored results keep being served.
+"""
+import os
+import hashlib
+import logging
+from datetime import datetime
+
+import numpy as np
+
+from app import db
+from models import Note, NoteTaskState
+from llm_cache import normalize_content
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_SIZE = 64
+SHINGLE_SIZE = 3
+REPROCESS_THRESHOLDS = {
+    "analysis": float(os.environ.get("AI_REANALYZE_THRESHOLD", 0.2)),
+    "embedding": float(os.environ.get("EMBEDDING_REFRESH_THRESHOLD", 0.05)),
+}
+
+# Fixed multiply-shift hash family, so signatures compare across processes.
+_rng = np.random.default_rng(20241118)
+_A = _rng.integers(1, 2 ** 63, size=SIGNATURE_SIZE, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 2 ** 63, size=SIGNATURE_SIZE, dtype=np.uint64)
+
+
+def fingerprint(content: str) -> str:
+    return hashlib.sha256(normalize_content(content).encode("utf-8")).hexdigest()
+
+
+def signature(content: str) -> bytes:
+    """MinHash of the word shingles of ``content`` as ``SIGNATURE_SIZE`` uint32s."""
+    words = normalize_content(content).lower().split()
+    size = min(SHINGLE_SIZE, len(words)) or 1
+    shingles = {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in shingles),
+        dtype=np.uint64, count=len(shingles)
+    )
+    with np.errstate(over="ignore"):
+        mixed = (_A[:, None] * hashes[None, :] + _B[:, None]) >> np.uint64(32)
+    return mixed.min(axis=1).astype("<u4").tobytes()
+
+
+def diff_score(old_signature: bytes, new_signature: bytes) -> float:
+    """Estimated fraction of changed content, 0.0 (same) to 1.0 (unrelated)."""
+    if not old_signature or not new_signature:
+        return 1.0
+    old = np.frombuffer(old_signature, dtype="<u4")
+    new = np.frombuffer(new_signature, dtype="<u4")
+    return float(1.0 - np.mean(old == new))
+
+
+def stamp(note) -> bool:
+    """Refresh ``note``'s fingerprint and signature; returns True if the text changed."""
+    new_fingerprint = fingerprint(note.content)
+    if note.content_fingerprint == new_fingerprint and note.content_signature:
+        return False
+    note.content_fingerprint = new_fingerprint
+    note.content_signature = signature(note.content)
+    return True
+
+
+def _states(note_id: int) -> dict:
+    return {state.task: state for state in NoteTaskState.query.filter_by(note_id=note_id)}
+
+
+def stale_tasks(note, model: str = None) -> list:
+    """Tasks whose stored result drifted past their threshold for ``note``'s current text."""
+    states = _states(note.id)
+    stale = []
+    for task, threshold in REPROCESS_THRESHOLDS.items():
+        state = states.get(task)
+        if state is None or (task == "analysis" and model and state.model != model):
+            stale.append(task)
+        elif state.fingerprint != note.content_fingerprint and \
+                diff_score(state.signature, note.content_signature) >= threshold:
+            stale.append(task)
+    return stale
+
+
+def fresh_result(note, task: str, model: str = None, content: str = None):
+    """Return the stored result of ``task`` if it is still close enough to the text.
+
+    ``content`` is the text the caller wants results for (unsaved editor
+    text, say); by default the note's saved content.
+    """
+    state = NoteTaskState.query.filter_by(note_id=note.id, task=task).first()
+    if state is None or state.result is None or (model and state.model != model):
+        return None
+    if content is None or content == note.content:
+        current_fingerprint, current_signature = note.content_fingerprint, note.content_signature
+    else:
+        current_fingerprint, current_signature = fingerprint(content), None
+    if state.fingerprint == current_fingerprint:
+        return state.result
+    if current_signature is None:
+        current_signature = signature(content)
+    if diff_score(state.signature, current_signature) < REPROCESS_THRESHOLDS[task]:
+        return state.result
+    return None
+
+
+def _record(note_id: int, task: str, model: str, current_fingerprint: str, current_signature: bytes, result=None):
+    state = NoteTaskState.query.filter_by(note_id=note_id, task=task).first()
+    if state is None:
+        state = NoteTaskState(note_id=note_id, task=task)
+        db.session.add(state)
+    state.fingerprint = current_fingerprint
+    state.signature = current_signature
+    state.model = model
+    state.result = result
+    state.analyzed_at = datetime.utcnow()
+
+
+def schedule(note, user_id: int, model: str = None):
+    """Queue background recomputation of ``note``'s stale tasks; returns their names."""
+    from jobs import submit_job
+
+    tasks = stale_tasks(note, model)
+    if tasks:
+        # The version keeps a job for older text from absorbing a later save's job.
+        submit_job(user_id, "reprocess_note", {"user_id": user_id, "note_id": note.id, "tasks": tasks, "model": model,
+                                               "version": note.version or 1}, internal=True)
+    return tasks
+
+
+def forget(note_id: int):
+    """Delete a note's task state in the caller's transaction, e.g. before deleting the note."""
+    NoteTaskState.query.filter_by(note_id=note_id).delete(synchronize_session=False)
+
+
+def reprocess_note(note_id: int, tasks: list, model: str = None, version: int = None, user_id: int = None) -> dict:
+    """Recompute ``tasks`` for a note and record the signature they were computed from.
+
+    ``version`` is the note version the job was queued for.  If the note is
+    saved again before the results are written, nothing is stored and the
+    note's now-stale tasks are queued afresh for ``user_id``.
+    """
+    from ai_helper import analyze_note, AIModel
+    import embeddings
+
+    note = db.session.get(Note, note_id)
+    if note is None:
+        return {"skipped": "note deleted"}
+    if version is None:
+        version = note.version or 1
+    if (note.version or 1) != version:
+        return _superseded(note_id, user_id, model)
+    current_fingerprint, current_signature = fingerprint(note.content), signature(note.content)
+    # Background results must not move the note in the updated_at ordering.
+    values = {
+        "content_fingerprint": current_fingerprint,
+        "content_signature": current_signature,
+        "updated_at": Note.updated_at
+    }
+    done = []
+    if "analysis" in tasks:
+        analysis_model = model or AIModel.GPT4O_MINI.value
+        analysis = analyze_note(note.content, analysis_model)
+        if analysis["category"]:
+            values["category"] = analysis["category"]
+        _record(note_id, "analysis", analysis_model, current_fingerprint, current_signature, analysis)
+        done.append("analysis")
+    if "embedding" in tasks:
+        embeddings.update_note(note)
+        _record(note_id, "embedding", embeddings.get_embedder().name, current_fingerprint, current_signature)
+        done.append("embedding")
+    written = db.session.execute(
+        db.update(Note).where(Note.id == note_id, db.func.coalesce(Note.version, 1) == version).values(**values)
+    ).rowcount
+    if not written:
+        db.session.rollback()
+        return _superseded(note_id, user_id, model)
+    db.session.commit()
+    return {"note_id": note_id, "tasks": done}
+
+
+def _superseded(note_id: int, user_id: int, model: str = None) -> dict:
+    """Queue the tasks that are stale for a note's current text, after a save overtook a job."""
+    note = db.session.get(Note, note_id)
+    if note is None:
+        return {"skipped": "note deleted"}
+    requeued = schedule(note, user_id, model) if user_id else []
+    return {"skipped": "note changed", "requeued": requeued}
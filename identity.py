@@ -0,0 +1,163 @@
+"""Cheap user loading for Flask-Login.
+
+``load_user`` runs on every authenticated request.  Instead of a full
+``User`` row it returns an ``Identity`` with just the columns request
+handling reads, kept in a per-process cache for ``IDENTITY_CACHE_TTL``
+seconds.  A session ``after_flush`` hook drops a user's entry when their
+password, username or email changes or the user is deleted; other
+workers notice within the TTL.
+
+With ``IDENTITY_SESSION_FAST_PATH=1`` the identity is also stamped into
+the (signed) session cookie, and requests under
+``IDENTITY_FAST_PATH_PREFIXES`` are authorized from the stamp without
+touching the database while it is younger than
+``IDENTITY_SESSION_MAX_AGE`` seconds.  A deleted user or changed password
+is therefore noticed by those routes only once the stamp expires (or at
+once in the worker that made the change).
+"""
+import os
+import time
+import logging
+import threading
+
+from flask import session, request, has_request_context
+from flask_login import UserMixin
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app import db, login_manager
+from models import User
+
+logger = logging.getLogger(__name__)
+
+IDENTITY_CACHE_TTL = float(os.environ.get("IDENTITY_CACHE_TTL", 30))  # seconds; 0 disables the cache
+IDENTITY_CACHE_SIZE = int(os.environ.get("IDENTITY_CACHE_SIZE", 10000))
+IDENTITY_SESSION_FAST_PATH = os.environ.get("IDENTITY_SESSION_FAST_PATH", "0") == "1"
+IDENTITY_SESSION_MAX_AGE = float(os.environ.get("IDENTITY_SESSION_MAX_AGE", 300))  # seconds
+IDENTITY_FAST_PATH_PREFIXES = tuple(
+    prefix.strip() for prefix in os.environ.get("IDENTITY_FAST_PATH_PREFIXES", "/api/").split(",") if prefix.strip())
+
+SESSION_KEY = "_identity"
+# Changes to these columns invalidate cached identities and session stamps.
+IDENTITY_COLUMNS = ("username", "email", "password_hash")
+
+_cache = {}  # user id -> (expires at, Identity)
+_revoked = {}  # user id -> time of the last change; older session stamps are ignored
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "session": 0, "invalidations": 0}
+
+
+class Identity(UserMixin):
+    """The authenticated user as request handlers see it: no ORM state, nothing to lazy-load."""
+
+    def __init__(self, id: int, username: str):
+        self.id = id
+        self.username = username
+
+    def __eq__(self, other):
+        return isinstance(other, (Identity, User)) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f"<Identity {self.id} {self.username}>"
+
+
+def _count(name: str):
+    with _lock:
+        _stats[name] += 1
+
+
+def stats() -> dict:
+    with _lock:
+        return dict(_stats, cached=len(_cache))
+
+
+def invalidate(user_id: int):
+    """Forget ``user_id``'s cached identity and any session stamp issued before now."""
+    with _lock:
+        _cache.pop(user_id, None)
+        _revoked[user_id] = time.time()
+        _stats["invalidations"] += 1
+
+
+def forget():
+    """Drop the session stamp, e.g. on logout."""
+    if has_request_context():
+        session.pop(SESSION_KEY, None)
+
+
+def clear():
+    with _lock:
+        _cache.clear()
+        _revoked.clear()
+
+
+def get(user_id: int):
+    """The ``Identity`` for ``user_id``, from the cache or one narrow SELECT; None if there is no such user."""
+    now = time.monotonic()
+    if IDENTITY_CACHE_TTL > 0:
+        with _lock:
+            entry = _cache.get(user_id)
+            if entry is not None and entry[0] > now:
+                _stats["hits"] += 1
+                return entry[1]
+            _stats["misses"] += 1
+    row = db.session.execute(
+        db.select(User.id, User.username).where(User.id == user_id)
+    ).first()
+    if row is None:
+        return None
+    identity = Identity(row.id, row.username)
+    if IDENTITY_CACHE_TTL > 0:
+        with _lock:
+            if len(_cache) >= IDENTITY_CACHE_SIZE:
+                _cache.clear()  # crude, but entries are cheap to refill and this bounds memory
+            _cache[user_id] = (now + IDENTITY_CACHE_TTL, identity)
+    return identity
+
+
+def stamp(user):
+    """Record ``user`` in the session for the fast path."""
+    if IDENTITY_SESSION_FAST_PATH and has_request_context():
+        session[SESSION_KEY] = [user.id, user.username, time.time()]
+
+
+def _from_session(user_id: str):
+    stamped = session.get(SESSION_KEY)
+    if not stamped or len(stamped) != 3 or str(stamped[0]) != user_id:
+        return None
+    issued_at = stamped[2]
+    if time.time() - issued_at > IDENTITY_SESSION_MAX_AGE:
+        return None
+    with _lock:
+        if _revoked.get(stamped[0], 0) >= issued_at:
+            return None
+    return Identity(stamped[0], stamped[1])
+
+
+@login_manager.user_loader
+def load_user(id):
+    stamped = None
+    if IDENTITY_SESSION_FAST_PATH and has_request_context():
+        stamped = _from_session(id)
+        if stamped is not None and request.path.startswith(IDENTITY_FAST_PATH_PREFIXES):
+            _count("session")
+            return stamped
+    user = get(int(id))
+    if user is not None and stamped is None:
+        stamp(user)
+    return user
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_changed_users(session, flush_context):
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            state = inspect(obj)
+            if any(state.attrs[column].history.has_changes() for column in IDENTITY_COLUMNS):
+                invalidate(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            invalidate(obj.id)
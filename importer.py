@@ -0,0 +1,248 @@
+"""Streaming bulk import of notes from NDJSON or a zip of Markdown files.
+
+Records are consumed lazily and written in chunks: one multi-row INSERT for
+the notes, a bulk tag resolve, one executemany for the tag links and a
+commit per chunk, so memory and transaction size stay bounded whatever the
+input size.  AI categorization can be queued afterwards in batches.
+"""
+import os
+import io
+import json
+import time
+import logging
+import zipfile
+from collections import Counter
+from datetime import datetime
+
+from app import db
+from models import Note, note_tags
+import search
+import tags
+from exporter import record_changes
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", 500))
+CATEGORIZE_BATCH_SIZE = int(os.environ.get("IMPORT_CATEGORIZE_BATCH_SIZE", 20))
+MARKDOWN_EXTENSIONS = (".md", ".markdown", ".txt")
+
+
+class ImportFormatError(ValueError):
+    """Raised when an import payload cannot be read at all."""
+
+
+def iter_ndjson(stream):
+    """Yield one dict per non-blank line of a binary or text NDJSON stream."""
+    for line_number, line in enumerate(stream, 1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield {"_error": f"line {line_number}: invalid JSON"}
+            continue
+        yield record if isinstance(record, dict) else {"_error": f"line {line_number}: not an object"}
+
+
+def _parse_front_matter(text: str):
+    """Split simple ``key: value`` front matter from a Markdown document."""
+    if not text.startswith("---"):
+        return {}, text
+    end = text.find("\n---", 3)
+    if end == -1:
+        return {}, text
+    meta = {}
+    for line in text[3:end].splitlines():
+        if ":" in line:
+            key, value = line.split(":", 1)
+            meta[key.strip().lower()] = value.strip()
+    return meta, text[end + 4:].lstrip("\n")
+
+
+def iter_markdown_zip(fileobj):
+    """Yield one record per Markdown/text file in a zip archive.
+
+    The title comes from front matter, then the first ``#`` heading, then the
+    file name; ``tags:`` front matter accepts ``a, b`` or ``[a, b]``.
+    """
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile:
+        raise ImportFormatError("Not a valid zip archive")
+    with archive:
+        for info in archive.infolist():
+            if info.is_dir() or not info.filename.lower().endswith(MARKDOWN_EXTENSIONS):
+                continue
+            with archive.open(info) as member:
+                text = io.TextIOWrapper(member, encoding="utf-8", errors="replace").read()
+            meta, body = _parse_front_matter(text)
+            title = meta.get("title")
+            if not title:
+                first_line = body.lstrip().split("\n", 1)[0]
+                if first_line.startswith("#"):
+                    title = first_line.lstrip("#").strip()
+            if not title:
+                title = os.path.splitext(os.path.basename(info.filename))[0]
+            yield {
+                "title": title,
+                "content": body,
+                "tags": meta.get("tags", "").strip("[]"),
+                "category": meta.get("category"),
+                "created_at": meta.get("created_at"),
+                "updated_at": meta.get("updated_at")
+            }
+
+
+def open_records(fileobj, filename: str = None, fmt: str = None):
+    """Return a record iterator for ``fileobj``, detecting the format if not given.
+
+    ``fmt`` is 'ndjson' or 'zip'; otherwise a ``.zip`` file name selects the
+    Markdown reader and anything else is read as NDJSON.
+    """
+    if fmt is None:
+        fmt = "zip" if (filename or "").lower().endswith(".zip") else "ndjson"
+    if fmt == "zip":
+        return iter_markdown_zip(fileobj)
+    if fmt == "ndjson":
+        return iter_ndjson(fileobj)
+    raise ImportFormatError(f"Unsupported import format: {fmt}")
+
+
+def _parse_datetime(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        return None
+
+
+def _normalize_record(record: dict):
+    """Return ``(row, tag_names)`` for a note record, or ``None`` if unusable."""
+    if "_error" in record:
+        return None
+    content = record.get("content")
+    if not isinstance(content, str) or not content.strip():
+        return None
+    title = str(record.get("title") or content.strip().split("\n", 1)[0] or "Untitled")[:200]
+    raw_tags = record.get("tags") or []
+    if isinstance(raw_tags, str):
+        raw_tags = raw_tags.split(",")
+    now = datetime.utcnow()
+    created_at = _parse_datetime(record.get("created_at")) or now
+    row = {
+        "title": title,
+        "content": content,
+        "category": (str(record["category"])[:50] if record.get("category") else None),
+        "created_at": created_at,
+        "updated_at": _parse_datetime(record.get("updated_at")) or created_at,
+    }
+    return row, tags.normalize_tag_names(str(tag)[:50] for tag in raw_tags)
+
+
+def _write_chunk(user_id: int, chunk: list) -> list:
+    """Insert one chunk of ``(row, tag_names)`` pairs and return the new note ids."""
+    for row, _ in chunk:
+        row["user_id"] = user_id
+    note_ids = db.session.execute(
+        db.insert(Note).returning(Note.id, sort_by_parameter_order=True),
+        [row for row, _ in chunk]
+    ).scalars().all()
+
+    resolved = tags.resolve_tags(user_id, {name for _, names in chunk for name in names})
+    links, deltas = [], Counter()
+    for note_id, (_, names) in zip(note_ids, chunk):
+        for name in names:
+            tag_id = resolved[name].id
+            links.append({"note_id": note_id, "tag_id": tag_id})
+            deltas[tag_id] += 1
+    if links:
+        db.session.execute(note_tags.insert(), links)
+        tags.apply_usage_deltas(deltas)
+
+    # Core inserts bypass the ORM flush hook that maintains the search index.
+    search.index_notes(db.session.connection(), note_ids)
+    # Imported timestamps may predate the last incremental export.
+    record_changes(note_ids, "imported")
+    db.session.commit()
+    return note_ids
+
+
+def import_notes(user_id: int, records, chunk_size: int = IMPORT_CHUNK_SIZE, categorize: bool = False):
+    """Import ``records`` for ``user_id``, yielding a progress dict after each chunk.
+
+    The final dict has ``done`` set.  With ``categorize`` the imported notes
+    are queued for AI categorization in batches of ``CATEGORIZE_BATCH_SIZE``.
+    """
+    started = time.monotonic()
+    stats = {"imported": 0, "skipped": 0, "chunks": 0, "jobs": 0, "done": False}
+    chunk, pending_ids = [], []
+
+    def flush():
+        note_ids = _write_chunk(user_id, chunk)
+        stats["imported"] += len(note_ids)
+        stats["chunks"] += 1
+        chunk.clear()
+        if categorize:
+            pending_ids.extend(note_ids)
+            while len(pending_ids) >= CATEGORIZE_BATCH_SIZE:
+                _queue_categorization(user_id, pending_ids[:CATEGORIZE_BATCH_SIZE])
+                del pending_ids[:CATEGORIZE_BATCH_SIZE]
+                stats["jobs"] += 1
+        stats["elapsed"] = round(time.monotonic() - started, 3)
+        return dict(stats)
+
+    try:
+        for record in records:
+            normalized = _normalize_record(record)
+            if normalized is None:
+                stats["skipped"] += 1
+                continue
+            chunk.append(normalized)
+            if len(chunk) >= chunk_size:
+                yield flush()
+        if chunk:
+            yield flush()
+    except Exception:
+        db.session.rollback()
+        if pending_ids:
+            # The chunks written so far stay imported; categorize them too.
+            _queue_categorization(user_id, pending_ids)
+        raise
+
+    if pending_ids:
+        _queue_categorization(user_id, pending_ids)
+        stats["jobs"] += 1
+    stats["done"] = True
+    stats["elapsed"] = round(time.monotonic() - started, 3)
+    logger.info(f"Imported {stats['imported']} notes for user {user_id} in {stats['elapsed']}s")
+    yield dict(stats)
+
+
+def _queue_categorization(user_id: int, note_ids: list):
+    from jobs import submit_job
+
+    submit_job(user_id, "categorize_notes_batch", {"user_id": user_id, "note_ids": list(note_ids)}, internal=True)
+
+
+def categorize_notes(user_id: int, note_ids: list) -> dict:
+    """Fill category, and tags where a note has none, for a batch of ``user_id``'s notes."""
+    from ai_helper import categorize_notes_batch
+
+    notes = Note.query.filter(Note.id.in_(note_ids), Note.user_id == user_id).options(
+        db.selectinload(Note.tags)).all()
+    if not notes:
+        return {"updated": 0}
+    results = categorize_notes_batch([note.content for note in notes])
+    updated = 0
+    for note, result in zip(notes, results):
+        if result["category"]:
+            note.category = result["category"]
+            updated += 1
+        if result["tags"] and not note.tags:
+            tags.set_note_tags(note, result["tags"], note.user_id)
+    db.session.commit()
+    return {"updated": updated}
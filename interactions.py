@@ -0,0 +1,129 @@
+"""Persistence and loading of threaded AI interactions for a note.
+
+Threads are read with a single recursive CTE per page instead of walking the
+``lazy='dynamic'`` ``responses`` relationship, which issues one query per
+node.
+"""
+import os
+
+from app import db
+from models import AIInteraction
+
+THREAD_PAGE_SIZE = 20
+CONTEXT_MAX_ITEMS = int(os.environ.get("AI_CONTEXT_MAX_ITEMS", 6))
+CONTEXT_MAX_CHARS = int(os.environ.get("AI_CONTEXT_MAX_CHARS", 4000))
+
+
+class InteractionError(ValueError):
+    """Raised for replies whose parent is not an interaction on the same note."""
+
+
+def parent_in_note(note_id: int, parent_id: int) -> bool:
+    """Whether ``parent_id`` is an interaction on ``note_id``."""
+    if not note_id or not parent_id:
+        return False
+    return db.session.scalar(db.select(AIInteraction.id).where(
+        AIInteraction.id == parent_id,
+        AIInteraction.note_id == note_id
+    )) is not None
+
+
+def record_interaction(note_id: int, interaction_type: str, content: str, model_used: str,
+                       parent_id: int = None, metadata: dict = None) -> AIInteraction:
+    if parent_id is not None and not parent_in_note(note_id, parent_id):
+        raise InteractionError(f"Interaction {parent_id} is not on note {note_id}")
+    interaction = AIInteraction(
+        note_id=note_id,
+        interaction_type=interaction_type,
+        content=content,
+        model_used=model_used,
+        parent_id=parent_id,
+        interaction_metadata=metadata
+    )
+    db.session.add(interaction)
+    db.session.commit()
+    return interaction
+
+
+def load_threads(note_id: int, limit: int = THREAD_PAGE_SIZE, before_id: int = None):
+    """Return ``(threads, next_before)`` for a page of root interactions, newest first.
+
+    Each thread is a root interaction dict with its replies nested under
+    ``responses``.  The page of roots and every descendant come back from one
+    recursive query.
+    """
+    table = AIInteraction.__table__
+    roots = db.select(table.c.id).where(
+        table.c.note_id == note_id,
+        table.c.parent_id.is_(None)
+    )
+    if before_id:
+        roots = roots.where(table.c.id < before_id)
+    # One extra root tells us whether another page exists.
+    roots = roots.order_by(table.c.id.desc()).limit(limit + 1)
+
+    tree = db.select(table.c.id).where(table.c.id.in_(roots)).cte("thread_tree", recursive=True)
+    tree = tree.union_all(db.select(table.c.id).where(
+        table.c.parent_id == tree.c.id,
+        table.c.note_id == note_id
+    ))
+
+    rows = AIInteraction.query.filter(
+        AIInteraction.id.in_(db.select(tree.c.id))
+    ).order_by(AIInteraction.id).all()
+
+    nodes = {}
+    root_nodes = []
+    for row in rows:
+        node = row.to_dict()
+        node["responses"] = []
+        nodes[row.id] = node
+        parent = nodes.get(row.parent_id)
+        if parent is not None:
+            parent["responses"].append(node)
+        elif row.parent_id is None:
+            root_nodes.append(node)
+
+    root_nodes.reverse()
+    next_before = None
+    if len(root_nodes) > limit:
+        root_nodes = root_nodes[:limit]
+        next_before = root_nodes[-1]["id"]
+    return root_nodes, next_before
+
+
+def context_window(note_id: int, parent_id: int = None,
+                   max_items: int = CONTEXT_MAX_ITEMS, max_chars: int = CONTEXT_MAX_CHARS) -> list:
+    """Return recent interactions as ``{'model', 'content'}`` dicts, oldest first.
+
+    For a reply this is the ancestor path of ``parent_id``; otherwise the
+    note's latest interactions.  The window is bounded by item count and a
+    character budget, keeping the most recent entries.
+    """
+    table = AIInteraction.__table__
+    if parent_id:
+        path = db.select(table.c.id, table.c.parent_id).where(
+            table.c.id == parent_id,
+            table.c.note_id == note_id
+        ).cte("ancestors", recursive=True)
+        path = path.union_all(
+            db.select(table.c.id, table.c.parent_id).where(table.c.id == path.c.parent_id)
+        )
+        query = db.select(table.c.model_used, table.c.content).where(
+            table.c.id.in_(db.select(path.c.id))
+        )
+    else:
+        query = db.select(table.c.model_used, table.c.content).where(table.c.note_id == note_id)
+    rows = db.session.execute(query.order_by(table.c.id.desc()).limit(max_items)).all()
+
+    window, used = [], 0
+    for model_used, content in rows:
+        if used + len(content) > max_chars:
+            remaining = max_chars - used
+            if remaining > 200:
+                window.append({"model": model_used, "content": content[:remaining]})
+            break
+        window.append({"model": model_used, "content": content})
+        used += len(content)
+    window.reverse()
+    return window
@@ -0,0 +1,328 @@
+"""Background AI job queue backed by the ``ai_job`` table.
+
+Routes submit work and get a job id back immediately; a local pool of worker
+threads claims pending jobs in priority order and runs the registered task.
+Identical pending jobs for the same user are deduplicated.  With
+``AI_JOB_EXECUTOR=processes`` the task body runs in a process pool while the
+worker threads keep doing the bookkeeping.  No external broker is needed.
+"""
+import os
+import json
+import time
+import hashlib
+import inspect
+import logging
+import threading
+import multiprocessing
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+
+import ai_helper
+
+logger = logging.getLogger(__name__)
+
+AI_JOB_WORKERS = int(os.environ.get("AI_JOB_WORKERS", 4))
+AI_JOB_EXECUTOR = os.environ.get("AI_JOB_EXECUTOR", "threads")  # 'threads' or 'processes'
+AI_JOB_POLL_INTERVAL = float(os.environ.get("AI_JOB_POLL_INTERVAL", 2.0))  # seconds
+AI_JOB_STALE_AFTER = int(os.environ.get("AI_JOB_STALE_AFTER", 15 * 60))  # seconds
+AI_JOB_AUTOSTART = os.environ.get("AI_JOB_AUTOSTART", "1") == "1"  # start workers with the app, not on first submit
+
+# Lower numbers run first, so quick classification calls are not stuck
+# behind multi-model chains or long transcriptions.
+TASKS = {}
+
+
+def register_task(name: str, priority: int, uses_db: bool = False, internal: bool = False, on_cancel=None):
+    """Register ``fn`` as a job task.
+
+    Tasks that touch the database (``uses_db``) always run on the worker
+    thread inside the app context, even when a process pool is configured.
+    ``internal`` tasks can only be queued by server code, never through
+    ``/api/jobs``.  ``on_cancel(**payload)`` releases what a job holds when
+    it is cancelled before it ran.
+    """
+    def decorator(fn):
+        TASKS[name] = {"fn": fn, "priority": priority, "uses_db": uses_db, "internal": internal,
+                       "on_cancel": on_cancel}
+        return fn
+    return decorator
+
+
+register_task("categorize_note", 0)(ai_helper.categorize_note)
+register_task("suggest_tags", 0)(ai_helper.suggest_tags)
+register_task("summarize_note", 1)(ai_helper.summarize_note)
+register_task("get_note_suggestions", 1)(ai_helper.get_note_suggestions)
+register_task("enhance_note", 2)(ai_helper.enhance_note)
+register_task("generate_related_ideas", 3)(ai_helper.generate_related_ideas)
+register_task("create_mind_map_suggestions", 3)(ai_helper.create_mind_map_suggestions)
+register_task("expand_idea_with_chain", 5)(ai_helper.expand_idea_with_chain)
+register_task("analyze_concept_with_chain", 5)(ai_helper.analyze_concept_with_chain)
+
+
+def _upload_path(audio_path: str) -> str:
+    from transcription import TEMP_ROOT
+
+    root = os.path.realpath(TEMP_ROOT)
+    if os.path.commonpath([root, os.path.realpath(audio_path)]) != root:
+        raise JobError(f"Audio path is outside {TEMP_ROOT}")
+    return audio_path
+
+
+def _discard_upload(audio_path: str):
+    """Delete the upload of a transcription job cancelled before it ran."""
+    audio_path = _upload_path(audio_path)
+    if os.path.exists(audio_path):
+        os.remove(audio_path)
+
+
+@register_task("transcribe_audio", 4, internal=True, on_cancel=_discard_upload)
+def transcribe_audio_job(audio_path: str) -> str:
+    """Transcribe an uploaded file saved by the submit endpoint, then delete it."""
+    audio_path = _upload_path(audio_path)
+    try:
+        text = ai_helper.transcribe_audio(audio_path)
+        if not text:
+            raise Exception("Failed to transcribe audio")
+        return text
+    finally:
+        if os.path.exists(audio_path):
+            os.remove(audio_path)
+
+
+@register_task("categorize_notes_batch", 6, uses_db=True, internal=True)
+def categorize_notes_batch_job(user_id: int, note_ids: list) -> dict:
+    """Categorize and tag a batch of ``user_id``'s imported notes with one LLM call."""
+    from importer import categorize_notes
+    return categorize_notes(user_id, note_ids)
+
+
+@register_task("reprocess_note", 2, uses_db=True, internal=True)
+def reprocess_note_job(user_id: int, note_id: int, tasks: list, model: str = None, version: int = None) -> dict:
+    """Recompute a note's analysis and/or embedding after a large enough edit by ``user_id``."""
+    import permissions
+    from fingerprints import reprocess_note
+
+    if not permissions.can_edit(user_id, note_id):
+        return {"skipped": "note deleted or not editable"}
+    return reprocess_note(note_id, tasks, model, version, user_id)
+
+
+class JobError(ValueError):
+    """Raised for job submissions that name an unknown task or bad payload."""
+
+
+def dedup_key(user_id: int, task: str, payload: dict) -> str:
+    raw = json.dumps([user_id, task, payload], sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def validate(task: str, payload: dict, internal: bool = False):
+    if task not in TASKS or (TASKS[task]["internal"] and not internal):
+        raise JobError(f"Unknown task: {task}")
+    if not isinstance(payload, dict):
+        raise JobError("Payload must be a JSON object")
+    try:
+        inspect.signature(TASKS[task]["fn"]).bind(**payload)
+    except TypeError as e:
+        raise JobError(f"Invalid payload for {task}: {str(e)}")
+
+
+def submit_job(user_id: int, task: str, payload: dict, priority: int = None, internal: bool = False):
+    """Queue ``task`` and return ``(job, created)``.
+
+    If the same user already has an identical job pending or running, that
+    job is returned instead and ``created`` is False.  Server code passes
+    ``internal=True`` to queue internal tasks; client-supplied submissions
+    must not.
+    """
+    from app import db
+    from models import AIJob
+
+    validate(task, payload, internal)
+    key = dedup_key(user_id, task, payload)
+    existing = AIJob.query.filter(
+        AIJob.dedup_key == key,
+        AIJob.status.in_(("pending", "running"))
+    ).order_by(AIJob.id).first()
+    if existing:
+        return existing, False
+
+    job = AIJob(
+        user_id=user_id,
+        task=task,
+        payload=payload,
+        dedup_key=key,
+        priority=TASKS[task]["priority"] if priority is None else priority,
+        status="pending"
+    )
+    db.session.add(job)
+    db.session.commit()
+    worker_pool.wake()
+    return job, True
+
+
+def cancel_job(job) -> bool:
+    """Cancel a pending or running job; a running task's result is discarded."""
+    from app import db
+    from models import AIJob
+
+    values = {"status": "cancelled", "finished_at": datetime.utcnow()}
+    # Pending first: only a job that never started still holds what ``on_cancel`` releases.
+    was_pending = AIJob.query.filter(AIJob.id == job.id, AIJob.status == "pending").update(
+        values, synchronize_session=False)
+    updated = was_pending or AIJob.query.filter(AIJob.id == job.id, AIJob.status == "running").update(
+        values, synchronize_session=False)
+    db.session.commit()
+    db.session.refresh(job)
+    on_cancel = TASKS.get(job.task, {}).get("on_cancel")
+    if was_pending and on_cancel is not None:
+        try:
+            on_cancel(**job.payload)
+        except Exception as e:
+            logger.error(f"Cleanup for cancelled AI job {job.id} ({job.task}) failed: {str(e)}")
+    return bool(updated)
+
+
+def execute(task: str, payload: dict):
+    """Run a task body.  Module-level so it can be sent to a process pool."""
+    return TASKS[task]["fn"](**payload)
+
+
+class JobWorkerPool:
+    """Local worker threads that claim and run jobs from the ``ai_job`` table."""
+
+    def __init__(self):
+        self.app = None
+        self._reset()
+
+    def _reset(self):
+        self.started = False
+        self.threads = []
+        self.process_pool = None
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+
+    def start(self):
+        """Start the workers once per process; safe to call repeatedly.
+
+        Touches no database itself: the first worker returns stale jobs to
+        the queue, then every worker polls for pending ones.
+        """
+        if self.started or self.app is None:
+            return
+        with self._lock:
+            if self.started:
+                return
+            if AI_JOB_EXECUTOR == "processes":
+                self.process_pool = ProcessPoolExecutor(
+                    max_workers=AI_JOB_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            for i in range(AI_JOB_WORKERS):
+                thread = threading.Thread(target=self._run, args=(i == 0,), name=f"ai-job-{i}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+            self.started = True
+            logger.info(f"Started {AI_JOB_WORKERS} AI job workers ({AI_JOB_EXECUTOR})")
+
+    def after_fork(self):
+        """Restart the workers in a forked child; threads and pools do not survive the fork."""
+        was_started = self.started
+        self._reset()
+        if was_started:
+            self.start()
+
+    def wake(self):
+        self.start()
+        self._wakeup.set()
+
+    def _requeue_stale(self):
+        """Return jobs left 'running' by a crashed worker to the queue."""
+        from app import db
+        from models import AIJob
+
+        cutoff = datetime.utcnow() - timedelta(seconds=AI_JOB_STALE_AFTER)
+        requeued = AIJob.query.filter(
+            AIJob.status == "running",
+            AIJob.started_at < cutoff
+        ).update({"status": "pending", "started_at": None}, synchronize_session=False)
+        db.session.commit()
+        if requeued:
+            logger.warning(f"Requeued {requeued} stale AI jobs")
+
+    def _claim(self):
+        from app import db
+        from models import AIJob
+
+        candidates = db.session.query(AIJob.id).filter_by(status="pending").order_by(
+            AIJob.priority, AIJob.created_at, AIJob.id
+        ).limit(AI_JOB_WORKERS).all()
+        for (job_id,) in candidates:
+            # Conditional update so two workers (or processes) never run the same job.
+            claimed = AIJob.query.filter_by(id=job_id, status="pending").update(
+                {"status": "running", "started_at": datetime.utcnow()}, synchronize_session=False
+            )
+            db.session.commit()
+            if claimed:
+                return db.session.get(AIJob, job_id)
+        return None
+
+    def _finish(self, job_id: int, **values):
+        from app import db
+        from models import AIJob
+
+        values["finished_at"] = datetime.utcnow()
+        updated = AIJob.query.filter_by(id=job_id, status="running").update(values, synchronize_session=False)
+        db.session.commit()
+        if not updated:
+            logger.info(f"AI job {job_id} was cancelled; result discarded")
+
+    def _run(self, requeue_stale: bool = False):
+        from app import db
+
+        with self.app.app_context():
+            if requeue_stale:
+                try:
+                    self._requeue_stale()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Failed to requeue stale AI jobs: {str(e)}")
+            while True:
+                try:
+                    job = self._claim()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Failed to claim AI job: {str(e)}")
+                    job = None
+
+                if job is None:
+                    db.session.remove()
+                    self._wakeup.wait(AI_JOB_POLL_INTERVAL)
+                    self._wakeup.clear()
+                    continue
+
+                job_id, task, payload = job.id, job.task, job.payload
+                started = time.monotonic()
+                try:
+                    if self.process_pool is not None and not TASKS[task]["uses_db"]:
+                        result = self.process_pool.submit(execute, task, payload).result()
+                    else:
+                        result = execute(task, payload)
+                    self._finish(job_id, status="succeeded", result=result)
+                    logger.info(f"AI job {job_id} ({task}) finished in {time.monotonic() - started:.2f}s")
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"AI job {job_id} ({task}) failed: {str(e)}")
+                    try:
+                        self._finish(job_id, status="failed", error=str(e))
+                    except Exception as finish_error:
+                        db.session.rollback()
+                        logger.error(f"Failed to record AI job {job_id} failure: {str(finish_error)}")
+                finally:
+                    db.session.remove()
+
+
+worker_pool = JobWorkerPool()
@@ -0,0 +1,233 @@
+"""Content-addressed cache for LLM helper responses.
+
+Responses are keyed by (helper, model, prompt template version, normalized
+content hash).  Lookups go through an in-process LRU tier first and fall back
+to the ``llm_cache_entry`` table, so repeated requests from any worker skip
+the paid round trip.
+"""
+import os
+import json
+import time
+import hashlib
+import inspect
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import has_app_context
+
+import singleflight
+
+logger = logging.getLogger(__name__)
+
+CACHE_TTL = int(os.environ.get("AI_CACHE_TTL", 24 * 3600))  # seconds
+CACHE_MAX_ENTRIES = int(os.environ.get("AI_CACHE_MAX_ENTRIES", 2048))
+CACHE_MAX_BYTES = int(os.environ.get("AI_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+CACHE_PERSIST = os.environ.get("AI_CACHE_PERSIST", "1") != "0"
+
+
+def normalize_content(content: str) -> str:
+    """Collapse whitespace so trivially different payloads share a key."""
+    return " ".join((content or "").split())
+
+
+def make_key(helper: str, model: str, version: int, content: str) -> str:
+    content_hash = hashlib.sha256(normalize_content(content).encode("utf-8")).hexdigest()
+    raw = f"{helper}:{model}:v{version}:{content_hash}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe LRU with per-entry TTL and an approximate byte budget."""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES,
+                 max_bytes: int = CACHE_MAX_BYTES, ttl: int = CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, size, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self._bytes -= size
+                self.expirations += 1
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, size: int, ttl: int = None):
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (expires_at, size, value)
+            self._bytes += size
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted_size, _) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def size_bytes(self):
+        return self._bytes
+
+
+memory_cache = LRUCache()
+
+_stats_lock = threading.Lock()
+_stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0, "db_errors": 0}
+
+
+def _count(name: str):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def cache_stats() -> dict:
+    """Return hit/miss counters and tier sizes for tuning."""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["memory_hits"] + stats["db_hits"] + stats["misses"]
+    stats.update({
+        "lookups": lookups,
+        "hit_ratio": round((stats["memory_hits"] + stats["db_hits"]) / lookups, 4) if lookups else 0.0,
+        "memory_entries": len(memory_cache),
+        "memory_bytes": memory_cache.size_bytes,
+        "memory_evictions": memory_cache.evictions,
+        "memory_expirations": memory_cache.expirations,
+        "persistent": CACHE_PERSIST,
+    })
+    return stats
+
+
+def _persistent_enabled() -> bool:
+    return CACHE_PERSIST and has_app_context()
+
+
+def _db_get(key: str):
+    # Uses its own connection so a cache lookup never touches the request's
+    # ORM session or transaction.
+    from app import db
+    from models import LLMCacheEntry
+    table = LLMCacheEntry.__table__
+    with db.engine.begin() as conn:
+        row = conn.execute(
+            db.select(table.c.response, table.c.expires_at).where(table.c.key == key)
+        ).first()
+        if row is None:
+            return None
+        if row.expires_at is not None and row.expires_at < datetime.utcnow():
+            conn.execute(table.delete().where(table.c.key == key))
+            return None
+        return row.response
+
+
+def _db_set(key: str, helper: str, model: str, value, ttl: int):
+    from app import db
+    from models import LLMCacheEntry
+    table = LLMCacheEntry.__table__
+    with db.engine.begin() as conn:
+        conn.execute(table.delete().where(table.c.key == key))
+        conn.execute(table.insert().values(
+            key=key,
+            helper=helper,
+            model_used=model,
+            response=value,
+            expires_at=datetime.utcnow() + timedelta(seconds=ttl),
+        ))
+
+
+def lookup(key: str):
+    """Return ``(hit, value)`` for ``key`` from the memory tier, then the database."""
+    value = memory_cache.get(key)
+    if value is not None:
+        _count("memory_hits")
+        return True, value
+
+    if _persistent_enabled():
+        try:
+            value = _db_get(key)
+        except Exception as e:
+            _count("db_errors")
+            logger.warning(f"LLM cache read failed: {str(e)}")
+            value = None
+        if value is not None:
+            _count("db_hits")
+            memory_cache.set(key, value, len(json.dumps(value)))
+            return True, value
+
+    _count("misses")
+    return False, None
+
+
+def store(key: str, helper: str, model: str, value, ttl: int = CACHE_TTL):
+    """Write ``value`` to both tiers."""
+    if value is None:
+        return
+    memory_cache.set(key, value, len(json.dumps(value)), ttl)
+    _count("stores")
+    if _persistent_enabled():
+        try:
+            _db_set(key, helper, model, value, ttl)
+        except Exception as e:
+            _count("db_errors")
+            logger.warning(f"LLM cache write failed: {str(e)}")
+
+
+def cached_llm_call(helper: str, version: int = 1, ttl: int = CACHE_TTL):
+    """Cache a ``helper(content, model)`` function's result.
+
+    Bump ``version`` whenever the helper's prompt template changes so stale
+    responses are not served for the new prompt.  Concurrent misses for the
+    same key are coalesced into one call (see ``singleflight.py``).
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            content = bound.arguments["content"]
+            model = bound.arguments["model"]
+            key = make_key(helper, model, version, content)
+
+            hit, value = lookup(key)
+            if hit:
+                return value
+
+            def compute():
+                value = fn(*bound.args, **bound.kwargs)
+                store(key, helper, model, value, ttl)
+                return value
+
+            # Identical calls already in flight share one upstream request.
+            return singleflight.do(key, compute, recheck=lambda: lookup(key))
+
+        wrapper.uncached = fn
+        wrapper.cache_key = lambda content, model: make_key(helper, model, version, content)
+        return wrapper
+    return decorator
@@ -0,0 +1,333 @@
+"""Shared, timeout-bounded transport for LLM API calls.
+
+Every helper goes through one ``OpenAI`` client backed by a tuned keep-alive
+``httpx`` pool.  Each call is bounded by a per-task time budget that covers
+all of its attempts.  Transient failures (timeouts, connection errors, 429
+and 5xx) are retried server-side with jittered exponential backoff that
+honours ``Retry-After``.  A per-provider circuit breaker fails fast while
+the upstream is degraded instead of piling requests onto it.
+
+``OPENAI_BASE_URL`` points the client at any compatible server, e.g. a
+local stub for tests and benchmarks.  Other providers' adapters (see
+``providers.py``) send plain ``httpx`` requests through the same pool and
+the same ``request()`` loop, with their own breakers.
+
+The SDKs are imported, and the pool and client built, on first use rather
+than at import, so app startup does not pay for them and a pre-forking
+server never hands a parent's connections to its workers.
+"""
+import os
+import time
+import random
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL") or None
+
+LLM_POOL_MAX_CONNECTIONS = int(os.environ.get("LLM_POOL_MAX_CONNECTIONS", 32))
+LLM_POOL_MAX_KEEPALIVE = int(os.environ.get("LLM_POOL_MAX_KEEPALIVE", 16))
+LLM_KEEPALIVE_EXPIRY = float(os.environ.get("LLM_KEEPALIVE_EXPIRY", 60))  # seconds
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", 5))  # seconds
+LLM_DEFAULT_TIMEOUT = float(os.environ.get("LLM_DEFAULT_TIMEOUT", 30))  # seconds, per call incl. retries
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 2))
+LLM_BACKOFF_BASE = float(os.environ.get("LLM_BACKOFF_BASE", 0.5))  # seconds
+LLM_BACKOFF_MAX = float(os.environ.get("LLM_BACKOFF_MAX", 8))  # seconds
+LLM_BREAKER_THRESHOLD = int(os.environ.get("LLM_BREAKER_THRESHOLD", 5))  # consecutive failures
+LLM_BREAKER_COOLDOWN = float(os.environ.get("LLM_BREAKER_COOLDOWN", 30))  # seconds
+
+# Total time budget per task, in seconds; override with LLM_TIMEOUT_<TASK>.
+TASK_TIMEOUTS = {
+    "categorize_note": 10,
+    "suggest_tags": 10,
+    "get_note_suggestions": 20,
+    "analyze_note": 30,
+    "categorize_notes_batch": 60,
+    "summarize_note": 30,
+    "enhance_note": 45,
+    "expand_idea": 60,
+    "analyze_concept": 60,
+    "generate_related_ideas": 45,
+    "create_mind_map_suggestions": 45,
+    "chain_step": 60,
+    "stream": 90,
+    "transcribe_audio": 120,
+    "embeddings": 30,
+}
+
+@lru_cache(maxsize=None)
+def api_errors() -> tuple:
+    """Exceptions a provider call can raise on an API or HTTP failure."""
+    import httpx
+    import openai
+
+    return openai.APIError, httpx.HTTPError
+
+
+@lru_cache(maxsize=None)
+def retryable_errors() -> tuple:
+    import httpx
+    import openai
+
+    return (
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.RateLimitError,
+        openai.InternalServerError,
+        httpx.TransportError,  # includes timeouts
+    )
+
+
+def is_retryable(error) -> bool:
+    import httpx
+
+    if isinstance(error, retryable_errors()):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return False
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the provider while its circuit breaker is open."""
+
+    def __init__(self, provider: str, retry_after: float):
+        super().__init__(f"{provider} is unavailable; retry in {retry_after:.0f}s")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Closed -> open after N consecutive failures -> half-open after a cooldown.
+
+    While half-open a single trial call is let through; its outcome closes
+    or re-opens the circuit.
+    """
+
+    def __init__(self, name: str, threshold: int = LLM_BREAKER_THRESHOLD, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return
+            if state == "half-open" and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return
+            remaining = max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+            raise CircuitOpenError(self.name, remaining or 1.0)
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info(f"Circuit for {self.name} closed")
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.threshold:
+                if self.opened_at is None:
+                    logger.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """Forget a half-open trial whose outcome says nothing about the provider's health."""
+        with self._lock:
+            self.trial_in_flight = False
+
+    def snapshot(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.failures}
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(provider: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if provider not in _breakers:
+            _breakers[provider] = CircuitBreaker(provider)
+        return _breakers[provider]
+
+
+def breaker_stats() -> dict:
+    with _breakers_lock:
+        return {name: b.snapshot() for name, b in _breakers.items()}
+
+
+def build_http_client():
+    import httpx
+
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=LLM_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(LLM_DEFAULT_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+    )
+
+
+_http = None
+_client = None
+_clients_lock = threading.Lock()
+
+
+def get_http():
+    """The keep-alive pool shared by every provider, built on first use."""
+    global _http
+    if _http is None:
+        with _clients_lock:
+            if _http is None:
+                _http = build_http_client()
+    return _http
+
+
+def get_client():
+    """The ``OpenAI`` client on the shared pool, built on first use."""
+    global _client
+    if _client is None:
+        http = get_http()
+        with _clients_lock:
+            if _client is None:
+                from openai import OpenAI
+
+                # Retries are handled here, so the SDK's own retry loop is disabled.
+                _client = OpenAI(
+                    api_key=OPENAI_API_KEY,
+                    base_url=OPENAI_BASE_URL,
+                    http_client=http,
+                    max_retries=0
+                )
+    return _client
+
+
+def __getattr__(name):
+    # ``llm_transport.http`` / ``llm_transport.client`` still work, lazily.
+    if name == "http":
+        return get_http()
+    if name == "client":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _forget_clients():
+    # A forked worker must not share the parent's sockets; it builds its own on first use.
+    global _http, _client
+    _http = _client = None
+
+
+os.register_at_fork(after_in_child=_forget_clients)
+
+
+def task_timeout(task: str) -> float:
+    override = os.environ.get(f"LLM_TIMEOUT_{task.upper()}")
+    if override:
+        return float(override)
+    return float(TASK_TIMEOUTS.get(task, LLM_DEFAULT_TIMEOUT))
+
+
+def _retry_after(error) -> float:
+    """Seconds the server asked us to wait, from ``retry-after-ms``/``Retry-After``, if any."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000.0
+        value = headers.get("retry-after")
+        if value is None:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, error=None) -> float:
+    """Full-jitter exponential backoff, or the server's ``Retry-After`` if it gave one."""
+    requested = _retry_after(error) if error is not None else None
+    if requested is not None:
+        return min(requested, LLM_BACKOFF_MAX)
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+
+def request(task: str, fn, provider: str = "openai", timeout: float = None, retries: int = None, **kwargs):
+    """Call ``fn(**kwargs, timeout=...)`` under ``task``'s time budget with retries.
+
+    Each attempt gets whatever is left of the budget as its timeout, so the
+    whole call, retries included, never outlives the budget.
+    """
+    budget = timeout if timeout is not None else task_timeout(task)
+    retries = LLM_MAX_RETRIES if retries is None else retries
+    deadline = time.monotonic() + budget
+    circuit = breaker(provider)
+    attempt = 0
+    while True:
+        circuit.before_call()
+        remaining = deadline - time.monotonic()
+        try:
+            result = fn(**kwargs, timeout=max(0.1, remaining))
+        except api_errors() as e:
+            if not is_retryable(e):
+                # A 4xx other than 429 is our request's fault and says nothing about the
+                # provider's health, so it neither resets nor adds to the failure count.
+                circuit.release()
+                raise
+            circuit.record_failure()
+            delay = backoff_delay(attempt, e)
+            if attempt >= retries or circuit.state == "open" or time.monotonic() + delay >= deadline:
+                logger.error(f"{task} failed after {attempt + 1} attempt(s): {str(e)}")
+                raise
+            logger.warning(f"{task} attempt {attempt + 1} failed ({type(e).__name__}); retrying in {delay:.2f}s")
+            metrics.llm_retries.inc(task, provider)
+            time.sleep(delay)
+            attempt += 1
+            continue
+        except Exception:
+            circuit.release()
+            raise
+        circuit.record_success()
+        return result
+
+
+def chat(task: str, **kwargs):
+    """``chat.completions.create`` through the transport."""
+    return request(task, get_client().chat.completions.create, **kwargs)
+
+
+def transcribe(task: str = "transcribe_audio", **kwargs):
+    return request(task, get_client().audio.transcriptions.create, **kwargs)
+
+
+def embed(task: str = "embeddings", **kwargs):
+    return request(task, get_client().embeddings.create, **kwargs)
@@ -1,5 +1,7 @@
 import os
-from app import app
+from app import create_app
+
+app = create_app()
 
 if __name__ == "__main__":
     app.run(
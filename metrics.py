@@ -0,0 +1,319 @@
+"""In-process instrumentation exposed in the Prometheus text format.
+
+- ``http_request_duration_seconds`` per endpoint, method and status, plus
+  the number and time of SQL queries each request ran.
+- ``llm_request_duration_seconds``, ``llm_errors_total`` and
+  ``llm_tokens_total`` per task, provider and model (the ``AIModel`` value).
+- ``db_query_duration_seconds`` for every statement, and a warning plus
+  ``db_n_plus_one_total`` when one request repeats the same statement
+  ``METRICS_N_PLUS_ONE_THRESHOLD`` times.
+- With ``METRICS_PROFILE_SLOW_MS`` set, a sampling profiler records the
+  stacks of in-flight requests and keeps a collapsed profile of each
+  request slower than that.
+
+Streamed responses are timed to their first byte.  Metrics are per
+process; with several workers each one's ``/metrics`` reports its own
+share, as with the Prometheus client's default registry.  Without
+``METRICS_TOKEN`` the endpoints answer loopback clients only.
+"""
+import os
+import sys
+import hmac
+import time
+import logging
+import threading
+import traceback
+from bisect import bisect_left
+from collections import Counter as _Tally, deque
+from contextlib import contextmanager
+
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")  # bearer token for /metrics; unset: loopback only
+METRICS_N_PLUS_ONE_THRESHOLD = int(os.environ.get("METRICS_N_PLUS_ONE_THRESHOLD", 10))
+METRICS_PROFILE_SLOW_MS = float(os.environ.get("METRICS_PROFILE_SLOW_MS", 0))  # 0 disables the profiler
+METRICS_PROFILE_INTERVAL = float(os.environ.get("METRICS_PROFILE_INTERVAL", 0.01))  # seconds
+METRICS_PROFILE_KEEP = int(os.environ.get("METRICS_PROFILE_KEEP", 20))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+QUERY_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+LOOPBACK_ADDRS = ("127.0.0.1", "::1")
+
+_INF = 'le="+Inf"'
+_QUOTES = '"`(['
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values) -> float:
+        with self._lock:
+            return self._values.get(label_values, 0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, label_values)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series_items = sorted((key, list(series)) for key, series in self._series.items())
+        for label_values, series in series_items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{_label_text(self.labels, label_values, le)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_label_text(self.labels, label_values, _INF)} {series[-2]}")
+            lines.append(f"{self.name}_count{_label_text(self.labels, label_values)} {series[-2]}")
+            lines.append(f"{self.name}_sum{_label_text(self.labels, label_values)} {series[-1]:.6f}")
+        return lines
+
+
+REGISTRY = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+http_duration = register(Histogram(
+    "http_request_duration_seconds", "Request latency by endpoint.", ("endpoint", "method", "status")))
+http_queries = register(Histogram(
+    "http_request_db_queries", "SQL statements per request.", ("endpoint",), COUNT_BUCKETS))
+http_db_time = register(Histogram(
+    "http_request_db_seconds", "Time spent in SQL per request.", ("endpoint",)))
+db_duration = register(Histogram(
+    "db_query_duration_seconds", "SQL statement latency by kind.", ("statement",), QUERY_BUCKETS))
+db_n_plus_one = register(Counter(
+    "db_n_plus_one_total", "Requests that repeated one statement past the N+1 threshold.", ("endpoint",)))
+llm_duration = register(Histogram(
+    "llm_request_duration_seconds", "LLM call latency, retries included.", ("task", "provider", "model")))
+llm_errors = register(Counter(
+    "llm_errors_total", "Failed LLM calls by exception type.", ("task", "provider", "model", "error")))
+llm_tokens = register(Counter(
+    "llm_tokens_total", "Tokens reported by the provider.", ("task", "provider", "model", "kind")))
+llm_retries = register(Counter(
+    "llm_retries_total", "Transport-level retries of LLM calls.", ("task", "provider")))
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def authorized(header: str, remote_addr: str) -> bool:
+    """``Bearer $METRICS_TOKEN`` when a token is set; otherwise loopback clients only."""
+    if METRICS_TOKEN:
+        return hmac.compare_digest(header.encode(), f"Bearer {METRICS_TOKEN}".encode())
+    return remote_addr in LOOPBACK_ADDRS
+
+
+@contextmanager
+def llm_call(task: str, provider: str, model: str):
+    """Time one logical LLM call and count its failure, if any."""
+    started = time.monotonic()
+    try:
+        yield
+    except Exception as e:
+        llm_errors.inc(task, provider, model, type(e).__name__)
+        raise
+    finally:
+        llm_duration.observe(time.monotonic() - started, task, provider, model)
+
+
+def record_tokens(task: str, provider: str, model: str, prompt_tokens: int, completion_tokens: int):
+    if prompt_tokens:
+        llm_tokens.inc(task, provider, model, "prompt", amount=prompt_tokens)
+    if completion_tokens:
+        llm_tokens.inc(task, provider, model, "completion", amount=completion_tokens)
+
+
+def _statement_kind(statement: str) -> str:
+    """Verb and first table, e.g. ``SELECT note``, as a low-cardinality label."""
+    words = statement.split()
+    if not words:
+        return "?"
+    verb = words[0].upper()
+    table = None
+    if verb == "UPDATE" and len(words) > 1:
+        table = words[1]
+    else:
+        upper = [word.upper() for word in words[:80]]
+        for keyword in ("FROM", "INTO"):
+            if keyword in upper and upper.index(keyword) + 1 < len(words):
+                table = words[upper.index(keyword) + 1]
+                break
+    return f"{verb} {table.strip(_QUOTES)}" if table else verb
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_started")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    if not METRICS_ENABLED:
+        return
+    db_duration.observe(elapsed, _statement_kind(statement))
+    if has_request_context() and hasattr(g, "metrics_queries"):
+        g.metrics_queries[statement] += 1
+        g.metrics_db_time += elapsed
+
+
+class SamplingProfiler:
+    """Samples the stacks of registered request threads from one background thread."""
+
+    def __init__(self, interval: float = METRICS_PROFILE_INTERVAL, keep: int = METRICS_PROFILE_KEEP):
+        self.interval = interval
+        self.profiles = deque(maxlen=keep)
+        self._active = {}  # thread id -> Counter of collapsed stacks
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="metrics-profiler", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                active = dict(self._active)
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for thread_id, samples in active.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    stack = ";".join(f"{entry.name} ({os.path.basename(entry.filename)}:{entry.lineno})"
+                                     for entry in traceback.extract_stack(frame))
+                    samples[stack] += 1
+
+    def start(self):
+        self._ensure_started()
+        with self._lock:
+            self._active[threading.get_ident()] = _Tally()
+
+    def stop(self, endpoint: str, elapsed: float, keep: bool):
+        with self._lock:
+            samples = self._active.pop(threading.get_ident(), None)
+        if keep and samples:
+            top = samples.most_common(10)
+            self.profiles.append({
+                "endpoint": endpoint,
+                "duration_ms": round(elapsed * 1000, 1),
+                "samples": sum(samples.values()),
+                "stacks": [{"stack": stack, "samples": count} for stack, count in top],
+            })
+            logger.warning(f"Slow request {endpoint} took {elapsed * 1000:.0f}ms; hottest stack: {top[0][0][-300:]}")
+
+
+profiler = SamplingProfiler() if METRICS_PROFILE_SLOW_MS > 0 else None
+
+
+def _endpoint() -> str:
+    return request.endpoint or "unmatched"
+
+
+def _before_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_queries = _Tally()
+    g.metrics_db_time = 0.0
+    if profiler is not None:
+        profiler.start()
+
+
+def _after_request(response):
+    started = getattr(g, "metrics_started", None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    endpoint = _endpoint()
+    http_duration.observe(elapsed, endpoint, request.method, str(response.status_code))
+    queries = g.metrics_queries
+    http_queries.observe(sum(queries.values()), endpoint)
+    http_db_time.observe(g.metrics_db_time, endpoint)
+    if queries:
+        statement, repeats = queries.most_common(1)[0]
+        if repeats >= METRICS_N_PLUS_ONE_THRESHOLD:
+            db_n_plus_one.inc(endpoint)
+            logger.warning(f"Possible N+1 in {endpoint}: statement ran {repeats} times: {' '.join(statement.split())[:200]}")
+    if profiler is not None:
+        profiler.stop(endpoint, elapsed, elapsed * 1000 >= METRICS_PROFILE_SLOW_MS)
+    return response
+
+
+def _teardown_request(exc):
+    if profiler is not None:
+        profiler.stop(_endpoint(), 0.0, False)  # no-op unless after_request was skipped
+
+
+def init_app(app):
+    """Install the request hooks on ``app``; no-op when ``METRICS_ENABLED=0``."""
+    if not METRICS_ENABLED:
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
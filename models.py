@@ -1,11 +1,9 @@
 from datetime import datetime
-from app import db, login_manager
+from app import db
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 
-@login_manager.user_loader
-def load_user(id):
-    return User.query.get(int(id))
+# The Flask-Login user loader lives in identity.py.
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -38,6 +36,17 @@ class Note(db.Model):
     shared_with = db.relationship('NoteShare', backref='note', lazy='dynamic')
     tags = db.relationship('Tag', secondary=note_tags, backref=db.backref('notes', lazy='dynamic'))
     ai_interactions = db.relationship('AIInteraction', backref='note', lazy='dynamic')
+    # Card preview computed in SQL so list views never fetch the full body
+    preview = db.column_property(db.func.substr(content, 1, 200), deferred=True)
+    # Maintained by fingerprints.py to decide when AI results need recomputing
+    content_fingerprint = db.Column(db.String(64))
+    content_signature = db.deferred(db.Column(db.LargeBinary))
+    # Bumped on every title/content change (see autosave.py); the note's ETag
+    version = db.Column(db.Integer, default=1)
+
+    __table_args__ = (
+        db.Index('ix_note_user_updated', 'user_id', 'updated_at'),
+    )
 
 class NoteShare(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -46,12 +55,30 @@ class NoteShare(db.Model):
     can_edit = db.Column(db.Boolean, default=False)
     shared_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_note_share_user_note', 'user_id', 'note_id'),
+        # Covers permission checks and per-note share listings (see permissions.py)
+        db.Index('ix_note_share_note_user', 'note_id', 'user_id', 'can_edit'),
+    )
+
 class Tag(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(50), nullable=False, unique=True)
+    name = db.Column(db.String(50), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+    __table_args__ = (
+        # Tag names are unique per user, not globally (see schema.ensure_tag_uniqueness)
+        db.Index('uq_tag_user_name', 'user_id', 'name', unique=True),
+    )
+
+class TagUsage(db.Model):
+    """Per-user count of notes carrying each tag, maintained incrementally by ``tags.py``."""
+    tag_id = db.Column(db.Integer, db.ForeignKey('tag.id', ondelete='CASCADE'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    note_count = db.Column(db.Integer, nullable=False, default=0)
+    tag = db.relationship('Tag', backref=db.backref('usage', uselist=False))
+
 class AIInteraction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     note_id = db.Column(db.Integer, db.ForeignKey('note.id'), nullable=False)
@@ -59,8 +86,99 @@ class AIInteraction(db.Model):
     content = db.Column(db.Text, nullable=False)  # The AI's response
     model_used = db.Column(db.String(50), nullable=False)  # The AI model used
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    parent_id = db.Column(db.Integer, db.ForeignKey('ai_interaction.id'), nullable=True)  # For threaded responses
+    parent_id = db.Column(db.Integer, db.ForeignKey('ai_interaction.id'), nullable=True, index=True)  # For threaded responses
     responses = db.relationship('AIInteraction', 
                               backref=db.backref('parent', remote_side=[id]),
                               lazy='dynamic')
     interaction_metadata = db.Column(db.JSON)  # Store additional context and chain information
+
+    __table_args__ = (
+        db.Index('ix_ai_interaction_note_thread', 'note_id', 'parent_id', 'id'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'parent_id': self.parent_id,
+            'type': self.interaction_type,
+            'model': self.model_used,
+            'content': self.content,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'metadata': self.interaction_metadata or {}
+        }
+
+class NoteEmbedding(db.Model):
+    """A note's embedding as a little-endian float32 blob, maintained by ``embeddings.py``."""
+    note_id = db.Column(db.Integer, db.ForeignKey('note.id', ondelete='CASCADE'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    model = db.Column(db.String(64), nullable=False)  # Embedder name, including dimension
+    dim = db.Column(db.Integer, nullable=False)
+    vector = db.Column(db.LargeBinary, nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False)  # sha256 of the embedded text
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_note_embedding_user_model', 'user_id', 'model', 'updated_at'),
+    )
+
+class NoteTaskState(db.Model):
+    """The content signature (and result) a derived AI task was last computed from."""
+    note_id = db.Column(db.Integer, db.ForeignKey('note.id', ondelete='CASCADE'), primary_key=True)
+    task = db.Column(db.String(50), primary_key=True)  # 'analysis', 'embedding'
+    fingerprint = db.Column(db.String(64))
+    signature = db.Column(db.LargeBinary)
+    model = db.Column(db.String(64))
+    result = db.Column(db.JSON)
+    analyzed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class NoteChange(db.Model):
+    """Changes to a note that ``updated_at`` does not show, for incremental exports (see exporter.py)."""
+    id = db.Column(db.Integer, primary_key=True)
+    note_id = db.Column(db.Integer, nullable=False)  # no FK: deletions are logged too
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # 'tags', 'shares', 'imported', 'deleted'
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_note_change_user_changed', 'user_id', 'changed_at'),
+        db.Index('ix_note_change_note_changed', 'note_id', 'changed_at'),
+    )
+
+class LLMCacheEntry(db.Model):
+    key = db.Column(db.String(64), primary_key=True)  # sha256 of helper/model/version/content
+    helper = db.Column(db.String(50), nullable=False)
+    model_used = db.Column(db.String(50), nullable=False)
+    response = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, index=True)
+
+class AIJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    task = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    dedup_key = db.Column(db.String(64), nullable=False, index=True)
+    priority = db.Column(db.Integer, nullable=False, default=5)  # Lower runs first
+    status = db.Column(db.String(20), nullable=False, default='pending')  # 'pending', 'running', 'succeeded', 'failed', 'cancelled'
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_ai_job_queue', 'status', 'priority', 'created_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'task': self.task,
+            'status': self.status,
+            'priority': self.priority,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
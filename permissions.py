@@ -0,0 +1,208 @@
+"""Note access checks and bulk sharing.
+
+``levels`` resolves the current user's access to any number of notes with
+one query (the note joined to at most one ``NoteShare`` row, served by
+``ix_note_share_note_user``) and memoizes the answer for the rest of the
+request, so the several helpers a route calls for the same note share one
+lookup.  ``grant`` and ``revoke`` apply many (note, user, can_edit)
+changes in a single transaction with a constant number of statements.
+"""
+import logging
+from datetime import datetime
+
+from flask import g, has_request_context
+
+from app import db
+from models import Note, NoteShare, User
+from exporter import record_changes
+
+logger = logging.getLogger(__name__)
+
+VIEW = 1
+EDIT = 2
+OWNER = 3
+LEVEL_NAMES = {VIEW: "view", EDIT: "edit", OWNER: "owner"}
+
+
+class ShareError(ValueError):
+    """Raised for share changes that name notes the owner lacks or unknown users."""
+
+
+def _memo() -> dict:
+    if not has_request_context():
+        return {}
+    if not hasattr(g, "permission_levels"):
+        g.permission_levels = {}
+    return g.permission_levels
+
+
+def forget(note_ids=None):
+    """Drop memoized levels, for ``note_ids`` or all, after shares change within a request."""
+    memo = _memo()
+    if note_ids is None:
+        memo.clear()
+        return
+    note_ids = set(note_ids)
+    for key in [key for key in memo if key[1] in note_ids]:
+        del memo[key]
+
+
+def _level(user_id: int, owner_id: int, editable) -> int:
+    if owner_id == user_id:
+        return OWNER
+    if editable is None:  # no share row joined
+        return 0
+    return EDIT if editable else VIEW
+
+
+def levels(user_id: int, note_ids) -> dict:
+    """``{note_id: level}`` for the notes ``user_id`` can see; inaccessible or missing notes are omitted."""
+    memo = _memo()
+    note_ids = set(note_ids)
+    missing = [note_id for note_id in note_ids if (user_id, note_id) not in memo]
+    if missing:
+        rows = db.session.execute(
+            db.select(Note.id, Note.user_id, NoteShare.can_edit)
+            .outerjoin(NoteShare, db.and_(NoteShare.note_id == Note.id, NoteShare.user_id == user_id))
+            .where(Note.id.in_(missing))
+        ).all()
+        found = {}
+        for note_id, owner_id, editable in rows:
+            found[note_id] = max(found.get(note_id, 0), _level(user_id, owner_id, editable))
+        for note_id in missing:
+            memo[(user_id, note_id)] = found.get(note_id, 0)
+    return {note_id: memo[(user_id, note_id)] for note_id in note_ids if memo.get((user_id, note_id))}
+
+
+def level(user_id: int, note_id: int) -> int:
+    return levels(user_id, [note_id]).get(note_id, 0)
+
+
+def can_view(user_id: int, note_id: int) -> bool:
+    return level(user_id, note_id) >= VIEW
+
+
+def can_edit(user_id: int, note_id: int) -> bool:
+    return level(user_id, note_id) >= EDIT
+
+
+def note_and_level(user_id: int, note_id: int):
+    """``(note, level)`` loaded together in one query; ``note`` is None if it does not exist."""
+    memo = _memo()
+    if (user_id, note_id) in memo:
+        return db.session.get(Note, note_id), memo[(user_id, note_id)]
+    rows = db.session.execute(
+        db.select(Note, NoteShare.can_edit)
+        .outerjoin(NoteShare, db.and_(NoteShare.note_id == Note.id, NoteShare.user_id == user_id))
+        .where(Note.id == note_id)
+    ).all()
+    note = rows[0][0] if rows else None
+    level = max((_level(user_id, row[0].user_id, row[1]) for row in rows), default=0)
+    memo[(user_id, note_id)] = level
+    return note, level
+
+
+def accessible_note(user_id: int, note_id, required: int = VIEW):
+    """The note if ``user_id`` has at least ``required`` access to it, else None."""
+    if not note_id:
+        return None
+    note, level = note_and_level(user_id, note_id)
+    return note if level >= required else None
+
+
+def _owned(owner_id: int, note_ids: set):
+    owned = set(db.session.scalars(
+        db.select(Note.id).where(Note.id.in_(note_ids), Note.user_id == owner_id)))
+    if owned != note_ids:
+        raise ShareError(f"Notes not found or not yours: {sorted(note_ids - owned)}")
+
+
+def resolve_users(user_ids=(), usernames=()) -> dict:
+    """``{username or id: user id}`` for the named users, with one query; unknown names raise ``ShareError``."""
+    user_ids, usernames = set(user_ids), set(usernames)
+    if not user_ids and not usernames:
+        return {}
+    rows = db.session.execute(
+        db.select(User.id, User.username).where(db.or_(User.id.in_(user_ids), User.username.in_(usernames)))
+    ).all()
+    resolved = {}
+    for user_id, username in rows:
+        if user_id in user_ids:
+            resolved[user_id] = user_id
+        if username in usernames:
+            resolved[username] = user_id
+    unknown = [str(name) for name in user_ids | usernames if name not in resolved]
+    if unknown:
+        raise ShareError(f"Unknown users: {', '.join(sorted(unknown))}")
+    return resolved
+
+
+def grant(owner_id: int, grants) -> dict:
+    """Create or update ``(note_id, user_id, can_edit)`` shares in one transaction.
+
+    Every note must belong to ``owner_id``.  Returns counts of shares
+    ``created``, ``updated`` (``can_edit`` changed) and ``unchanged``.
+    """
+    wanted = {}
+    for note_id, user_id, editable in grants:
+        wanted[(note_id, user_id)] = bool(editable)
+    if not wanted:
+        return {"created": 0, "updated": 0, "unchanged": 0}
+    note_ids = {note_id for note_id, _ in wanted}
+    user_ids = {user_id for _, user_id in wanted}
+    if owner_id in user_ids:
+        raise ShareError("Cannot share a note with yourself")
+    try:
+        _owned(owner_id, note_ids)
+        existing = {}
+        for share_id, note_id, user_id, editable in db.session.execute(
+            db.select(NoteShare.id, NoteShare.note_id, NoteShare.user_id, NoteShare.can_edit)
+            .where(NoteShare.note_id.in_(note_ids), NoteShare.user_id.in_(user_ids))
+        ):
+            if (note_id, user_id) in wanted:
+                existing.setdefault((note_id, user_id), []).append((share_id, bool(editable)))
+        now = datetime.utcnow()
+        new_rows = [{"note_id": note_id, "user_id": user_id, "can_edit": editable, "shared_at": now}
+                    for (note_id, user_id), editable in wanted.items() if (note_id, user_id) not in existing]
+        changed = {True: [], False: []}
+        for pair, shares in existing.items():
+            changed[wanted[pair]].extend(share_id for share_id, editable in shares if editable != wanted[pair])
+        if new_rows:
+            db.session.execute(db.insert(NoteShare), new_rows)
+        for editable, share_ids in changed.items():
+            if share_ids:
+                db.session.execute(db.update(NoteShare).where(NoteShare.id.in_(share_ids)).values(can_edit=editable),
+                                   execution_options={"synchronize_session": False})
+        # New shares carry shared_at; changed ones are logged for incremental exports.
+        record_changes({pair[0] for pair, shares in existing.items()
+                        if any(editable != wanted[pair] for _, editable in shares)}, "shares")
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    forget(note_ids)
+    updated = sum(1 for pair, shares in existing.items() if any(editable != wanted[pair] for _, editable in shares))
+    result = {"created": len(new_rows), "updated": updated, "unchanged": len(existing) - updated}
+    logger.info(f"User {owner_id} shared {len(note_ids)} notes with {len(user_ids)} users: {result}")
+    return result
+
+
+def revoke(owner_id: int, pairs) -> int:
+    """Delete the ``(note_id, user_id)`` shares on notes ``owner_id`` owns, in one statement; returns how many."""
+    pairs = set(pairs)
+    if not pairs:
+        return 0
+    try:
+        result = db.session.execute(
+            db.delete(NoteShare)
+            .where(db.tuple_(NoteShare.note_id, NoteShare.user_id).in_(pairs))
+            .where(NoteShare.note_id.in_(db.select(Note.id).where(Note.user_id == owner_id))),
+            execution_options={"synchronize_session": False})
+        if result.rowcount:
+            record_changes({note_id for note_id, _ in pairs}, "shares", owner_id)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    forget({note_id for note_id, _ in pairs})
+    return result.rowcount
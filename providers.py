@@ -0,0 +1,409 @@
+"""Pluggable LLM providers, task routing and hedged requests.
+
+Every chat call names a task and (usually) a model.  The registry picks
+the provider from the model name, or from an operator route
+(``LLM_ROUTE_<TASK>`` / ``LLM_ROUTE_DEFAULT``, e.g. ``"fake:fake-small"``),
+and sends it through that provider's adapter.  Adapters return plain text
+and share the transport's pool, time budgets, retries and breakers.
+
+Latency-critical tasks (``HEDGED_TASKS``) are hedged: if the primary has
+not answered after the p95 of its recent latencies, the same request goes
+to a backup provider and whichever answers first wins.  A primary that
+fails before the hedge delay falls over to the backup immediately.
+
+The ``fake`` provider answers locally with configurable latency and
+failure rate, so routing and hedging can be exercised offline.
+"""
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import llm_transport
+import metrics
+import chunking
+
+logger = logging.getLogger(__name__)
+
+ANTHROPIC_API_KEY = os.environ.get("ANTHROPIC_API_KEY")
+ANTHROPIC_BASE_URL = os.environ.get("ANTHROPIC_BASE_URL", "https://api.anthropic.com")
+ANTHROPIC_VERSION = "2023-06-01"
+MISTRAL_API_KEY = os.environ.get("MISTRAL_API_KEY")
+MISTRAL_BASE_URL = os.environ.get("MISTRAL_BASE_URL", "https://api.mistral.ai")
+
+# Model names the UI and older code use, mapped to current provider model ids.
+MODEL_ALIASES = {
+    "claude-2": os.environ.get("ANTHROPIC_MODEL", "claude-3-5-sonnet-latest"),
+    "mistral-large": os.environ.get("MISTRAL_MODEL", "mistral-large-latest"),
+}
+
+HEDGED_TASKS = set(filter(None, os.environ.get("LLM_HEDGE_TASKS", "suggest_tags,categorize_note").split(",")))
+LLM_HEDGE_DELAY = float(os.environ.get("LLM_HEDGE_DELAY", 1.5))  # seconds, until enough samples
+LLM_HEDGE_MIN_DELAY = float(os.environ.get("LLM_HEDGE_MIN_DELAY", 0.2))  # seconds
+LLM_HEDGE_MIN_SAMPLES = int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", 20))
+LATENCY_WINDOW = int(os.environ.get("LLM_LATENCY_WINDOW", 200))  # samples per provider/model/task
+HEDGE_POOL_SIZE = int(os.environ.get("LLM_HEDGE_POOL_SIZE", 8))
+
+# Backup targets for hedging, in order of preference; the first one on a
+# different, configured provider is used.
+HEDGE_BACKUPS = [
+    ("anthropic", os.environ.get("ANTHROPIC_FAST_MODEL", "claude-3-5-haiku-latest")),
+    ("mistral", os.environ.get("MISTRAL_FAST_MODEL", "mistral-small-latest")),
+    ("openai", "gpt-4o-mini"),
+]
+
+FAKE_LATENCY_MS = float(os.environ.get("FAKE_LLM_LATENCY_MS", 200))
+FAKE_JITTER_MS = float(os.environ.get("FAKE_LLM_JITTER_MS", 100))
+FAKE_FAILURE_RATE = float(os.environ.get("FAKE_LLM_FAILURE_RATE", 0))
+
+
+class ProviderError(RuntimeError):
+    """Raised for unknown providers or providers without credentials."""
+
+
+def _json_instruction(response_format: dict) -> str:
+    """System text asking for JSON, for providers without structured outputs."""
+    if response_format.get("type") == "json_schema":
+        schema = response_format["json_schema"]["schema"]
+        return f"Respond only with a JSON object matching this JSON schema: {json.dumps(schema)}"
+    return "Respond only with a JSON object."
+
+
+def _strip_fences(text: str) -> str:
+    """Drop a Markdown code fence some models put around JSON replies."""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    return text.strip()
+
+
+class Provider:
+    """One LLM backend.  ``complete`` returns the reply text."""
+
+    name = None
+
+    def available(self) -> bool:
+        return True
+
+    def complete(self, task: str, model: str, messages: list, max_tokens: int,
+                 response_format: dict = None, timeout: float = None) -> str:
+        raise NotImplementedError
+
+    def stream(self, task: str, model: str, messages: list, max_tokens: int, timeout: float = None):
+        """Yield text deltas; adapters without native streaming yield the whole reply once."""
+        yield self.complete(task, model, messages, max_tokens, timeout=timeout)
+
+
+class OpenAIProvider(Provider):
+    name = "openai"
+
+    def available(self) -> bool:
+        return bool(llm_transport.OPENAI_API_KEY)
+
+    def complete(self, task, model, messages, max_tokens, response_format=None, timeout=None):
+        kwargs = {"response_format": response_format} if response_format else {}
+        response = llm_transport.chat(task, timeout=timeout, model=model, messages=messages,
+                                      max_tokens=max_tokens, **kwargs)
+        if response.usage:
+            metrics.record_tokens(task, self.name, model, response.usage.prompt_tokens,
+                                  response.usage.completion_tokens)
+        return response.choices[0].message.content
+
+    def stream(self, task, model, messages, max_tokens, timeout=None):
+        stream = llm_transport.chat(task, timeout=timeout, model=model, messages=messages,
+                                    max_tokens=max_tokens, stream=True, stream_options={"include_usage": True})
+        for chunk in stream:
+            if chunk.usage:
+                metrics.record_tokens(task, self.name, model, chunk.usage.prompt_tokens,
+                                      chunk.usage.completion_tokens)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class AnthropicProvider(Provider):
+    """Anthropic Messages API over the shared httpx pool."""
+
+    name = "anthropic"
+
+    def available(self) -> bool:
+        return bool(ANTHROPIC_API_KEY)
+
+    def _post(self, timeout: float, **body):
+        response = llm_transport.get_http().post(
+            f"{ANTHROPIC_BASE_URL}/v1/messages",
+            json=body,
+            headers={"x-api-key": ANTHROPIC_API_KEY or "", "anthropic-version": ANTHROPIC_VERSION},
+            timeout=timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def complete(self, task, model, messages, max_tokens, response_format=None, timeout=None):
+        system = [m["content"] for m in messages if m["role"] == "system"]
+        if response_format:
+            system.append(_json_instruction(response_format))
+        body = {
+            "model": model,
+            "max_tokens": max_tokens,
+            "messages": [m for m in messages if m["role"] != "system"],
+        }
+        if system:
+            body["system"] = "\n\n".join(system)
+        data = llm_transport.request(task, self._post, provider=self.name, timeout=timeout, **body)
+        usage = data.get("usage") or {}
+        metrics.record_tokens(task, self.name, model, usage.get("input_tokens"), usage.get("output_tokens"))
+        text = "".join(block.get("text", "") for block in data.get("content", []) if block.get("type") == "text")
+        return _strip_fences(text) if response_format else text
+
+
+class MistralProvider(Provider):
+    """Mistral's OpenAI-style chat completions API over the shared httpx pool."""
+
+    name = "mistral"
+
+    def available(self) -> bool:
+        return bool(MISTRAL_API_KEY)
+
+    def _post(self, timeout: float, **body):
+        response = llm_transport.get_http().post(
+            f"{MISTRAL_BASE_URL}/v1/chat/completions",
+            json=body,
+            headers={"Authorization": f"Bearer {MISTRAL_API_KEY or ''}"},
+            timeout=timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def complete(self, task, model, messages, max_tokens, response_format=None, timeout=None):
+        body = {"model": model, "max_tokens": max_tokens, "messages": list(messages)}
+        if response_format:
+            body["messages"].insert(0, {"role": "system", "content": _json_instruction(response_format)})
+            body["response_format"] = {"type": "json_object"}
+        data = llm_transport.request(task, self._post, provider=self.name, timeout=timeout, **body)
+        usage = data.get("usage") or {}
+        metrics.record_tokens(task, self.name, model, usage.get("prompt_tokens"), usage.get("completion_tokens"))
+        return data["choices"][0]["message"]["content"]
+
+
+class FakeProvider(Provider):
+    """Local stand-in with configurable latency and failures; never leaves the process."""
+
+    def __init__(self, name: str = "fake", latency_ms: float = FAKE_LATENCY_MS, jitter_ms: float = FAKE_JITTER_MS,
+                 failure_rate: float = FAKE_FAILURE_RATE):
+        self.name = name
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+
+    def _words(self, text: str, count: int) -> list:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return [f"topic{digest[i * 4:i * 4 + 4]}" for i in range(count)]
+
+    def _reply(self, model: str, prompt: str, response_format: dict = None) -> str:
+        if response_format and response_format.get("type") == "json_schema":
+            schema = response_format["json_schema"]["schema"]
+            reply = {}
+            for key, spec in schema.get("properties", {}).items():
+                reply[key] = self._words(prompt + key, 3) if spec.get("type") == "array" else f"{key} from {model}"
+            return json.dumps(reply)
+        if response_format:
+            return json.dumps({"results": []})
+        return ", ".join(self._words(prompt, 4)) if "tags" in prompt else f"Fake reply from {model}: {prompt[:80]}"
+
+    def complete(self, task, model, messages, max_tokens, response_format=None, timeout=None):
+        delay = max(0.0, random.gauss(self.latency_ms, self.jitter_ms)) / 1000.0
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"fake provider timed out after {timeout:g}s")
+        time.sleep(delay)
+        if random.random() < self.failure_rate:
+            raise RuntimeError("fake provider failure")
+        reply = self._reply(model, messages[-1]["content"], response_format)
+        metrics.record_tokens(task, self.name, model, sum(chunking.count_tokens(m["content"]) for m in messages),
+                              chunking.count_tokens(reply))
+        return reply
+
+
+PROVIDERS = {}
+
+
+def register_provider(provider: Provider):
+    PROVIDERS[provider.name] = provider
+
+
+for _provider in (OpenAIProvider(), AnthropicProvider(), MistralProvider(), FakeProvider()):
+    register_provider(_provider)
+
+
+def get_provider(name: str) -> Provider:
+    try:
+        return PROVIDERS[name]
+    except KeyError:
+        raise ProviderError(f"Unknown LLM provider: {name}")
+
+
+def provider_for_model(model: str) -> str:
+    if model.startswith("claude"):
+        return "anthropic"
+    if model.startswith(("mistral", "open-mistral", "codestral")):
+        return "mistral"
+    if model.startswith("fake"):
+        return "fake"
+    return "openai"
+
+
+def _parse_target(spec: str):
+    provider, _, model = spec.strip().partition(":")
+    return provider, model or "fake-1"
+
+
+def resolve(task: str, model: str):
+    """Return the ``(provider, model)`` to call for ``task``.
+
+    An operator route for the task (or the default route) wins; otherwise
+    the provider follows from the model name.
+    """
+    route = os.environ.get(f"LLM_ROUTE_{task.upper()}") or os.environ.get("LLM_ROUTE_DEFAULT")
+    if route:
+        return _parse_target(route)
+    model = MODEL_ALIASES.get(model, model)
+    return provider_for_model(model), model
+
+
+def available_models(models: list) -> list:
+    """The subset of ``models`` whose provider is configured."""
+    return [model for model in models if get_provider(resolve("chain_step", model)[0]).available()]
+
+
+class LatencyTracker:
+    """Sliding window of successful call latencies per (provider, model, task)."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: tuple, seconds: float):
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, key: tuple, pct: float = 95):
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+latencies = LatencyTracker()
+
+_stats = {"calls": 0, "errors": 0, "hedges": 0, "hedge_wins": 0, "failovers": 0}
+_stats_lock = threading.Lock()
+_hedge_executor = None
+_hedge_lock = threading.Lock()
+
+
+def _count(name: str):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _get_hedge_executor() -> ThreadPoolExecutor:
+    # Separate from ai_pool so a hedged call made from a pool task cannot
+    # wait on work queued behind itself.
+    global _hedge_executor
+    if _hedge_executor is None:
+        with _hedge_lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_POOL_SIZE, thread_name_prefix="llm-hedge")
+    return _hedge_executor
+
+
+def _call(task: str, target: tuple, messages: list, max_tokens: int, response_format: dict = None) -> str:
+    provider_name, model = target
+    provider = get_provider(provider_name)
+    if not provider.available():
+        raise ProviderError(f"LLM provider {provider_name} is not configured")
+    started = time.monotonic()
+    _count("calls")
+    try:
+        with metrics.llm_call(task, provider_name, model):
+            text = provider.complete(task, model, messages, max_tokens, response_format)
+    except Exception:
+        _count("errors")
+        raise
+    latencies.record((provider_name, model, task), time.monotonic() - started)
+    return text
+
+
+def hedge_delay(task: str, target: tuple) -> float:
+    p95 = latencies.percentile((target[0], target[1], task))
+    return max(LLM_HEDGE_MIN_DELAY, p95 if p95 is not None else LLM_HEDGE_DELAY)
+
+
+def hedge_target(task: str, primary: tuple):
+    """The backup for a hedged ``task``: ``LLM_HEDGE_<TASK>`` or the first other configured provider."""
+    configured = os.environ.get(f"LLM_HEDGE_{task.upper()}")
+    if configured:
+        return _parse_target(configured)
+    for provider_name, model in HEDGE_BACKUPS:
+        if provider_name != primary[0] and get_provider(provider_name).available():
+            return provider_name, model
+    return None
+
+
+def _hedged(task: str, primary: tuple, backup: tuple, messages: list, max_tokens: int, response_format: dict):
+    executor = _get_hedge_executor()
+    first = executor.submit(_call, task, primary, messages, max_tokens, response_format)
+    done, _ = wait([first], timeout=hedge_delay(task, primary))
+    if done and first.exception() is None:
+        return first.result()
+    if done:
+        logger.warning(f"{task} via {primary[0]} failed ({first.exception()}); failing over to {backup[0]}")
+        _count("failovers")
+        return _call(task, backup, messages, max_tokens, response_format)
+
+    _count("hedges")
+    second = executor.submit(_call, task, backup, messages, max_tokens, response_format)
+    pending = {first, second}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if future is second:
+                    _count("hedge_wins")
+                # The loser keeps running in the background; its result is discarded.
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+def complete(task: str, messages: list, model: str, max_tokens: int, response_format: dict = None) -> str:
+    """Run a chat ``task`` on the routed provider, hedging it if it is latency-critical."""
+    primary = resolve(task, model)
+    backup = hedge_target(task, primary) if task in HEDGED_TASKS else None
+    if backup is None:
+        return _call(task, primary, messages, max_tokens, response_format)
+    return _hedged(task, primary, backup, messages, max_tokens, response_format)
+
+
+def stream(task: str, messages: list, model: str, max_tokens: int):
+    """Yield text deltas for ``task`` from the routed provider."""
+    provider_name, model = resolve(task, model)
+    provider = get_provider(provider_name)
+    if not provider.available():
+        raise ProviderError(f"LLM provider {provider_name} is not configured")
+    with metrics.llm_call(task, provider_name, model):
+        yield from provider.stream(task, model, messages, max_tokens)
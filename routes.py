@@ -1,39 +1,115 @@
-from flask import render_template, redirect, url_for, request, jsonify, flash, send_file
+from flask import render_template, redirect, url_for, request, jsonify, flash, send_file, Response, stream_with_context, abort
 from flask_login import login_user, logout_user, login_required, current_user
 import os
 from datetime import datetime
 from werkzeug.utils import secure_filename
 from app import app, db
-from models import User, Note, NoteShare, Tag, AIInteraction
+from models import User, Note, NoteShare, Tag, AIInteraction, AIJob
 from ai_helper import (
     get_note_suggestions, categorize_note, enhance_note, 
-    summarize_note, transcribe_audio, suggest_tags, AIModel,
+    summarize_note, transcribe_audio_segments, suggest_tags, AIModel,
     expand_idea_with_chain, analyze_concept_with_chain,
-    generate_related_ideas, create_mind_map_suggestions
+    generate_related_ideas, create_mind_map_suggestions,
+    analyze_note, cached_analysis, AnalysisError
 )
+from llm_cache import cache_stats
+import ai_stream
+from search import search_notes, SEARCH_PAGE_SIZE
+from tags import set_note_tags, clear_note_tags, tag_counts
+from interactions import record_interaction, load_threads, context_window, parent_in_note, InteractionError, THREAD_PAGE_SIZE
+from jobs import submit_job, cancel_job, JobError
+from importer import import_notes, open_records, ImportFormatError, IMPORT_CHUNK_SIZE
+from exporter import export_stream, parse_since, record_changes
+import embeddings
+import fingerprints
+import json
+import tempfile
+import shutil
+import transcription
+from llm_transport import CircuitOpenError, breaker_stats
+from providers import ProviderError
+import providers
+import singleflight
+import metrics
+import identity
+import permissions
+from permissions import ShareError
+import autosave
+from autosave import PatchError, PatchConflict
+import math
+
+DASHBOARD_PAGE_SIZE = 24
+
+def _encode_note_cursor(note):
+    return f"{note.updated_at.isoformat()}|{note.id}"
+
+def _decode_note_cursor(cursor):
+    try:
+        updated_at, note_id = cursor.split('|')
+        return datetime.fromisoformat(updated_at), int(note_id)
+    except (AttributeError, ValueError):
+        return None
+
+def _note_page(query, cursor):
+    """Apply list-view loading and (updated_at, id) keyset pagination to ``query``.
+
+    Returns ``(rows, next_cursor)``.  Full note bodies are deferred in favour
+    of the SQL-side preview, and tags are loaded for the whole page at once.
+    """
+    query = query.options(
+        db.defer(Note.content),
+        db.undefer(Note.preview),
+        db.selectinload(Note.tags)
+    )
+    after = _decode_note_cursor(cursor) if cursor else None
+    if after:
+        query = query.filter(db.or_(
+            Note.updated_at < after[0],
+            db.and_(Note.updated_at == after[0], Note.id < after[1])
+        ))
+    rows = query.order_by(Note.updated_at.desc(), Note.id.desc()).limit(DASHBOARD_PAGE_SIZE + 1).all()
+    next_cursor = None
+    if len(rows) > DASHBOARD_PAGE_SIZE:
+        rows = rows[:DASHBOARD_PAGE_SIZE]
+        last = rows[-1] if isinstance(rows[-1], Note) else rows[-1][0]
+        next_cursor = _encode_note_cursor(last)
+    return rows, next_cursor
+
+def _own_notes_page(tag, cursor):
+    query = Note.query.filter(Note.user_id == current_user.id)
+    if tag:
+        query = query.filter(Note.tags.any(name=tag))
+    return _note_page(query, cursor)
+
+def _shared_notes_page(cursor):
+    query = db.session.query(Note, NoteShare.can_edit).join(
+        NoteShare, NoteShare.note_id == Note.id
+    ).filter(
+        NoteShare.user_id == current_user.id
+    ).options(db.selectinload(Note.author))
+    return _note_page(query, cursor)
 
 @app.route('/')
 @login_required
 def index():
     tag = request.args.get('tag')
-    if tag:
-        own_notes = Note.query.filter(
-            Note.user_id == current_user.id,
-            Note.tags.any(name=tag)
-        ).order_by(Note.updated_at.desc()).all()
-    else:
-        own_notes = Note.query.filter_by(
-            user_id=current_user.id
-        ).order_by(Note.updated_at.desc()).all()
-    
-    shared_notes = Note.query.join(NoteShare).filter(
-        NoteShare.user_id == current_user.id
-    ).order_by(Note.updated_at.desc()).all()
+    section = request.args.get('section')
+    if section in ('own', 'shared'):
+        # Infinite-scroll request for the next page of one section
+        if section == 'own':
+            notes, next_cursor = _own_notes_page(tag, request.args.get('before'))
+        else:
+            notes, next_cursor = _shared_notes_page(request.args.get('before'))
+        html = render_template('_notes_page.html', section=section, notes=notes)
+        return jsonify({'html': html, 'next_cursor': next_cursor})
+
+    own_notes, own_cursor = _own_notes_page(tag, None)
+    shared_notes, shared_cursor = _shared_notes_page(None)
     
-    user_tags = Tag.query.filter_by(user_id=current_user.id).all()
-    return render_template('notes.html', own_notes=own_notes, 
-                         shared_notes=shared_notes, user_tags=user_tags,
-                         current_tag=tag)
+    user_tags = tag_counts(current_user.id)
+    return render_template('notes.html', own_notes=own_notes, own_cursor=own_cursor,
+                         shared_notes=shared_notes, shared_cursor=shared_cursor,
+                         user_tags=user_tags, current_tag=tag)
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -43,6 +119,7 @@ def login():
         user = User.query.filter_by(username=request.form['username']).first()
         if user and user.check_password(request.form['password']):
             login_user(user)
+            identity.stamp(user)
             return redirect(url_for('index'))
         flash('Invalid username or password')
     return render_template('login.html')
@@ -73,45 +150,40 @@ def new_note():
         note.title = request.form['title']
         note.content = request.form['content']
         note.user_id = current_user.id
-        
-        tag_names = request.form.getlist('tags[]')
-        for tag_name in tag_names:
-            tag = Tag.query.filter_by(name=tag_name, user_id=current_user.id).first()
-            if not tag:
-                tag = Tag(name=tag_name, user_id=current_user.id)
-                db.session.add(tag)
-            note.tags.append(tag)
+        note.category = _analyzed_category(note.content, note.category)
+        fingerprints.stamp(note)
         
         db.session.add(note)
+        set_note_tags(note, request.form.getlist('tags[]'), note.user_id)
         db.session.commit()
+        _schedule_reprocessing(note)
         return redirect(url_for('edit_note', id=note.id))
     return render_template('edit_note.html', note=None)
 
 @app.route('/note/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_note(id):
-    note = Note.query.get_or_404(id)
-    if note.user_id != current_user.id:
-        shared = NoteShare.query.filter_by(note_id=id, user_id=current_user.id).first()
-        if not shared or not shared.can_edit:
-            flash('You do not have permission to edit this note')
-            return redirect(url_for('index'))
+    note, level = permissions.note_and_level(current_user.id, id)
+    if note is None:
+        abort(404)
+    if level < permissions.EDIT:
+        flash('You do not have permission to edit this note')
+        return redirect(url_for('index'))
             
     if request.method == 'POST':
+        version = request.form.get('version', type=int)
+        if version is not None and version != (note.version or 1):
+            # Saved elsewhere (e.g. by autosave in another tab) since this form was loaded
+            return render_template('edit_note.html', note=note, draft=request.form), 409
         note.title = request.form['title']
         note.content = request.form['content']
+        note.category = _analyzed_category(note.content, note.category)
+        fingerprints.stamp(note)
         
-        # Update tags
-        note.tags.clear()
-        tag_names = request.form.getlist('tags[]')
-        for tag_name in tag_names:
-            tag = Tag.query.filter_by(name=tag_name, user_id=current_user.id).first()
-            if not tag:
-                tag = Tag(name=tag_name, user_id=current_user.id)
-                db.session.add(tag)
-            note.tags.append(tag)
-            
+        # Update only the tag links that changed
+        set_note_tags(note, request.form.getlist('tags[]'), note.user_id)
         db.session.commit()
+        _schedule_reprocessing(note)
         return redirect(url_for('index'))
     return render_template('edit_note.html', note=note)
 
@@ -122,8 +194,16 @@ def delete_note(id):
     if note.user_id != current_user.id:
         flash('You do not have permission to delete this note')
         return redirect(url_for('index'))
+    record_changes([note.id], 'deleted')
+    clear_note_tags(note)
+    embeddings.remove_note(note.id, note.user_id)
+    fingerprints.forget(note.id)
+    # Dependent rows would otherwise block the delete (their note_id is NOT NULL)
+    AIInteraction.query.filter_by(note_id=note.id).delete(synchronize_session=False)
+    NoteShare.query.filter_by(note_id=note.id).delete(synchronize_session=False)
     db.session.delete(note)
     db.session.commit()
+    embeddings.sync_index(current_user.id, removed=[id])
     return redirect(url_for('index'))
 
 @app.route('/note/<int:id>/share', methods=['GET', 'POST'])
@@ -135,27 +215,20 @@ def share_note(id):
         return redirect(url_for('index'))
         
     if request.method == 'POST':
-        username = request.form['username']
-        user = User.query.filter_by(username=username).first()
-        if not user:
-            flash('User not found')
-        elif user.id == current_user.id:
-            flash('Cannot share note with yourself')
-        else:
-            share = NoteShare.query.filter_by(note_id=id, user_id=user.id).first()
-            if share:
-                flash('Note already shared with this user')
-            else:
-                share = NoteShare(
-                    note_id=id,
-                    user_id=user.id,
-                    can_edit='can_edit' in request.form
-                )
-                db.session.add(share)
-                db.session.commit()
+        # One or more comma-separated usernames, shared in one transaction
+        usernames = [name.strip() for name in request.form['username'].split(',') if name.strip()]
+        try:
+            users = permissions.resolve_users(usernames=usernames)
+            result = permissions.grant(current_user.id, [
+                (id, user_id, 'can_edit' in request.form) for user_id in users.values()])
+            if result['created'] or result['updated']:
                 flash('Note shared successfully')
-                
-    shared_with = note.shared_with.all()
+            else:
+                flash('Note already shared with this user')
+        except ShareError as e:
+            flash(str(e))
+
+    shared_with = note.shared_with.options(db.joinedload(NoteShare.shared_with)).all()
     return render_template('share_note.html', note=note, shared_with=shared_with)
 
 @app.route('/note/<int:id>/unshare/<int:user_id>')
@@ -166,18 +239,196 @@ def unshare_note(id, user_id):
         flash('You do not have permission to unshare this note')
         return redirect(url_for('index'))
         
-    share = NoteShare.query.filter_by(note_id=id, user_id=user_id).first_or_404()
-    db.session.delete(share)
-    db.session.commit()
+    if not permissions.revoke(current_user.id, [(id, user_id)]):
+        abort(404)
     flash('Note unshared successfully')
     return redirect(url_for('share_note', id=id))
 
 @app.route('/logout')
 def logout():
     logout_user()
+    identity.forget()
     return redirect(url_for('login'))
 
 # API Routes
+def _accessible_note(note_id):
+    """Return the note if the current user owns it or it is shared with them."""
+    return permissions.accessible_note(current_user.id, note_id)
+
+@app.errorhandler(InteractionError)
+def _invalid_parent(e):
+    return jsonify({'error': str(e), 'code': 'INVALID_PARENT'}), 400
+
+def _record_interaction(note_id, interaction_type, content, model_used, metadata=None):
+    """Save an AI result against the request's note, if the user can access it."""
+    note = _accessible_note(note_id)
+    if note is None or not content:
+        return None
+    try:
+        return record_interaction(note.id, interaction_type, content, model_used,
+                                  parent_id=request.args.get('parent_id', type=int),
+                                  metadata=metadata)
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Failed to record AI interaction: {str(e)}")
+        return None
+
+def _analyzed_category(content, current=None):
+    """Category from an analysis the editor already ran for ``content``, if any."""
+    analysis = cached_analysis(content, request.form.get('model', AIModel.GPT4O_MINI.value))
+    return analysis['category'] if analysis and analysis['category'] else current
+
+def _schedule_reprocessing(note):
+    """Queue background AI/embedding refreshes if the save changed the note enough."""
+    try:
+        fingerprints.schedule(note, current_user.id, request.form.get('model', AIModel.GPT4O_MINI.value))
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Failed to schedule reprocessing for note {note.id}: {str(e)}")
+
+def _request_content():
+    """The ``content`` query parameter, or the saved body of ``note_id`` when it is omitted.
+
+    Raises ``InteractionError`` when ``parent_id`` is not an interaction on ``note_id``, so a
+    reply to another note is rejected before any AI call is made.
+    """
+    note_id = request.args.get('note_id', type=int)
+    parent_id = request.args.get('parent_id', type=int)
+    if parent_id is not None and not parent_in_note(note_id, parent_id):
+        raise InteractionError(f"Interaction {parent_id} is not on note {note_id}")
+    content = request.args.get('content')
+    if content is None:
+        note = _accessible_note(note_id)
+        return note.content if note else ''
+    return content
+
+def _fresh_analysis(content, model):
+    """The note's stored analysis, if ``content`` has not drifted past the re-analysis threshold."""
+    note = _accessible_note(request.args.get('note_id', type=int))
+    if note is None:
+        return None
+    return fingerprints.fresh_result(note, 'analysis', model, content)
+
+def _previous_interactions(note_id):
+    note = _accessible_note(note_id)
+    if note is None:
+        return None
+    return context_window(note.id, request.args.get('parent_id', type=int))
+
+@app.route('/api/search')
+@login_required
+def search_api():
+    query = request.args.get('q', '')
+    if not query.strip():
+        return jsonify({'error': 'No search query provided'}), 400
+    limit = min(request.args.get('limit', SEARCH_PAGE_SIZE, type=int), 100)
+    try:
+        results, next_cursor = search_notes(current_user.id, query, limit, request.args.get('cursor'))
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Search error: {str(e)}")
+        return jsonify({'error': 'Search failed'}), 500
+    return jsonify({'results': results, 'next_cursor': next_cursor})
+
+@app.route('/api/note/<int:id>/interactions')
+@login_required
+def note_interactions_api(id):
+    note = _accessible_note(id)
+    if note is None:
+        return jsonify({'error': 'Note not found'}), 404
+    limit = min(request.args.get('limit', THREAD_PAGE_SIZE, type=int), 100)
+    threads, next_before = load_threads(note.id, limit, request.args.get('before', type=int))
+    return jsonify({'interactions': threads, 'next_before': next_before})
+
+def _note_state(note):
+    return {
+        'id': note.id,
+        'version': note.version or 1,
+        'title': note.title,
+        'content': note.content,
+        'tags': [tag.name for tag in note.tags],
+        'updated_at': note.updated_at.isoformat() if note.updated_at else None
+    }
+
+@app.route('/api/note/<int:id>', methods=['PATCH'])
+@login_required
+def patch_note_api(id):
+    """Autosave a delta against the version in ``If-Match`` (or ``version``); see autosave.py.
+
+    A stale version is merged when the edits still apply, else answered
+    with 409 and the note's current state.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    base_version = autosave.parse_etag(request.headers.get('If-Match')) or data.get('version')
+    if isinstance(base_version, bool) or not isinstance(base_version, int):
+        return jsonify({'error': 'If-Match or version is required', 'code': 'VERSION_REQUIRED'}), 428
+
+    level = permissions.level(current_user.id, id)
+    if not level:
+        return jsonify({'error': 'Note not found'}), 404
+    if level < permissions.EDIT:
+        return jsonify({'error': 'You do not have permission to edit this note'}), 403
+    # Row lock (on databases that support it) so concurrent saves apply one after another;
+    # taken only once the user may edit, and re-read so the patch applies to the locked row.
+    note = Note.query.filter_by(id=id).with_for_update().populate_existing().first()
+    if note is None:
+        return jsonify({'error': 'Note not found'}), 404
+
+    previous_content = note.content
+    try:
+        merged = autosave.apply_patch(note, data, base_version)
+        db.session.flush()
+        result = {'id': note.id, 'version': note.version or 1, 'merged': merged}
+        if merged:
+            result.update(_note_state(note))
+        etag = autosave.etag(note)
+        content_changed = note.content != previous_content
+        db.session.commit()
+    except PatchConflict as e:
+        db.session.rollback()
+        response = jsonify(dict(_note_state(note), error=str(e), code='VERSION_CONFLICT'))
+        response.headers['ETag'] = autosave.etag(note)
+        return response, 409
+    except PatchError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), 'code': 'INVALID_PATCH'}), 400
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Autosave failed for note {id}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+    if content_changed:
+        _schedule_reprocessing(note)
+    response = jsonify(result)
+    response.headers['ETag'] = etag
+    return response
+
+@app.route('/api/note/<int:id>/related')
+@login_required
+def related_notes_api(id):
+    """The current user's own notes most similar to this one."""
+    note = _accessible_note(id)
+    if note is None:
+        return jsonify({'error': 'Note not found'}), 404
+    k = max(1, min(request.args.get('k', embeddings.RELATED_NOTES_LIMIT, type=int), 50))
+    try:
+        return jsonify({'related': embeddings.related_notes(current_user.id, note, k)})
+    except Exception as e:
+        app.logger.error(f"Related notes error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def _ai_error(e):
+    """JSON error response for a failed AI call; 503 with Retry-After while the provider's circuit is open."""
+    if isinstance(e, CircuitOpenError):
+        response = jsonify({'error': str(e), 'code': 'AI_UNAVAILABLE', 'retry_after': math.ceil(e.retry_after)})
+        response.headers['Retry-After'] = str(math.ceil(e.retry_after))
+        return response, 503
+    if isinstance(e, ProviderError):
+        return jsonify({'error': str(e), 'code': 'AI_UNAVAILABLE'}), 503
+    return jsonify({'error': str(e)}), 500
+
 @app.route('/api/transcribe', methods=['POST'])
 @login_required
 def transcribe_api():
@@ -199,103 +450,404 @@ def transcribe_api():
         if not any(allowed_type in content_type.lower() for allowed_type in allowed_types):
             return jsonify({'error': f'Unsupported audio format: {content_type}'}), 400
             
-        # Save file temporarily with a secure filename
-        if audio_file.filename:
-            filename = secure_filename(audio_file.filename)
-            temp_path = os.path.join('temp_audio', filename)
-            os.makedirs('temp_audio', exist_ok=True)
-            audio_file.save(temp_path)
-            
-            try:
-                transcribed_text = transcribe_audio(temp_path)
-                if not transcribed_text:
-                    raise Exception("Failed to transcribe audio")
-                    
-                return jsonify({
-                    'text': transcribed_text,
-                    'success': True
-                })
-            finally:
-                # Cleanup temp file
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
-        else:
+        if not audio_file.filename:
             return jsonify({'error': 'Invalid filename'}), 400
-                    
+
+        # Each request gets its own directory, so identical filenames never collide
+        request_dir = transcription.request_dir()
+        try:
+            temp_path = os.path.join(request_dir, secure_filename(audio_file.filename) or 'audio')
+            audio_file.save(temp_path)
+            result = transcribe_audio_segments(temp_path)
+            if not result:
+                raise Exception("Failed to transcribe audio")
+
+            return jsonify({
+                'text': result['text'],
+                'segments': result['segments'],
+                'errors': result['errors'],
+                'cached': result['cached'],
+                'success': True
+            })
+        finally:
+            shutil.rmtree(request_dir, ignore_errors=True)
+
     except Exception as e:
         app.logger.error(f"Transcription error: {str(e)}")
-        return jsonify({'error': str(e)}), 500
+        return _ai_error(e)
 
 @app.route('/api/enhance')
 @login_required
 def enhance_api():
-    content = request.args.get('content', '')
+    content = _request_content()
     model = request.args.get('model', AIModel.GPT4O.value)
     try:
         enhanced = enhance_note(content, model)
+        _record_interaction(request.args.get('note_id', type=int), 'enhance', enhanced, model)
         return jsonify({'enhanced': enhanced})
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return _ai_error(e)
+
+@app.route('/api/analyze')
+@login_required
+def analyze_api():
+    """Category, tags, summary and suggestions for the content from one model call.
+
+    With ``note_id`` for a note the user can edit, the category is saved on it.
+    """
+    content = _request_content()
+    model = request.args.get('model', AIModel.GPT4O_MINI.value)
+    if len(content) < 10:
+        return jsonify({'error': 'Content too short for analysis', 'code': 'CONTENT_TOO_SHORT'}), 400
+    try:
+        analysis = _fresh_analysis(content, model) or analyze_note(content, model)
+    except AnalysisError as e:
+        app.logger.error(f"Invalid analysis response: {str(e)}")
+        return jsonify({'error': str(e), 'code': 'INVALID_FORMAT'}), 502
+    except Exception as e:
+        return _ai_error(e)
+
+    note = _accessible_note(request.args.get('note_id', type=int))
+    if note is not None and analysis['category'] and note.category != analysis['category']:
+        if permissions.can_edit(current_user.id, note.id):
+            try:
+                note.category = analysis['category']
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"Failed to save note category: {str(e)}")
+    return jsonify(dict(analysis, model_used=model))
+
+@app.route('/api/suggestions')
+@login_required
+def suggestions_api():
+    content = _request_content()
+    model = request.args.get('model', AIModel.GPT4O_MINI.value)
+    try:
+        analysis = _fresh_analysis(content, model)
+        suggestions = analysis['suggestions'] if analysis else get_note_suggestions(content, model)
+        return jsonify({'suggestions': suggestions})
+    except Exception as e:
+        return _ai_error(e)
 
 @app.route('/api/summarize')
 @login_required
 def summarize_api():
-    content = request.args.get('content', '')
-    model = request.args.get('model', AIModel.GPT4O.value)
+    content = _request_content()
+    requested = request.args.get('model')
+    model = requested or AIModel.GPT4O.value
     try:
-        summary = summarize_note(content, model)
+        analysis = _fresh_analysis(content, model)
+        if analysis is None and not requested:
+            # Analyses (and the caches they pre-warm) use the lighter model; reuse one
+            # rather than paying for a new summary when the caller did not pick a model.
+            analysis_model = AIModel.GPT4O_MINI.value
+            analysis = _fresh_analysis(content, analysis_model) or cached_analysis(content, analysis_model)
+            if analysis:
+                model = analysis_model
+        summary = analysis['summary'] if analysis else summarize_note(content, model)
+        _record_interaction(request.args.get('note_id', type=int), 'summary', summary, model)
         return jsonify({'summary': summary})
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return _ai_error(e)
 
 @app.route('/api/expand-idea-chain')
 @login_required
 def expand_idea_api():
-    content = request.args.get('content', '')
+    content = _request_content()
     model = request.args.get('model', AIModel.GPT4O.value)
+    note_id = request.args.get('note_id', type=int)
     try:
-        result = expand_idea_with_chain(content)
+        result = expand_idea_with_chain(content, _previous_interactions(note_id), mode=request.args.get('mode'))
+        _record_interaction(note_id, 'expand', result['expanded'], AIModel.GPT4O.value, {
+            'chain_insights': result['chain_insights'],
+            'models_used': result['metadata']['models_used']
+        })
         return jsonify(result)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return _ai_error(e)
 
 @app.route('/api/analyze-concept-chain')
 @login_required
 def analyze_concept_api():
-    content = request.args.get('content', '')
+    content = _request_content()
     model = request.args.get('model', AIModel.GPT4O.value)
+    note_id = request.args.get('note_id', type=int)
     try:
-        result = analyze_concept_with_chain(content)
+        result = analyze_concept_with_chain(content, _previous_interactions(note_id), mode=request.args.get('mode'))
+        _record_interaction(note_id, 'analyze', result['analysis'], AIModel.GPT4O.value, {
+            'chain_insights': result['chain_insights'],
+            'models_used': result['metadata']['models_used']
+        })
         return jsonify(result)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return _ai_error(e)
 
 @app.route('/api/related-ideas')
 @login_required
 def related_ideas_api():
-    content = request.args.get('content', '')
+    content = _request_content()
     model = request.args.get('model', AIModel.GPT4O.value)
     try:
         result = generate_related_ideas(content, model)
+        _record_interaction(request.args.get('note_id', type=int), 'related', result['related_ideas'], model)
         return jsonify(result)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return _ai_error(e)
 
 @app.route('/api/mind-map')
 @login_required
 def mind_map_api():
-    content = request.args.get('content', '')
+    content = _request_content()
     model = request.args.get('model', AIModel.GPT4O.value)
     try:
         result = create_mind_map_suggestions(content, model)
+        _record_interaction(request.args.get('note_id', type=int), 'mind_map', result['mind_map'], model)
         return jsonify(result)
     except Exception as e:
+        return _ai_error(e)
+
+# endpoint -> (interaction type, result key)
+STREAM_KINDS = {
+    'expand-idea-chain': ('expand', 'expanded'),
+    'analyze-concept-chain': ('analyze', 'analysis'),
+    'related-ideas': ('related', 'related_ideas'),
+    'mind-map': ('mind_map', 'mind_map'),
+}
+
+@app.route('/api/stream/<endpoint>')
+@login_required
+def stream_api(endpoint):
+    """SSE variant of the long AI endpoints; one named stream per model."""
+    if endpoint not in STREAM_KINDS:
+        return jsonify({'error': f'Unknown streaming endpoint: {endpoint}'}), 404
+    kind, result_key = STREAM_KINDS[endpoint]
+    content = _request_content()
+    model = request.args.get('model', AIModel.GPT4O.value)
+    note_id = request.args.get('note_id', type=int)
+    if not content:
+        return jsonify({'error': 'No content provided'}), 400
+
+    def persist(payload):
+        if 'chain_insights' in payload:
+            _record_interaction(note_id, kind, payload[result_key], AIModel.GPT4O.value, {
+                'chain_insights': payload['chain_insights'],
+                'models_used': payload['metadata']['models_used']
+            })
+        else:
+            _record_interaction(note_id, kind, payload[result_key], model)
+
+    if kind in ('expand', 'analyze'):
+        events = ai_stream.stream_chain(kind, content, _previous_interactions(note_id), on_complete=persist)
+    else:
+        events = ai_stream.stream_single(kind, content, model, on_complete=persist)
+
+    return Response(stream_with_context(events), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+def _share_entries(data):
+    """``[(note_id, user, can_edit)]`` from ``grants``/``shares`` and/or ``note_ids`` x ``users``.
+
+    ``user`` is a user id or a username.
+    """
+    entries = []
+    for item in (data.get('grants') or data.get('shares') or []):
+        user = item.get('user_id', item.get('username', item.get('user')))
+        entries.append((item.get('note_id'), user, item.get('can_edit', False)))
+    for note_id in data.get('note_ids') or []:
+        for user in data.get('users') or []:
+            entries.append((note_id, user, data.get('can_edit', False)))
+    for note_id, user, _ in entries:
+        if not isinstance(note_id, int) or isinstance(note_id, bool) or not isinstance(user, (int, str)):
+            raise ShareError(f"Invalid share entry: note {note_id!r}, user {user!r}")
+    return entries
+
+def _resolved_shares(data):
+    entries = _share_entries(data)
+    users = permissions.resolve_users(
+        user_ids=[user for _, user, _ in entries if isinstance(user, int)],
+        usernames=[user for _, user, _ in entries if isinstance(user, str)])
+    return [(note_id, users[user], can_edit) for note_id, user, can_edit in entries]
+
+@app.route('/api/notes/access')
+@login_required
+def note_access_api():
+    """The current user's access level to each of ``ids`` (comma-separated), in one query."""
+    try:
+        note_ids = [int(value) for value in request.args.get('ids', '').split(',') if value.strip()]
+    except ValueError:
+        return jsonify({'error': 'ids must be comma-separated integers'}), 400
+    levels = permissions.levels(current_user.id, note_ids[:500])
+    return jsonify({'access': {str(note_id): permissions.LEVEL_NAMES[level] for note_id, level in levels.items()}})
+
+@app.route('/api/shares', methods=['POST'])
+@login_required
+def bulk_share_api():
+    """Create or update many shares of the current user's notes in one transaction."""
+    data = request.get_json(silent=True) or {}
+    try:
+        result = permissions.grant(current_user.id, _resolved_shares(data))
+    except ShareError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"Bulk share failed: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    return jsonify(result)
+
+@app.route('/api/shares/revoke', methods=['POST'])
+@login_required
+def bulk_unshare_api():
+    """Remove many shares of the current user's notes in one statement."""
+    data = request.get_json(silent=True) or {}
+    try:
+        pairs = [(note_id, user_id) for note_id, user_id, _ in _resolved_shares(data)]
+        removed = permissions.revoke(current_user.id, pairs)
+    except ShareError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"Bulk unshare failed: {str(e)}")
         return jsonify({'error': str(e)}), 500
+    return jsonify({'removed': removed})
+
+@app.route('/api/jobs', methods=['POST'])
+@login_required
+def submit_job_api():
+    data = request.get_json(silent=True) or {}
+    try:
+        job, created = submit_job(current_user.id, data.get('task', ''), data.get('payload', {}))
+    except JobError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'job_id': job.id, 'status': job.status, 'deduplicated': not created}), 202
+
+@app.route('/api/jobs/transcribe', methods=['POST'])
+@login_required
+def submit_transcribe_job_api():
+    audio_file = request.files.get('audio')
+    if not audio_file or not audio_file.filename:
+        return jsonify({'error': 'No audio file provided'}), 400
+
+    os.makedirs(transcription.TEMP_ROOT, exist_ok=True)
+    suffix = os.path.splitext(secure_filename(audio_file.filename))[1]
+    fd, temp_path = tempfile.mkstemp(suffix=suffix, dir=transcription.TEMP_ROOT)
+    with os.fdopen(fd, 'wb') as f:
+        audio_file.save(f)
+
+    job, created = submit_job(current_user.id, 'transcribe_audio', {'audio_path': temp_path}, internal=True)
+    return jsonify({'job_id': job.id, 'status': job.status, 'deduplicated': not created}), 202
+
+@app.route('/api/jobs/<int:job_id>')
+@login_required
+def job_status_api(job_id):
+    job = AIJob.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<int:job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_job_api(job_id):
+    job = AIJob.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    cancelled = cancel_job(job)
+    return jsonify({'job_id': job.id, 'status': job.status, 'cancelled': cancelled})
+
+@app.route('/api/import', methods=['POST'])
+@login_required
+def import_notes_api():
+    """Bulk-import notes from an uploaded file or a raw NDJSON body.
+
+    Streams one NDJSON progress line per committed chunk, then a final line
+    with ``done`` set.  If the import fails, the final line also carries
+    ``error``; its counts are what the committed chunks already imported.
+    """
+    upload = request.files.get('file')
+    spooled = None
+    try:
+        if upload and upload.filename:
+            # Werkzeug closes uploads when the view returns, before the body streams.
+            spooled = tempfile.TemporaryFile()
+            upload.save(spooled)
+            spooled.seek(0)
+            records = open_records(spooled, upload.filename, request.args.get('format'))
+        else:
+            records = open_records(request.stream, fmt=request.args.get('format', 'ndjson'))
+        chunk_size = max(1, min(int(request.args.get('chunk_size', IMPORT_CHUNK_SIZE)), 5000))
+    except (ImportFormatError, ValueError) as e:
+        if spooled:
+            spooled.close()
+        return jsonify({'error': str(e)}), 400
+
+    user_id = current_user.id
+    categorize = request.args.get('categorize') == '1'
+
+    def generate():
+        progress = {'imported': 0, 'skipped': 0, 'chunks': 0}
+        try:
+            for progress in import_notes(user_id, records, chunk_size=chunk_size, categorize=categorize):
+                yield json.dumps(progress) + '\n'
+        except Exception as e:
+            app.logger.error(f"Import failed for user {user_id} after {progress['imported']} notes: {str(e)}")
+            yield json.dumps(dict(progress, error=str(e), done=True)) + '\n'
+        finally:
+            if spooled:
+                spooled.close()
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson', headers={
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/export')
+@login_required
+def export_notes_api():
+    """Stream the user's notes, tags, shares and AI threads as NDJSON or a zip.
+
+    ``since`` (ISO timestamp) limits the export to what changed after it,
+    with tombstones for notes deleted since; see exporter.py.
+    """
+    fmt = request.args.get('format', 'ndjson')
+    try:
+        since = parse_since(request.args.get('since'))
+        chunks = export_stream(current_user.id, fmt, since)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    stamp = datetime.utcnow().strftime('%Y%m%d-%H%M%S')
+    filename = f"notes-export-{stamp}.{'zip' if fmt == 'zip' else 'ndjson'}"
+    return Response(stream_with_context(chunks),
+                    mimetype='application/zip' if fmt == 'zip' else 'application/x-ndjson',
+                    headers={
+                        'Content-Disposition': f'attachment; filename="{filename}"',
+                        'X-Accel-Buffering': 'no'
+                    })
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape target; requires ``Authorization: Bearer $METRICS_TOKEN``, or loopback if that is unset."""
+    if not metrics.authorized(request.headers.get('Authorization', ''), request.remote_addr):
+        if not metrics.METRICS_TOKEN:
+            abort(404)
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics/profiles')
+def metrics_profiles():
+    """Collapsed stacks of recent slow requests, when the sampling profiler is enabled."""
+    if not metrics.authorized(request.headers.get('Authorization', ''), request.remote_addr):
+        if not metrics.METRICS_TOKEN:
+            abort(404)
+        return jsonify({'error': 'Unauthorized'}), 401
+    profiles = list(metrics.profiler.profiles) if metrics.profiler is not None else []
+    return jsonify({'enabled': metrics.profiler is not None, 'profiles': profiles})
+
+@app.route('/api/ai-cache/stats')
+@login_required
+def ai_cache_stats_api():
+    return jsonify(dict(cache_stats(), circuits=breaker_stats(), providers=providers.stats(),
+                        singleflight=singleflight.stats()))
 
 @app.route('/api/suggest-tags')
 @login_required
 def suggest_tags_api():
-    content = request.args.get('content', '')
+    content = _request_content()
     model = request.args.get('model', AIModel.GPT4O_MINI.value)
     
     if not content:
@@ -307,17 +859,20 @@ def suggest_tags_api():
     try:
         # Get AI suggested tags with error handling
         try:
-            suggested_tags = suggest_tags(content, model)
+            analysis = _fresh_analysis(content, model)
+            suggested_tags = analysis['tags'] if analysis else suggest_tags(content, model)
             if not suggested_tags:
                 return jsonify({'error': 'No tags could be generated', 'code': 'NO_TAGS_GENERATED'}), 422
         except Exception as e:
             app.logger.error(f"AI tag suggestion error: {str(e)}")
+            if isinstance(e, (CircuitOpenError, ProviderError)):
+                return _ai_error(e)
             return jsonify({'error': 'Failed to generate tags', 'code': 'AI_ERROR'}), 500
         
-        # Get user's existing tags
+        # Get precomputed usage counts for the suggested tags the user already has
         try:
-            existing_tags = Tag.query.filter_by(user_id=current_user.id).all()
-            existing_tag_names = set(tag.name.lower() for tag in existing_tags)
+            usage_counts = {name.lower(): count for name, count in tag_counts(current_user.id, suggested_tags)}
+            existing_tags_total = Tag.query.filter_by(user_id=current_user.id).count()
         except Exception as e:
             app.logger.error(f"Database query error: {str(e)}")
             return jsonify({'error': 'Failed to fetch existing tags', 'code': 'DB_ERROR'}), 500
@@ -327,16 +882,13 @@ def suggest_tags_api():
         for tag in suggested_tags:
             normalized_tag = tag.lower().strip()
             if normalized_tag:  # Only add non-empty tags
-                # Get usage count for existing tags
-                usage_count = 0
-                if normalized_tag in existing_tag_names:
-                    tag_obj = next(t for t in existing_tags if t.name.lower() == normalized_tag)
-                    usage_count = len(tag_obj.notes)
+                exists = normalized_tag in usage_counts
+                usage_count = usage_counts.get(normalized_tag, 0)
                 
                 processed_tags.append({
                     'name': normalized_tag,
-                    'exists': normalized_tag in existing_tag_names,
-                    'type': 'existing' if normalized_tag in existing_tag_names else 'new',
+                    'exists': exists,
+                    'type': 'existing' if exists else 'new',
                     'usage_count': usage_count,
                     'relevance': 'high' if usage_count > 5 else 'medium' if usage_count > 0 else 'low'
                 })
@@ -354,7 +906,7 @@ def suggest_tags_api():
             'metadata': {
                 'model_used': model,
                 'content_length': len(content),
-                'existing_tags_total': len(existing_tags),
+                'existing_tags_total': existing_tags_total,
                 'timestamp': datetime.utcnow().isoformat()
             }
         }
@@ -0,0 +1,82 @@
+"""Idempotent schema upkeep that ``db.create_all()`` does not cover.
+
+``create_all`` only creates missing tables, so indexes added to models after
+a table already exists would never reach deployed databases.
+"""
+import logging
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+
+def ensure_indexes():
+    """Create any model-declared index that is missing from the database."""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+
+def ensure_columns():
+    """Add nullable model columns that are missing from existing tables."""
+    inspector = db.inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in present or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            quote = db.engine.dialect.identifier_preparer.quote
+            with db.engine.begin() as conn:
+                conn.execute(db.text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column_type}"))
+            logger.info(f"Added column {table.name}.{column.name}")
+
+
+def ensure_tag_uniqueness():
+    """Drop the old global unique constraint on ``tag.name``.
+
+    Tags belong to users, so two users may both have a "work" tag; the
+    per-user ``uq_tag_user_name`` index is created by ``ensure_indexes``.
+    Postgres drops the constraint in place.  SQLite cannot drop constraints,
+    so the table is recreated from the model and its rows copied over.
+    """
+    inspector = db.inspect(db.engine)
+    if "tag" not in inspector.get_table_names():
+        return
+    legacy = [c for c in inspector.get_unique_constraints("tag") if c["column_names"] == ["name"]]
+    if not legacy:
+        return
+    from models import Tag
+
+    quote = db.engine.dialect.identifier_preparer.quote
+    with db.engine.begin() as conn:
+        if db.engine.dialect.name == "sqlite":
+            columns = ", ".join(quote(column.name) for column in Tag.__table__.columns)
+            # Keep note_tags and tag_usage referencing "tag" through the rename.
+            conn.execute(db.text("PRAGMA legacy_alter_table = ON"))
+            conn.execute(db.text("ALTER TABLE tag RENAME TO _tag_legacy"))
+            conn.execute(db.text("PRAGMA legacy_alter_table = OFF"))
+            Tag.__table__.create(conn)
+            conn.execute(db.text(f"INSERT INTO tag ({columns}) SELECT {columns} FROM _tag_legacy"))
+            conn.execute(db.text("DROP TABLE _tag_legacy"))
+        else:
+            for constraint in legacy:
+                conn.execute(db.text(f"ALTER TABLE tag DROP CONSTRAINT {quote(constraint['name'])}"))
+    logger.info("Made tag names unique per user")
+
+
+def ensure_schema():
+    import search
+    import tags
+
+    existing = set(db.inspect(db.engine).get_table_names())
+    db.create_all()
+    ensure_columns()
+    ensure_tag_uniqueness()
+    ensure_indexes()
+    search.ensure_search_schema()
+    if "tag_usage" not in existing:
+        tags.rebuild_tag_usage()
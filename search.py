@@ -0,0 +1,249 @@
+"""Full-text search over note titles, content and tags.
+
+On PostgreSQL notes carry a weighted ``search_vector`` tsvector column with
+a GIN index.  On SQLite an FTS5 table (``note_fts``, rowid = note id) stands
+in for local runs.  Both are refreshed from a session ``after_flush`` hook,
+so any ORM write keeps the index current; bulk Core writes call
+``index_notes`` themselves.
+"""
+import re
+import html
+import logging
+
+from sqlalchemy import event, text, bindparam
+from sqlalchemy.orm import Session
+
+from app import db
+from models import Note
+
+logger = logging.getLogger(__name__)
+
+SEARCH_PAGE_SIZE = 20
+REINDEX_BATCH_SIZE = 1000
+
+# Control characters never appear in note text, so they can mark highlights
+# inside the raw snippet and be swapped for <mark> after HTML escaping.
+_HL_START, _HL_STOP = "\x02", "\x03"
+
+_backend = None
+
+
+def backend() -> str:
+    """Return 'postgres', 'fts5' or 'like' for the bound database."""
+    global _backend
+    if _backend is None:
+        dialect = db.engine.dialect.name
+        _backend = {"postgresql": "postgres", "sqlite": "fts5"}.get(dialect, "like")
+    return _backend
+
+
+def ensure_search_schema():
+    """Create the search column/table and index, backfilling on first creation."""
+    global _backend
+    created = False
+    with db.engine.begin() as conn:
+        if backend() == "postgres":
+            exists = conn.execute(text(
+                "SELECT 1 FROM information_schema.columns "
+                "WHERE table_name = 'note' AND column_name = 'search_vector'"
+            )).first()
+            if not exists:
+                conn.execute(text("ALTER TABLE note ADD COLUMN search_vector tsvector"))
+                created = True
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_note_search_vector ON note USING GIN (search_vector)"
+            ))
+        elif backend() == "fts5":
+            exists = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'note_fts'"
+            )).first()
+            if not exists:
+                try:
+                    conn.execute(text(
+                        "CREATE VIRTUAL TABLE note_fts USING fts5(title, content, tags, tokenize='porter unicode61')"
+                    ))
+                    created = True
+                except Exception as e:
+                    logger.warning(f"SQLite FTS5 unavailable, falling back to LIKE search: {str(e)}")
+                    _backend = "like"
+    if created:
+        rebuild_search_index()
+
+
+_TAG_NAMES_SQL = {
+    "postgres": "SELECT string_agg(t.name, ' ') FROM note_tags nt JOIN tag t ON t.id = nt.tag_id WHERE nt.note_id = note.id",
+    "fts5": "SELECT group_concat(t.name, ' ') FROM note_tags nt JOIN tag t ON t.id = nt.tag_id WHERE nt.note_id = note.id",
+}
+
+
+def index_notes(conn, note_ids):
+    """Refresh the search index rows for ``note_ids`` on ``conn``."""
+    note_ids = list(note_ids)
+    if not note_ids or backend() == "like":
+        return
+    ids = bindparam("ids", expanding=True)
+    if backend() == "postgres":
+        conn.execute(text(
+            "UPDATE note SET search_vector = "
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            f"setweight(to_tsvector('english', coalesce(({_TAG_NAMES_SQL['postgres']}), '')), 'B') || "
+            "setweight(to_tsvector('english', coalesce(content, '')), 'C') "
+            "WHERE id IN :ids"
+        ).bindparams(ids), {"ids": note_ids})
+    else:
+        conn.execute(text("DELETE FROM note_fts WHERE rowid IN :ids").bindparams(ids), {"ids": note_ids})
+        conn.execute(text(
+            "INSERT INTO note_fts (rowid, title, content, tags) "
+            f"SELECT note.id, note.title, note.content, coalesce(({_TAG_NAMES_SQL['fts5']}), '') "
+            "FROM note WHERE note.id IN :ids"
+        ).bindparams(ids), {"ids": note_ids})
+
+
+def remove_notes(conn, note_ids):
+    note_ids = list(note_ids)
+    if note_ids and backend() == "fts5":
+        conn.execute(text("DELETE FROM note_fts WHERE rowid IN :ids").bindparams(
+            bindparam("ids", expanding=True)), {"ids": note_ids})
+
+
+def rebuild_search_index(batch_size: int = REINDEX_BATCH_SIZE) -> int:
+    """Re-index every note in id order; returns the number of notes indexed."""
+    total, last_id = 0, 0
+    while True:
+        with db.engine.begin() as conn:
+            ids = conn.execute(
+                db.select(Note.id).where(Note.id > last_id).order_by(Note.id).limit(batch_size)
+            ).scalars().all()
+            if not ids:
+                break
+            index_notes(conn, ids)
+        total += len(ids)
+        last_id = ids[-1]
+    logger.info(f"Search index rebuilt for {total} notes")
+    return total
+
+
+@event.listens_for(Session, "after_flush")
+def _sync_search_index(session, flush_context):
+    changed = {obj.id for obj in list(session.new) + list(session.dirty) if isinstance(obj, Note)}
+    removed = {obj.id for obj in session.deleted if isinstance(obj, Note)}
+    if not (changed or removed) or backend() == "like":
+        return
+    conn = session.connection()
+    remove_notes(conn, removed)
+    index_notes(conn, changed - removed)
+
+
+def _fts5_query(query: str) -> str:
+    """Quote each term so user input cannot inject FTS5 syntax; last term is a prefix."""
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        return ""
+    quoted = ['"%s"' % term for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _highlight(snippet: str) -> str:
+    escaped = html.escape(snippet or "")
+    return escaped.replace(_HL_START, "<mark>").replace(_HL_STOP, "</mark>")
+
+
+def encode_cursor(rank: float, note_id: int) -> str:
+    return f"{rank!r}:{note_id}"
+
+
+def decode_cursor(cursor: str):
+    try:
+        rank, note_id = cursor.rsplit(":", 1)
+        return float(rank), int(note_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+_SCOPE_SQL = "(note.user_id = :user_id OR note.id IN (SELECT note_id FROM note_share WHERE user_id = :user_id))"
+
+
+def search_notes(user_id: int, query: str, limit: int = SEARCH_PAGE_SIZE, cursor: str = None):
+    """Return ``(results, next_cursor)`` for notes owned by or shared with ``user_id``.
+
+    Results are ordered best match first.  ``next_cursor`` continues from
+    the last (rank, id) pair, so deep pages cost the same as the first.
+    """
+    query = (query or "").strip()
+    if not query:
+        return [], None
+    after = decode_cursor(cursor) if cursor else None
+    params = {"user_id": user_id, "limit": limit + 1}
+
+    if backend() == "postgres":
+        keyset = ""
+        if after:
+            keyset = "AND (ts_rank_cd(note.search_vector, q.query), note.id) < (CAST(:rank AS real), :after_id)"
+            params.update(rank=after[0], after_id=after[1])
+        sql = text(f"""
+            WITH q AS (SELECT websearch_to_tsquery('english', :query) AS query),
+            hits AS (
+                SELECT note.id, ts_rank_cd(note.search_vector, q.query) AS rank
+                FROM note, q
+                WHERE note.search_vector @@ q.query AND {_SCOPE_SQL} {keyset}
+                ORDER BY rank DESC, note.id DESC
+                LIMIT :limit
+            )
+            SELECT note.id, note.title, note.user_id, note.updated_at, hits.rank,
+                   ts_headline('english', note.content, q.query,
+                               'StartSel=' || chr(2) || ', StopSel=' || chr(3) || ', MaxWords=30, MinWords=10, MaxFragments=2') AS snippet
+            FROM hits JOIN note ON note.id = hits.id, q
+            ORDER BY hits.rank DESC, note.id DESC
+        """)
+        params["query"] = query
+        higher_is_better = True
+    elif backend() == "fts5":
+        match = _fts5_query(query)
+        if not match:
+            return [], None
+        keyset = ""
+        if after:
+            keyset = "AND (bm25(note_fts, 10.0, 1.0, 5.0) > :rank OR (bm25(note_fts, 10.0, 1.0, 5.0) = :rank AND note.id < :after_id))"
+            params.update(rank=after[0], after_id=after[1])
+        sql = text(f"""
+            SELECT note.id, note.title, note.user_id, note.updated_at,
+                   bm25(note_fts, 10.0, 1.0, 5.0) AS rank,
+                   snippet(note_fts, -1, char(2), char(3), '…', 24) AS snippet
+            FROM note_fts JOIN note ON note.id = note_fts.rowid
+            WHERE note_fts MATCH :query AND {_SCOPE_SQL} {keyset}
+            ORDER BY rank, note.id DESC
+            LIMIT :limit
+        """)
+        params["query"] = match
+        higher_is_better = False
+    else:
+        keyset = "AND note.id < :after_id" if after else ""
+        if after:
+            params["after_id"] = after[1]
+        sql = text(f"""
+            SELECT note.id, note.title, note.user_id, note.updated_at, 0.0 AS rank,
+                   substr(note.content, 1, 200) AS snippet
+            FROM note
+            WHERE (note.title LIKE :pattern OR note.content LIKE :pattern) AND {_SCOPE_SQL} {keyset}
+            ORDER BY note.id DESC
+            LIMIT :limit
+        """)
+        params["pattern"] = f"%{query}%"
+        higher_is_better = True
+
+    rows = db.session.execute(sql, params).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].rank, rows[-1].id)
+
+    results = [{
+        "id": row.id,
+        "title": row.title,
+        "snippet": _highlight(row.snippet),
+        "rank": row.rank if higher_is_better else -row.rank,
+        "owned": row.user_id == user_id,
+        "updated_at": row.updated_at.isoformat() if hasattr(row.updated_at, "isoformat") else row.updated_at
+    } for row in rows]
+    return results, next_cursor
@@ -0,0 +1,138 @@
+"""Coalesce identical in-flight calls, within a process and across workers.
+
+Concurrent callers with the same key share one upstream call: the first
+becomes the leader and the rest wait for its result (or its exception).
+Across worker processes on one host the leader also holds an ``flock`` on
+a lock file striped by key; a leader that had to wait for the lock checks
+the shared cache (``recheck``) first, so a result another worker just
+stored is reused instead of recomputed.  Without ``fcntl`` only threads in
+the same process are coalesced.
+"""
+import os
+import time
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SINGLEFLIGHT_DIR = os.environ.get("SINGLEFLIGHT_DIR") or os.path.join(tempfile.gettempdir(), "notes-singleflight")
+SINGLEFLIGHT_LOCK_SLOTS = int(os.environ.get("SINGLEFLIGHT_LOCK_SLOTS", 1024))
+SINGLEFLIGHT_WAIT = float(os.environ.get("SINGLEFLIGHT_WAIT", 180))  # seconds a follower waits before calling itself
+SINGLEFLIGHT_POLL = 0.05  # seconds between non-blocking lock attempts
+
+_stats = {"leaders": 0, "coalesced": 0, "cross_process": 0, "lock_timeouts": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name: str):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def stats() -> dict:
+    """Counters; ``saved_calls`` is how many upstream calls coalescing avoided."""
+    with _stats_lock:
+        result = dict(_stats)
+    result["saved_calls"] = result["coalesced"] + result["cross_process"]
+    result["in_flight"] = len(_calls)
+    return result
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_calls = {}
+_calls_lock = threading.Lock()
+
+
+def _lock_path(key: str) -> str:
+    slot = int(key[:8], 16) % SINGLEFLIGHT_LOCK_SLOTS if len(key) >= 8 else hash(key) % SINGLEFLIGHT_LOCK_SLOTS
+    return os.path.join(SINGLEFLIGHT_DIR, f"{slot:04d}.lock")
+
+
+@contextmanager
+def process_lock(key: str, timeout: float = SINGLEFLIGHT_WAIT):
+    """Hold the cross-process lock for ``key``; yields whether another worker held it first.
+
+    Gives up waiting after ``timeout`` and proceeds unlocked rather than
+    stalling the request.
+    """
+    if fcntl is None:
+        yield False
+        return
+    os.makedirs(SINGLEFLIGHT_DIR, exist_ok=True)
+    with open(_lock_path(key), "a+") as handle:
+        waited, locked = False, False
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                locked = True
+                break
+            except BlockingIOError:
+                waited = True
+                if time.monotonic() >= deadline:
+                    _count("lock_timeouts")
+                    logger.warning(f"Gave up waiting for single-flight lock {key[:12]}")
+                    break
+                time.sleep(SINGLEFLIGHT_POLL)
+        try:
+            yield waited
+        finally:
+            if locked:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _lead(key: str, fn, recheck):
+    with process_lock(key) as waited:
+        if waited and recheck is not None:
+            hit, value = recheck()
+            if hit:
+                _count("cross_process")
+                return value
+        _count("leaders")
+        return fn()
+
+
+def do(key: str, fn, recheck=None):
+    """Return ``fn()``, sharing one execution among concurrent callers with ``key``.
+
+    ``recheck`` returns ``(hit, value)`` from a cache that ``fn`` fills; it
+    is consulted after waiting on another worker's lock.
+    """
+    with _calls_lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = _calls[key] = _Call()
+
+    if not leader:
+        if call.done.wait(SINGLEFLIGHT_WAIT):
+            _count("coalesced")
+            if call.error is not None:
+                raise call.error
+            return call.result
+        logger.warning(f"Single-flight leader for {key[:12]} is slow; calling directly")
+        return fn()
+
+    try:
+        call.result = _lead(key, fn, recheck)
+        return call.result
+    except BaseException as e:
+        call.error = e
+        raise
+    finally:
+        with _calls_lock:
+            _calls.pop(key, None)
+        call.done.set()
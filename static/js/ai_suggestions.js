@@ -1,21 +1,43 @@
 document.addEventListener('DOMContentLoaded', function() {
     const noteContent = document.getElementById('noteContent');
     const suggestionsDiv = document.getElementById('suggestions');
+    const summaryDiv = document.getElementById('summary');
     const modelSelect = document.getElementById('modelSelect');
     let timeout = null;
 
+    function escapeHtml(text) {
+        const div = document.createElement('div');
+        div.textContent = text;
+        return div.innerHTML;
+    }
+
+    // One combined analysis call; the server also caches its parts for the
+    // summarize and suggest-tags buttons, so those answer instantly afterwards.
     if (noteContent && suggestionsDiv) {
         noteContent.addEventListener('input', function() {
             clearTimeout(timeout);
             timeout = setTimeout(async function() {
                 const content = noteContent.value;
                 const model = modelSelect.value;
+                const noteId = document.querySelector('input[name="note_id"]')?.value;
                 if (content.length > 10) {
                     try {
-                        const response = await fetch(`/api/suggestions?content=${encodeURIComponent(content)}&model=${encodeURIComponent(model)}`);
+                        const params = new URLSearchParams({ content, model });
+                        if (noteId) params.set('note_id', noteId);
+                        const response = await fetch(`/api/analyze?${params.toString()}`);
                         const data = await response.json();
+                        if (!response.ok) throw new Error(data.error || `HTTP error! status: ${response.status}`);
+
+                        let html = '';
+                        if (data.category) {
+                            html += `<p><span class="badge bg-primary">${escapeHtml(data.category)}</span></p>`;
+                        }
                         if (data.suggestions) {
-                            suggestionsDiv.innerHTML = `<p>${data.suggestions}</p>`;
+                            html += `<p>${escapeHtml(data.suggestions)}</p>`;
+                        }
+                        if (html) suggestionsDiv.innerHTML = html;
+                        if (data.summary && summaryDiv) {
+                            summaryDiv.innerHTML = `<p>${escapeHtml(data.summary)}</p>`;
                         }
                     } catch (error) {
                         console.error('Error getting suggestions:', error);
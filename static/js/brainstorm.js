@@ -14,81 +14,96 @@ document.addEventListener('DOMContentLoaded', function() {
     const mindMapDiv = document.querySelector('#mindMap');
     const initialMessage = document.querySelector('.initial-message');
 
+    let olderThreadsCursor = null;
+
     // Function to update the conversation thread
-    async function updateConversationThread() {
+    async function updateConversationThread(before = null) {
         const noteId = document.querySelector('input[name="note_id"]')?.value;
         if (!noteId) return;
 
         try {
-            const response = await fetch(`/api/note/${noteId}/interactions`);
+            const response = await fetch(`/api/note/${noteId}/interactions${before ? `?before=${before}` : ''}`);
             if (!response.ok) throw new Error('Failed to fetch interactions');
             const data = await response.json();
             
-            renderConversationThread(data.interactions);
+            renderConversationThread(data.interactions, Boolean(before));
+            olderThreadsCursor = data.next_before;
+            renderLoadOlderButton();
         } catch (error) {
             console.error('Error updating conversation thread:', error);
         }
     }
 
-    // Function to render the conversation thread
-    function renderConversationThread(interactions) {
-        if (!aiThread) return;
+    function renderLoadOlderButton() {
+        aiThread?.querySelector('.load-older-btn')?.remove();
+        if (!aiThread || !olderThreadsCursor) return;
 
-        aiThread.innerHTML = interactions.length ? '' : '<p class="text-muted">Start a conversation by using the AI tools...</p>';
+        const button = document.createElement('button');
+        button.className = 'btn btn-sm btn-outline-secondary load-older-btn';
+        button.textContent = 'Load older';
+        button.addEventListener('click', () => updateConversationThread(olderThreadsCursor));
+        aiThread.appendChild(button);
+    }
+
+    // Build one interaction with its chain insights and nested replies
+    function buildThreadItem(interaction) {
+        const threadItem = document.createElement('div');
+        threadItem.className = 'thread-item mb-3';
+        threadItem.dataset.interactionId = interaction.id;
         
-        interactions.forEach(interaction => {
-            const threadItem = document.createElement('div');
-            threadItem.className = 'thread-item mb-3';
-            threadItem.dataset.interactionId = interaction.id;
-            
-            threadItem.innerHTML = `
-                <div class="d-flex justify-content-between">
-                    <small class="text-muted">${interaction.model}</small>
-                    <small class="text-muted">${new Date(interaction.created_at).toLocaleString()}</small>
-                </div>
-                <div class="content">${interaction.content}</div>
-                <div class="actions mt-2">
-                    <button class="btn btn-sm btn-outline-primary reply-btn">Reply</button>
-                    <button class="btn btn-sm btn-outline-success add-to-note-btn">Add to Note</button>
-                </div>
-            `;
-            
-            if (interaction.metadata?.chain_insights) {
-                const responsesDiv = document.createElement('div');
-                responsesDiv.className = 'responses ms-4 mt-2';
-                interaction.metadata.chain_insights.forEach(insight => {
-                    responsesDiv.innerHTML += `
-                        <div class="response-item mb-2">
-                            <small class="text-muted">${insight.model}</small>
-                            <div class="content">${insight.content}</div>
-                        </div>
-                    `;
-                });
-                threadItem.appendChild(responsesDiv);
-            }
-            
-            aiThread.insertBefore(threadItem, aiThread.firstChild);
+        threadItem.innerHTML = `
+            <div class="d-flex justify-content-between">
+                <small class="text-muted">${interaction.model}</small>
+                <small class="text-muted">${new Date(interaction.created_at).toLocaleString()}</small>
+            </div>
+            <div class="content">${interaction.content}</div>
+            <div class="actions mt-2">
+                <button class="btn btn-sm btn-outline-primary reply-btn">Reply</button>
+                <button class="btn btn-sm btn-outline-success add-to-note-btn">Add to Note</button>
+            </div>
+        `;
+
+        threadItem.querySelector('.add-to-note-btn').addEventListener('click', () => {
+            appendToNote(threadItem.querySelector('.content').textContent);
+        });
+        threadItem.querySelector('.reply-btn').addEventListener('click', () => {
+            handleReply(interaction.id, noteContent.value);
         });
         
-        // Attach event listeners to new elements
-        attachThreadEventListeners();
+        if (interaction.metadata?.chain_insights) {
+            const insightsDiv = document.createElement('div');
+            insightsDiv.className = 'responses ms-4 mt-2';
+            interaction.metadata.chain_insights.forEach(insight => {
+                insightsDiv.innerHTML += `
+                    <div class="response-item mb-2">
+                        <small class="text-muted">${insight.model}</small>
+                        <div class="content">${insight.content}</div>
+                    </div>
+                `;
+            });
+            threadItem.appendChild(insightsDiv);
+        }
+
+        if (interaction.responses?.length) {
+            const repliesDiv = document.createElement('div');
+            repliesDiv.className = 'replies ms-4 mt-2';
+            interaction.responses.forEach(reply => repliesDiv.appendChild(buildThreadItem(reply)));
+            threadItem.appendChild(repliesDiv);
+        }
+
+        return threadItem;
     }
 
-    // Function to attach event listeners to thread items
-    function attachThreadEventListeners() {
-        document.querySelectorAll('.add-to-note-btn').forEach(button => {
-            button.addEventListener('click', function() {
-                const content = this.closest('.thread-item').querySelector('.content').textContent;
-                appendToNote(content);
-            });
-        });
+    // Function to render the conversation thread (newest thread first)
+    function renderConversationThread(interactions, append = false) {
+        if (!aiThread) return;
 
-        document.querySelectorAll('.reply-btn').forEach(button => {
-            button.addEventListener('click', function() {
-                const interactionId = this.closest('.thread-item').dataset.interactionId;
-                const content = noteContent.value;
-                handleReply(interactionId, content);
-            });
+        if (!append) {
+            aiThread.innerHTML = interactions.length ? '' : '<p class="text-muted">Start a conversation by using the AI tools...</p>';
+        }
+        
+        interactions.forEach(interaction => {
+            aiThread.appendChild(buildThreadItem(interaction));
         });
     }
 
@@ -128,12 +143,7 @@ document.addEventListener('DOMContentLoaded', function() {
         try {
             const response = await fetch(`/api/${endpoint}?content=${encodeURIComponent(content)}&model=${encodeURIComponent(model)}${noteId ? `&note_id=${noteId}` : ''}`);
             if (!response.ok) throw new Error('Failed to fetch data');
-            const data = await response.json();
-            
-            // Update conversation thread after each interaction
-            await updateConversationThread();
-            
-            return data;
+            return await response.json();
         } catch (error) {
             console.error(`Error fetching ${endpoint}:`, error);
             return null;
@@ -176,11 +186,89 @@ document.addEventListener('DOMContentLoaded', function() {
         initialMessage.style.display = 'none';
     }
 
+    function createStreamBlock(contentDiv, stream, model) {
+        const block = document.createElement('div');
+        if (stream === 'base') {
+            block.className = 'primary-content';
+        } else {
+            block.className = 'card mb-2';
+            block.innerHTML = `
+                <div class="card-body">
+                    <h6 class="card-subtitle mb-2 text-muted"></h6>
+                    <p class="card-text"></p>
+                </div>
+            `;
+            block.querySelector('.card-subtitle').textContent = stream === model ? model : `${stream} (${model})`;
+        }
+        block.style.whiteSpace = 'pre-wrap';
+        contentDiv.appendChild(block);
+        return block.querySelector('.card-text') || block;
+    }
+
+    // Stream tokens from the SSE variant of an endpoint, one block per model stream.
+    // Resolves with the final payload (same shape as the buffered endpoint) or null.
+    function streamBrainstormingData(endpoint, container) {
+        const content = noteContent.value;
+        const noteId = document.querySelector('input[name="note_id"]')?.value;
+
+        if (!content) {
+            alert('Please enter some content first.');
+            return Promise.resolve(null);
+        }
+
+        const params = new URLSearchParams({ content: content, model: modelSelect.value });
+        if (noteId) params.set('note_id', noteId);
+
+        const contentDiv = container.querySelector('.content');
+        contentDiv.innerHTML = '';
+        container.style.display = 'block';
+        initialMessage.style.display = 'none';
+
+        return new Promise(resolve => {
+            const source = new EventSource(`/api/stream/${endpoint}?${params.toString()}`);
+            const blocks = {};
+
+            source.addEventListener('start', event => {
+                const data = JSON.parse(event.data);
+                blocks[data.stream] = createStreamBlock(contentDiv, data.stream, data.model);
+            });
+
+            source.addEventListener('token', event => {
+                const data = JSON.parse(event.data);
+                if (blocks[data.stream]) blocks[data.stream].textContent += data.text;
+            });
+
+            source.addEventListener('error', event => {
+                if (!event.data) return;
+                const data = JSON.parse(event.data);
+                if (blocks[data.stream]) {
+                    blocks[data.stream].innerHTML += `<br><small class="text-danger">Error: ${data.error}</small>`;
+                }
+            });
+
+            source.addEventListener('complete', event => {
+                source.close();
+                resolve(JSON.parse(event.data));
+            });
+
+            // Connection-level failure (no data): stop reconnect attempts.
+            source.onerror = () => {
+                if (source.readyState !== EventSource.CLOSED) {
+                    source.close();
+                    resolve(null);
+                }
+            };
+        });
+    }
+
     async function handleBrainstorming(endpoint, container, buttonElement) {
         buttonElement.disabled = true;
+        const buttonLabel = buttonElement.textContent;
         buttonElement.innerHTML = '<span class="spinner-border spinner-border-sm"></span> Processing...';
         
-        const data = await fetchBrainstormingData(endpoint);
+        const data = typeof EventSource !== 'undefined'
+            ? await streamBrainstormingData(endpoint, container)
+            : await fetchBrainstormingData(endpoint);
         
         if (data) {
             let content = '';
@@ -197,10 +285,12 @@ document.addEventListener('DOMContentLoaded', function() {
                 content = data.mind_map;
                 updateUISection(container, content);
             }
+            // Update conversation thread after each interaction
+            await updateConversationThread();
         }
 
         buttonElement.disabled = false;
-        buttonElement.textContent = buttonElement.textContent.replace('Processing...', '').trim();
+        buttonElement.textContent = buttonLabel;
     }
 
     if (expandIdeasBtn) {
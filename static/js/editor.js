@@ -4,6 +4,16 @@ document.addEventListener('DOMContentLoaded', function() {
     const summarizeBtn = document.getElementById('summarizeBtn');
     const summaryDiv = document.getElementById('summary');
     const modelSelect = document.getElementById('modelSelect');
+    const noteId = document.querySelector('input[name="note_id"]')?.value;
+    let savedContent = noteContent ? noteContent.value : '';
+
+    // Saved notes are referenced by id; the body is only sent when it has unsaved edits.
+    function contentParams(content, model) {
+        const params = new URLSearchParams({ model });
+        if (noteId) params.set('note_id', noteId);
+        if (!noteId || content !== savedContent) params.set('content', content);
+        return params.toString();
+    }
 
     if (enhanceBtn) {
         enhanceBtn.addEventListener('click', async function() {
@@ -12,11 +22,12 @@ document.addEventListener('DOMContentLoaded', function() {
             try {
                 enhanceBtn.disabled = true;
                 enhanceBtn.innerHTML = '<span class="spinner-border spinner-border-sm"></span> Enhancing...';
-                const response = await fetch(`/api/enhance?content=${encodeURIComponent(content)}&model=${encodeURIComponent(model)}`);
+                const response = await fetch(`/api/enhance?${contentParams(content, model)}`);
                 if (!response.ok) throw new Error('Failed to enhance note');
                 const data = await response.json();
                 if (data.enhanced) {
                     noteContent.value = data.enhanced;
+                    noteContent.dispatchEvent(new Event('input'));
                 }
             } catch (error) {
                 console.error('Error enhancing note:', error);
@@ -28,6 +39,224 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
+    // Debounced delta autosave for saved notes: only the changed span of the
+    // content, a changed title and added/removed tags are sent, against the
+    // version last synced (see autosave.py for the format).
+    const AUTOSAVE_DELAY = 1500;       // ms of quiet before saving
+    const AUTOSAVE_MAX_WAIT = 10000;   // ms; save at least this often while typing
+    const CONTEXT_CHARS = 16;          // text around each splice, for merging
+
+    const noteForm = noteContent ? noteContent.form : null;
+    const titleInput = noteForm ? noteForm.querySelector('input[name="title"]') : null;
+    const versionInput = noteForm ? noteForm.querySelector('input[name="version"]') : null;
+    const tagContainer = document.getElementById('tagContainer');
+    const autosaveStatus = document.getElementById('autosaveStatus');
+    const conflictBox = document.getElementById('autosaveConflict');
+
+    function currentTags() {
+        return Array.from(tagContainer.querySelectorAll('input[name="tags[]"]')).map(input => input.value);
+    }
+
+    function isHighSurrogate(code) { return code >= 0xD800 && code <= 0xDBFF; }
+    function isLowSurrogate(code) { return code >= 0xDC00 && code <= 0xDFFF; }
+
+    // One splice turning oldText into newText: common prefix and suffix trimmed.
+    function diffSplice(oldText, newText) {
+        if (oldText === newText) return null;
+        let start = 0;
+        const shorter = Math.min(oldText.length, newText.length);
+        while (start < shorter && oldText.charCodeAt(start) === newText.charCodeAt(start)) start++;
+        let oldEnd = oldText.length;
+        let newEnd = newText.length;
+        while (oldEnd > start && newEnd > start && oldText.charCodeAt(oldEnd - 1) === newText.charCodeAt(newEnd - 1)) {
+            oldEnd--;
+            newEnd--;
+        }
+        // Never split a surrogate pair between the splice and its context
+        if (start > 0 && isHighSurrogate(oldText.charCodeAt(start - 1))) start--;
+        if (oldEnd < oldText.length && isLowSurrogate(oldText.charCodeAt(oldEnd))) {
+            oldEnd++;
+            newEnd++;
+        }
+        let before = oldText.slice(Math.max(0, start - CONTEXT_CHARS), start);
+        let after = oldText.slice(oldEnd, oldEnd + CONTEXT_CHARS);
+        if (before && isLowSurrogate(before.charCodeAt(0))) before = before.slice(1);
+        if (after && isHighSurrogate(after.charCodeAt(after.length - 1))) after = after.slice(0, -1);
+        return {
+            start,
+            delete: oldText.slice(start, oldEnd),
+            insert: newText.slice(start, newEnd),
+            before,
+            after
+        };
+    }
+
+    // Re-apply a splice to text that changed underneath it, as the server merges.
+    function rebaseSplice(text, splice) {
+        const needle = splice.before + splice.delete + splice.after;
+        if (!needle) return null;
+        const hint = splice.start - splice.before.length;
+        let found = -1;
+        for (let at = text.indexOf(needle); at !== -1; at = text.indexOf(needle, at + 1)) {
+            if (found === -1 || Math.abs(at - hint) < Math.abs(found - hint)) found = at;
+        }
+        if (found === -1) return null;
+        const start = found + splice.before.length;
+        return text.slice(0, start) + splice.insert + text.slice(start + splice.delete.length);
+    }
+
+    if (noteId && noteForm && titleInput && tagContainer) {
+        let synced = {
+            title: titleInput.value,
+            content: noteContent.value,
+            tags: currentTags(),
+            version: parseInt(versionInput ? versionInput.value : '1', 10) || 1
+        };
+        let timer = null;
+        let firstPendingAt = 0;
+        let inFlight = null;
+        let paused = false;
+        let conflictState = null;
+
+        function setStatus(text) {
+            if (autosaveStatus) autosaveStatus.textContent = text;
+        }
+
+        function markSynced(state) {
+            synced = state;
+            savedContent = state.content;
+            if (versionInput) versionInput.value = state.version;
+        }
+
+        function buildPatch() {
+            const snapshot = { title: titleInput.value, content: noteContent.value, tags: currentTags() };
+            const patch = {};
+            const splice = diffSplice(synced.content, snapshot.content);
+            if (splice) {
+                patch.content_ops = [splice];
+                patch.content_length = snapshot.content.length;
+            }
+            if (snapshot.title !== synced.title) {
+                patch.title = snapshot.title;
+                patch.title_base = synced.title;
+            }
+            const added = snapshot.tags.filter(tag => !synced.tags.includes(tag));
+            const removed = synced.tags.filter(tag => !snapshot.tags.includes(tag));
+            if (added.length) patch.tags_add = added;
+            if (removed.length) patch.tags_remove = removed;
+            return Object.keys(patch).length ? { patch, snapshot } : null;
+        }
+
+        // The server merged other edits in; carry over anything typed while the request was out.
+        function adoptMerged(data, snapshot) {
+            let content = data.content;
+            if (noteContent.value !== snapshot.content) {
+                const typed = diffSplice(snapshot.content, noteContent.value);
+                content = rebaseSplice(data.content, typed);
+                if (content === null) return false;
+            }
+            if (titleInput.value === snapshot.title) titleInput.value = data.title;
+            noteContent.value = content;
+            // Tag deltas are by name, so tags added elsewhere are not ours to remove.
+            markSynced({ title: data.title, content: data.content, tags: snapshot.tags, version: data.version });
+            return true;
+        }
+
+        function showConflict(data) {
+            paused = true;
+            conflictState = data;
+            setStatus('Not saved');
+            if (conflictBox) conflictBox.style.display = '';
+        }
+
+        function resolveConflict(useTheirs) {
+            const data = conflictState;
+            if (!data) return;
+            if (useTheirs) {
+                titleInput.value = data.title;
+                noteContent.value = data.content;
+            }
+            markSynced({ title: data.title, content: data.content, tags: currentTags(), version: data.version });
+            paused = false;
+            conflictState = null;
+            if (conflictBox) conflictBox.style.display = 'none';
+            scheduleAutosave();
+        }
+
+        async function sendPatch(change) {
+            setStatus('Saving...');
+            const response = await fetch(`/api/note/${noteId}`, {
+                method: 'PATCH',
+                headers: { 'Content-Type': 'application/json', 'If-Match': `"v${synced.version}"` },
+                body: JSON.stringify(change.patch),
+                keepalive: document.visibilityState === 'hidden'
+            });
+            const data = await response.json().catch(() => ({}));
+            if (response.ok) {
+                if (data.merged && !adoptMerged(data, change.snapshot)) {
+                    showConflict(data);
+                    return false;
+                }
+                if (!data.merged) markSynced(Object.assign({}, change.snapshot, { version: data.version }));
+                setStatus('Saved');
+                return true;
+            }
+            if (response.status === 409) {
+                showConflict(data);
+                return false;
+            }
+            throw new Error(data.error || `Autosave failed (${response.status})`);
+        }
+
+        // Save now; resolves true once everything typed so far is on the server.
+        async function flushAutosave() {
+            clearTimeout(timer);
+            timer = null;
+            firstPendingAt = 0;
+            while (inFlight) await inFlight.catch(() => {});
+            if (paused) return false;
+            const change = buildPatch();
+            if (!change) return true;
+            inFlight = sendPatch(change);
+            try {
+                return await inFlight;
+            } catch (error) {
+                console.error('Autosave error:', error);
+                setStatus('Autosave failed; retrying');
+                scheduleAutosave();
+                return false;
+            } finally {
+                inFlight = null;
+            }
+        }
+
+        function scheduleAutosave() {
+            if (paused) return;
+            const now = Date.now();
+            if (!firstPendingAt) firstPendingAt = now;
+            clearTimeout(timer);
+            const delay = Math.min(AUTOSAVE_DELAY, Math.max(0, firstPendingAt + AUTOSAVE_MAX_WAIT - now));
+            timer = setTimeout(flushAutosave, delay);
+            setStatus('Unsaved changes');
+        }
+
+        titleInput.addEventListener('input', scheduleAutosave);
+        noteContent.addEventListener('input', scheduleAutosave);
+        new MutationObserver(scheduleAutosave).observe(tagContainer, { childList: true });
+        document.addEventListener('visibilitychange', function() {
+            if (document.visibilityState === 'hidden' && timer) flushAutosave();
+        });
+
+        document.getElementById('useTheirsBtn')?.addEventListener('click', () => resolveConflict(true));
+        document.getElementById('keepMineBtn')?.addEventListener('click', () => resolveConflict(false));
+
+        // Save goes through the same delta path, then returns to the list.
+        noteForm.addEventListener('submit', async function(event) {
+            event.preventDefault();
+            if (await flushAutosave()) window.location.href = '/';
+        });
+    }
+
     if (summarizeBtn && summaryDiv) {
         summarizeBtn.addEventListener('click', async function() {
             const content = noteContent.value;
@@ -37,7 +266,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 summarizeBtn.innerHTML = '<span class="spinner-border spinner-border-sm"></span> Summarizing...';
                 summaryDiv.innerHTML = '<p class="text-muted">Generating summary...</p>';
                 
-                const response = await fetch(`/api/summarize?content=${encodeURIComponent(content)}&model=${encodeURIComponent(model)}`);
+                const response = await fetch(`/api/summarize?${contentParams(content, model)}`);
                 if (!response.ok) throw new Error('Failed to summarize note');
                 
                 const data = await response.json();
@@ -0,0 +1,38 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const currentTag = new URLSearchParams(window.location.search).get('tag');
+    const loading = new Set();
+
+    // Infinite scroll: fetch the next keyset page when a section's sentinel comes into view
+    async function loadNextPage(container) {
+        const cursor = container.dataset.nextCursor;
+        if (!cursor || loading.has(container.id)) return;
+        loading.add(container.id);
+
+        const params = new URLSearchParams({ section: container.dataset.section, before: cursor });
+        if (currentTag && container.dataset.section === 'own') params.set('tag', currentTag);
+
+        try {
+            const response = await fetch(`/?${params.toString()}`);
+            if (!response.ok) throw new Error('Failed to load more notes');
+            const data = await response.json();
+            container.insertAdjacentHTML('beforeend', data.html);
+            container.dataset.nextCursor = data.next_cursor || '';
+        } catch (error) {
+            console.error('Error loading notes:', error);
+        } finally {
+            loading.delete(container.id);
+        }
+    }
+
+    if (typeof IntersectionObserver === 'undefined') return;
+
+    const observer = new IntersectionObserver(entries => {
+        entries.forEach(entry => {
+            if (entry.isIntersecting) {
+                loadNextPage(document.getElementById(entry.target.dataset.target));
+            }
+        });
+    }, { rootMargin: '400px' });
+
+    document.querySelectorAll('.notes-sentinel').forEach(sentinel => observer.observe(sentinel));
+});
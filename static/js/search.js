@@ -0,0 +1,62 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const searchInput = document.getElementById('searchInput');
+    const searchResults = document.getElementById('searchResults');
+    const searchMoreBtn = document.getElementById('searchMoreBtn');
+    let timeout = null;
+    let nextCursor = null;
+
+    if (!searchInput || !searchResults) return;
+
+    function renderResults(results, append) {
+        if (!append) searchResults.innerHTML = '';
+        if (!append && results.length === 0) {
+            searchResults.innerHTML = '<div class="list-group-item text-muted">No matching notes</div>';
+            return;
+        }
+        results.forEach(result => {
+            const item = document.createElement('a');
+            item.className = 'list-group-item list-group-item-action';
+            item.href = `/note/${result.id}/edit`;
+            item.innerHTML = `
+                <div class="d-flex justify-content-between">
+                    <strong class="result-title"></strong>
+                    ${result.owned ? '' : '<span class="badge bg-secondary">Shared</span>'}
+                </div>
+                <small class="text-muted">${result.snippet}</small>
+            `;
+            item.querySelector('.result-title').textContent = result.title;
+            searchResults.appendChild(item);
+        });
+    }
+
+    async function runSearch(append = false) {
+        const query = searchInput.value.trim();
+        if (!query) {
+            searchResults.innerHTML = '';
+            searchMoreBtn.style.display = 'none';
+            return;
+        }
+
+        const params = new URLSearchParams({ q: query });
+        if (append && nextCursor) params.set('cursor', nextCursor);
+
+        try {
+            const response = await fetch(`/api/search?${params.toString()}`);
+            const data = await response.json();
+            if (!response.ok) throw new Error(data.error || 'Search failed');
+
+            renderResults(data.results, append);
+            nextCursor = data.next_cursor;
+            searchMoreBtn.style.display = nextCursor ? 'inline-block' : 'none';
+        } catch (error) {
+            console.error('Error searching notes:', error);
+        }
+    }
+
+    searchInput.addEventListener('input', function() {
+        clearTimeout(timeout);
+        timeout = setTimeout(() => runSearch(false), 300);
+    });
+
+    searchMoreBtn.addEventListener('click', () => runSearch(true));
+});
@@ -5,6 +5,8 @@ document.addEventListener('DOMContentLoaded', function() {
     const suggestedTags = document.getElementById('suggestedTags');
     const noteContent = document.getElementById('noteContent');
     const modelSelect = document.getElementById('modelSelect');
+    const noteId = document.querySelector('input[name="note_id"]')?.value;
+    const savedContent = noteContent ? noteContent.value : '';
     
     const MAX_RETRIES = 3;
     const RETRY_DELAY = 2000; // 2 seconds
@@ -107,11 +109,17 @@ document.addEventListener('DOMContentLoaded', function() {
             suggestTagsBtn.disabled = true;
             suggestTagsBtn.innerHTML = '<span class="spinner-border spinner-border-sm"></span> Suggesting...';
             
-            const response = await fetch(`/api/suggest-tags?content=${encodeURIComponent(content)}&model=${encodeURIComponent(model)}`);
+            // Saved notes are referenced by id; the body is only sent when it has unsaved edits.
+            const params = new URLSearchParams({ model });
+            if (noteId) params.set('note_id', noteId);
+            if (!noteId || content !== savedContent) params.set('content', content);
+            const response = await fetch(`/api/suggest-tags?${params.toString()}`);
             const data = await response.json();
             
             if (!response.ok) {
-                throw new Error(data.error || `HTTP error! status: ${response.status}`);
+                const httpError = new Error(data.error || `HTTP error! status: ${response.status}`);
+                httpError.status = response.status;
+                throw httpError;
             }
             
             retryCount = 0; // Reset retry counter on success
@@ -161,7 +169,9 @@ document.addEventListener('DOMContentLoaded', function() {
         } catch (error) {
             console.error('Error getting tag suggestions:', error);
             
-            if (!retry && retryCount < MAX_RETRIES) {
+            // The server already retries transient provider errors, so only
+            // network failures (no HTTP status) are worth retrying from here.
+            if (!retry && !error.status && retryCount < MAX_RETRIES) {
                 retryCount++;
                 showFeedback(`Retrying suggestion request (${retryCount}/${MAX_RETRIES})...`, 'warning', false);
                 await new Promise(resolve => setTimeout(resolve, RETRY_DELAY));
@@ -235,7 +235,9 @@ document.addEventListener('DOMContentLoaded', function() {
 
             if (!response.ok) {
                 const errorData = await response.json();
-                throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
+                const httpError = new Error(errorData.error || `HTTP error! status: ${response.status}`);
+                httpError.status = response.status;
+                throw httpError;
             }
 
             const data = await response.json();
@@ -251,7 +253,8 @@ document.addEventListener('DOMContentLoaded', function() {
         } catch (error) {
             console.error(`Transcription attempt ${retryCount + 1} failed:`, error);
             
-            if (retryCount < MAX_RETRIES) {
+            // Segments are retried server-side; re-uploading only helps after a network failure.
+            if (!error.status && retryCount < MAX_RETRIES) {
                 updateStatus(`Retrying transcription (${retryCount + 1}/${MAX_RETRIES})...`);
                 await new Promise(resolve => setTimeout(resolve, RETRY_DELAY));
                 return transcribeWithRetry(formData, retryCount + 1);
@@ -328,6 +331,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     
                     const currentContent = noteContent.value;
                     noteContent.value = currentContent + (currentContent ? '\n\n' : '') + transcribedText;
+                    noteContent.dispatchEvent(new Event('input'));
                     resetUIState();
                     updateStatus('Transcription completed', false);
                     setTimeout(() => resetUIState(), 2000);
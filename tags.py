@@ -0,0 +1,137 @@
+"""Bulk tag resolution and incrementally maintained tag usage counts.
+
+Saving a note with N tags takes a constant number of queries: one lookup
+for existing tags, one batched insert for new ones, and at most two counter
+updates.  ``tag_usage.note_count`` is adjusted only for links that actually
+change, so tag suggestions and the filter dropdown read precomputed counts.
+"""
+import logging
+from datetime import datetime
+
+from app import db
+from models import Tag, TagUsage, note_tags
+from exporter import record_changes
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_tag_names(names) -> list:
+    """Strip and de-duplicate tag names, keeping first-seen order."""
+    seen, result = set(), []
+    for name in names:
+        name = (name or "").strip()
+        if name and name not in seen:
+            seen.add(name)
+            result.append(name)
+    return result
+
+
+def _insert_new(model):
+    """A bulk INSERT that skips rows a concurrent transaction already created, where the backend allows."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return db.insert(model)
+    return insert(model).on_conflict_do_nothing()
+
+
+def resolve_tags(user_id: int, names) -> dict:
+    """Return ``{name: Tag}`` for ``names``, creating any that do not exist yet."""
+    names = normalize_tag_names(names)
+    if not names:
+        return {}
+    found = {tag.name: tag for tag in Tag.query.filter(Tag.user_id == user_id, Tag.name.in_(names))}
+    missing = [name for name in names if name not in found]
+    if missing:
+        # Core executemany rather than ORM inserts, which fall back to one
+        # INSERT ... RETURNING per row on some backends.
+        now = datetime.utcnow()
+        db.session.execute(_insert_new(Tag), [
+            {"name": name, "user_id": user_id, "created_at": now} for name in missing
+        ])
+        created = Tag.query.filter(Tag.user_id == user_id, Tag.name.in_(missing)).all()
+        db.session.execute(_insert_new(TagUsage), [
+            {"tag_id": tag.id, "user_id": user_id, "note_count": 0} for tag in created
+        ])
+        found.update((tag.name, tag) for tag in created)
+    return found
+
+
+def adjust_usage(tag_ids, delta: int):
+    """Add ``delta`` to the usage count of every tag in ``tag_ids`` in one statement."""
+    tag_ids = list(tag_ids)
+    if not tag_ids:
+        return
+    db.session.flush()
+    TagUsage.query.filter(TagUsage.tag_id.in_(tag_ids)).update(
+        {TagUsage.note_count: TagUsage.note_count + delta}, synchronize_session=False
+    )
+
+
+def apply_usage_deltas(deltas: dict):
+    """Apply ``{tag_id: delta}`` with one UPDATE per distinct delta value."""
+    by_delta = {}
+    for tag_id, delta in deltas.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(tag_id)
+    for delta, tag_ids in by_delta.items():
+        adjust_usage(tag_ids, delta)
+
+
+def set_note_tags(note, names, user_id: int):
+    """Make ``note.tags`` match ``names``, touching only the links that change."""
+    # No autoflush: a pending note would otherwise be flushed early and then
+    # lazy-load its (empty) tag collection with an extra query.
+    with db.session.no_autoflush:
+        desired = resolve_tags(user_id, names)
+        current = {tag.name: tag for tag in note.tags}
+
+    removed = [tag for name, tag in current.items() if name not in desired]
+    added = [tag for name, tag in desired.items() if name not in current]
+    for tag in removed:
+        note.tags.remove(tag)
+    note.tags.extend(added)
+
+    adjust_usage((tag.id for tag in removed), -1)
+    adjust_usage((tag.id for tag in added), 1)
+    if removed or added:
+        record_changes([note.id], "tags")
+
+
+def clear_note_tags(note):
+    """Drop a note's tag links and counts, e.g. before deleting the note."""
+    tag_ids = [tag.id for tag in note.tags]
+    note.tags.clear()
+    adjust_usage(tag_ids, -1)
+
+
+def tag_counts(user_id: int, names=None):
+    """Return ``(name, note_count)`` rows for the user's tags, most used first.
+
+    ``names`` restricts the result to those tag names (case-insensitive).
+    """
+    query = db.session.query(Tag.name, db.func.coalesce(TagUsage.note_count, 0).label("note_count")).outerjoin(
+        TagUsage, TagUsage.tag_id == Tag.id
+    ).filter(Tag.user_id == user_id)
+    if names is not None:
+        query = query.filter(db.func.lower(Tag.name).in_([name.lower() for name in names]))
+    return query.order_by(db.desc("note_count"), Tag.name).all()
+
+
+def rebuild_tag_usage() -> int:
+    """Recompute every tag's usage count from ``note_tags``; returns the tag count."""
+    TagUsage.query.delete(synchronize_session=False)
+    counts = db.session.query(
+        Tag.id, Tag.user_id, db.func.count(note_tags.c.note_id)
+    ).outerjoin(note_tags, note_tags.c.tag_id == Tag.id).group_by(Tag.id, Tag.user_id).all()
+    if counts:
+        db.session.execute(db.insert(TagUsage), [
+            {"tag_id": tag_id, "user_id": user_id, "note_count": count}
+            for tag_id, user_id, count in counts
+        ])
+    db.session.commit()
+    logger.info(f"Rebuilt usage counts for {len(counts)} tags")
+    return len(counts)
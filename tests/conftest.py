@@ -0,0 +1,96 @@
+import os
+import sys
+import itertools
+import tempfile
+
+import pytest
+from flask.testing import FlaskClient
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The app reads its configuration at import time.  Tests get a throwaway
+# SQLite database, the local fake LLM provider and no job workers, so
+# queued jobs stay pending until a test runs them with ``jobs.execute``.
+_db_dir = tempfile.mkdtemp(prefix="notes-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ["LLM_ROUTE_DEFAULT"] = "fake:fake-1"
+os.environ["FAKE_LLM_LATENCY_MS"] = "0"
+os.environ["FAKE_LLM_JITTER_MS"] = "0"
+os.environ["AI_JOB_WORKERS"] = "0"
+os.environ["AI_CACHE_PERSIST"] = "0"
+os.environ["SCHEMA_AUTO_MIGRATE"] = "0"
+
+from app import create_app, db  # noqa: E402
+
+_names = itertools.count()
+
+
+class Client(FlaskClient):
+    """Runs each request in its own app context, as a server would.
+
+    Otherwise requests reuse the context a test holds open, and with it
+    ``g`` (the logged-in user, memoized permissions) and the DB session.
+    """
+
+    def open(self, *args, **kwargs):
+        with self.application.app_context():
+            return super().open(*args, **kwargs)
+
+
+@pytest.fixture(scope="session")
+def app():
+    import schema
+
+    app = create_app()
+    app.config["TESTING"] = True
+    app.test_client_class = Client
+    with app.app_context():
+        schema.ensure_schema()
+    return app
+
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield
+        db.session.remove()
+
+
+@pytest.fixture
+def make_user(app_context):
+    """Create a user with a unique name; tests share one database."""
+    from models import User
+
+    def make(prefix="user"):
+        name = f"{prefix}{next(_names)}"
+        user = User(username=name, email=f"{name}@example.com")
+        user.set_password("pw")
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return make
+
+
+@pytest.fixture
+def make_note(app_context):
+    from models import Note
+
+    def make(user, title="Note", content="Some content", **values):
+        note = Note(title=title, content=content, user_id=user.id, **values)
+        db.session.add(note)
+        db.session.commit()
+        return note
+    return make
+
+
+@pytest.fixture
+def login(app):
+    """A test client logged in as ``user``."""
+    def client_for(user):
+        client = app.test_client()
+        response = client.post("/login", data={"username": user.username, "password": "pw"})
+        assert response.status_code == 302
+        return client
+    return client_for
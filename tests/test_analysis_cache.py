@@ -0,0 +1,43 @@
+import json
+
+import ai_stream
+import llm_cache
+from ai_helper import AIModel, analyze_concept, analyze_note, fan_out_analysis
+
+CONTENT = "Quarterly planning notes for the analysis cache test."
+ANALYSIS = {"category": "Planning", "tags": ["plans"], "summary": "Seeded summary.", "suggestions": "More detail."}
+
+
+def _prewarm(content):
+    model = AIModel.GPT4O_MINI.value
+    llm_cache.store(analyze_note.cache_key(content, model), "analyze_note", model, ANALYSIS)
+    fan_out_analysis(content, model, ANALYSIS)
+
+
+def test_summarize_default_uses_prewarmed_analysis(make_user, login):
+    _prewarm(CONTENT)
+    client = login(make_user())
+
+    assert client.get("/api/summarize", query_string={"content": CONTENT}).get_json() == {"summary": "Seeded summary."}
+    tags = client.get("/api/suggest-tags", query_string={"content": CONTENT}).get_json()
+    assert [tag["name"] for tag in tags["suggestions"]] == ["plans"]
+
+
+def test_summarize_with_explicit_model_does_not_reuse_another_models_analysis(make_user, login):
+    content = CONTENT + " Explicit model."
+    _prewarm(content)
+
+    response = login(make_user()).get("/api/summarize", query_string={"content": content, "model": "fake-1"})
+
+    assert response.status_code == 200
+    assert response.get_json()["summary"] != "Seeded summary."
+
+
+def test_streamed_analysis_uses_the_buffered_model_and_cache_key(app_context):
+    content = "A short concept for the streaming model test."
+    frames = list(ai_stream.stream_chain("analyze", content))
+
+    starts = [json.loads(frame.split("data: ", 1)[1]) for frame in frames if frame.startswith("event: start")]
+    assert {"stream": "base", "model": AIModel.GPT4O_MINI.value} in starts
+    hit, value = llm_cache.lookup(analyze_concept.cache_key(content, AIModel.GPT4O.value))
+    assert hit and value["analysis"]
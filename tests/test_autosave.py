@@ -0,0 +1,118 @@
+import pytest
+
+from app import db
+from models import Note
+import permissions
+
+
+@pytest.fixture
+def note(make_user, make_note):
+    return make_note(make_user("alice"), title="Plan", content="Hello world")
+
+
+def _patch(client, note_id, version, **data):
+    return client.patch(f"/api/note/{note_id}", json=data, headers={"If-Match": f'"v{version}"'})
+
+
+def _reload(note_id):
+    db.session.expire_all()
+    return db.session.get(Note, note_id)
+
+
+def test_exact_patch_applies_and_bumps_the_version(note, login):
+    client = login(note.author)
+
+    response = _patch(client, note.id, 1, content_ops=[
+        {"start": 6, "delete": "world", "insert": "there 👋", "before": "Hello ", "after": ""}
+    ], content_length=14)
+
+    assert response.status_code == 200
+    assert response.get_json() == {"id": note.id, "version": 2, "merged": False}
+    assert response.headers["ETag"] == '"v2"'
+    assert _reload(note.id).content == "Hello there 👋"
+
+
+def test_stale_patch_is_merged(note, login):
+    client = login(note.author)
+    assert _patch(client, note.id, 1, content_ops=[
+        {"start": 0, "delete": "", "insert": "Oh, ", "before": "", "after": "Hello"}
+    ]).status_code == 200
+
+    # Made against version 1, before the insertion above shifted the text
+    response = _patch(client, note.id, 1, content_ops=[
+        {"start": 6, "delete": "world", "insert": "everyone", "before": "Hello ", "after": ""}
+    ], tags_add=["greetings"])
+
+    body = response.get_json()
+    assert response.status_code == 200
+    assert body["merged"] is True
+    assert body["version"] == 3
+    assert body["content"] == "Oh, Hello everyone"
+    assert body["tags"] == ["greetings"]
+
+
+def test_unmergeable_patch_conflicts(note, login):
+    client = login(note.author)
+    assert _patch(client, note.id, 1, content_ops=[
+        {"start": 0, "delete": "Hello world", "insert": "Goodbye", "before": "", "after": ""}
+    ]).status_code == 200
+
+    response = _patch(client, note.id, 1, content_ops=[
+        {"start": 6, "delete": "world", "insert": "everyone", "before": "Hello ", "after": ""}
+    ])
+
+    body = response.get_json()
+    assert response.status_code == 409
+    assert body["code"] == "VERSION_CONFLICT"
+    assert body["content"] == "Goodbye"
+    assert response.headers["ETag"] == '"v2"'
+    assert _reload(note.id).content == "Goodbye"
+
+
+@pytest.mark.parametrize("data", [{}, {"version": True}, {"version": "1"}])
+def test_patch_without_a_version_is_refused(note, login, data):
+    response = login(note.author).patch(f"/api/note/{note.id}", json=dict(data, title="New"))
+
+    assert response.status_code == 428
+    assert response.get_json()["code"] == "VERSION_REQUIRED"
+    assert _reload(note.id).title == "Plan"
+
+
+def test_patch_requires_edit_access(note, make_user, login):
+    viewer, stranger = make_user("viewer"), make_user("stranger")
+    permissions.grant(note.user_id, [(note.id, viewer.id, False)])
+
+    assert _patch(login(viewer), note.id, 1, title="Mine").status_code == 403
+    assert _patch(login(stranger), note.id, 1, title="Mine").status_code == 404
+    assert _patch(login(stranger), note.id + 1000, 1, title="Mine").status_code == 404
+    assert _reload(note.id).title == "Plan"
+
+
+def test_editor_tags_resolve_as_the_owners(note, make_user, login):
+    editor = make_user("editor")
+    permissions.grant(note.user_id, [(note.id, editor.id, True)])
+
+    assert _patch(login(editor), note.id, 1, tags_add=["work"]).status_code == 200
+    response = login(editor).post(f"/note/{note.id}/edit", data={
+        "title": "Plan", "content": "Hello world", "tags[]": ["work", "shared"]})
+
+    assert response.status_code == 302
+    assert sorted((tag.name, tag.user_id) for tag in _reload(note.id).tags) == \
+        [("shared", note.user_id), ("work", note.user_id)]
+
+
+def test_stale_form_save_is_not_applied(note, login):
+    client = login(note.author)
+    assert _patch(client, note.id, 1, title="Autosaved").status_code == 200
+
+    form = {"title": "From the form", "content": "Typed in an old tab", "version": "1"}
+    response = client.post(f"/note/{note.id}/edit", data=form)
+
+    assert response.status_code == 409
+    assert "Typed in an old tab" in response.get_data(as_text=True)
+    assert _reload(note.id).title == "Autosaved"
+
+    response = client.post(f"/note/{note.id}/edit", data=dict(form, version="2"))
+
+    assert response.status_code == 302
+    assert _reload(note.id).content == "Typed in an old tab"
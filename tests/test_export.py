@@ -0,0 +1,64 @@
+import time
+from datetime import datetime
+
+from app import db
+from exporter import export_records
+from models import Note
+import permissions
+from tags import set_note_tags
+
+
+def _checkpoint():
+    since = datetime.utcnow()
+    time.sleep(0.01)
+    return since
+
+
+def _export(user_id, since):
+    records = list(export_records(user_id, since))
+    return {record["id"] for record in records if record["type"] == "note"}, \
+        [record["id"] for record in records if record["type"] == "deleted"], records
+
+
+def test_incremental_export_reports_tags_shares_and_deletions(make_user, make_note, login):
+    alice, bob = make_user("alice"), make_user("bob")
+    tagged, shared, deleted, untouched = (make_note(alice, title=title) for title in ("T", "S", "D", "U"))
+    permissions.grant(alice.id, [(shared.id, bob.id, False)])
+    since = _checkpoint()
+
+    set_note_tags(db.session.get(Note, tagged.id), ["work"], alice.id)
+    db.session.commit()
+    permissions.revoke(alice.id, [(shared.id, bob.id)])
+    assert login(alice).get(f"/note/{deleted.id}/delete").status_code == 302
+
+    note_ids, deleted_ids, records = _export(alice.id, since)
+
+    assert note_ids == {tagged.id, shared.id}
+    assert deleted_ids == [deleted.id]
+    assert records[0]["incremental"] is True
+    assert records[-1]["deleted"] == 1
+    shared_record = next(record for record in records if record.get("id") == shared.id and record["type"] == "note")
+    assert shared_record["shares"] == []
+    assert untouched.id not in note_ids
+
+
+def test_share_permission_change_is_exported(make_user, make_note):
+    alice, bob = make_user("alice"), make_user("bob")
+    note = make_note(alice)
+    permissions.grant(alice.id, [(note.id, bob.id, False)])
+    since = _checkpoint()
+
+    permissions.grant(alice.id, [(note.id, bob.id, True)])
+
+    assert _export(alice.id, since)[0] == {note.id}
+
+
+def test_imported_notes_with_old_timestamps_are_exported(make_user):
+    from importer import import_notes
+
+    alice = make_user("alice")
+    since = _checkpoint()
+    list(import_notes(alice.id, [{"title": "Old", "content": "From 2019", "updated_at": "2019-01-01T00:00:00"}]))
+
+    note_ids, _, _ = _export(alice.id, since)
+    assert len(note_ids) == 1
@@ -0,0 +1,81 @@
+import pytest
+
+from app import db
+from interactions import record_interaction, load_threads, InteractionError
+from models import AIInteraction
+
+CONTENT = "A note long enough to summarize with the fake provider."
+
+
+def test_reply_to_another_notes_interaction_is_rejected(make_user, make_note, login):
+    alice, bob = make_user("alice"), make_user("bob")
+    alice_note, bob_note = make_note(alice), make_note(bob)
+    parent = record_interaction(alice_note.id, "summary", "Alice's summary", "gpt-4o")
+
+    response = login(bob).get("/api/summarize", query_string={
+        "note_id": bob_note.id, "parent_id": parent.id, "content": CONTENT})
+
+    assert response.status_code == 400
+    assert response.get_json()["code"] == "INVALID_PARENT"
+    assert AIInteraction.query.filter_by(parent_id=parent.id).count() == 0
+
+
+def test_reply_within_the_same_note_is_recorded(make_user, make_note, login):
+    alice = make_user("alice")
+    note = make_note(alice)
+    parent = record_interaction(note.id, "summary", "First summary", "gpt-4o")
+
+    response = login(alice).get("/api/summarize", query_string={
+        "note_id": note.id, "parent_id": parent.id, "content": CONTENT})
+
+    assert response.status_code == 200
+    reply = AIInteraction.query.filter_by(parent_id=parent.id).one()
+    assert reply.note_id == note.id
+
+
+def test_record_interaction_checks_the_parent(make_user, make_note):
+    alice = make_user("alice")
+    note, other = make_note(alice), make_note(alice)
+    parent = record_interaction(note.id, "summary", "Summary", "gpt-4o")
+
+    with pytest.raises(InteractionError):
+        record_interaction(other.id, "summary", "Reply", "gpt-4o", parent_id=parent.id)
+    with pytest.raises(InteractionError):
+        record_interaction(note.id, "summary", "Reply", "gpt-4o", parent_id=parent.id + 1000)
+
+
+def test_threads_only_follow_replies_on_the_same_note(make_user, make_note):
+    alice, bob = make_user("alice"), make_user("bob")
+    alice_note, bob_note = make_note(alice), make_note(bob)
+    root = record_interaction(alice_note.id, "summary", "Root", "gpt-4o")
+    reply = record_interaction(alice_note.id, "summary", "Reply", "gpt-4o", parent_id=root.id)
+    # A cross-note reply written before parents were validated
+    db.session.add(AIInteraction(note_id=bob_note.id, interaction_type="summary", content="Stray",
+                                 model_used="gpt-4o", parent_id=root.id))
+    db.session.commit()
+
+    threads, _ = load_threads(alice_note.id)
+
+    assert [thread["id"] for thread in threads] == [root.id]
+    assert [node["id"] for node in threads[0]["responses"]] == [reply.id]
+
+
+def test_reply_check_does_not_apply_to_other_routes(make_user, make_note, login):
+    alice = make_user("alice")
+    note = make_note(alice)
+
+    response = login(alice).get("/", query_string={"note_id": note.id, "parent_id": 999999})
+
+    assert response.status_code == 200
+
+
+def test_chain_reply_to_another_notes_interaction_is_rejected(make_user, make_note, login):
+    alice, bob = make_user("alice"), make_user("bob")
+    alice_note, bob_note = make_note(alice), make_note(bob)
+    parent = record_interaction(alice_note.id, "summary", "Alice's summary", "gpt-4o")
+
+    response = login(bob).get("/api/stream/expand-idea-chain", query_string={
+        "note_id": bob_note.id, "parent_id": parent.id, "content": CONTENT})
+
+    assert response.status_code == 400
+    assert response.get_json()["code"] == "INVALID_PARENT"
@@ -0,0 +1,177 @@
+import io
+import os
+
+import pytest
+
+import jobs
+from jobs import JobError
+
+
+def test_public_endpoint_rejects_internal_tasks(make_user, login, tmp_path):
+    victim = tmp_path / "victim.txt"
+    victim.write_text("keep me")
+    client = login(make_user())
+
+    response = client.post("/api/jobs", json={"task": "transcribe_audio", "payload": {"audio_path": str(victim)}})
+
+    assert response.status_code == 400
+    assert "Unknown task" in response.get_json()["error"]
+    assert victim.exists()
+
+
+def test_public_endpoint_accepts_public_tasks(make_user, login):
+    client = login(make_user())
+
+    response = client.post("/api/jobs", json={"task": "suggest_tags", "payload": {"content": "hello"}})
+
+    assert response.status_code == 202
+
+
+def test_transcribe_job_refuses_paths_outside_upload_dir(app_context, tmp_path):
+    victim = tmp_path / "victim.txt"
+    victim.write_text("keep me")
+
+    with pytest.raises(JobError):
+        jobs.execute("transcribe_audio", {"audio_path": str(victim)})
+    with pytest.raises(JobError):
+        jobs.execute("transcribe_audio", {"audio_path": os.path.join("temp_audio", os.path.relpath(victim))})
+    assert victim.exists()
+
+
+def test_reprocess_note_is_internal(make_user, make_note, login):
+    alice, bob = make_user("alice"), make_user("bob")
+    note = make_note(alice)
+
+    response = login(bob).post("/api/jobs", json={
+        "task": "reprocess_note", "payload": {"note_id": note.id, "tasks": ["analysis"]}})
+
+    assert response.status_code == 400
+
+
+def test_reprocess_note_requires_edit_access(make_user, make_note):
+    from app import db
+    from models import Note
+
+    alice, bob = make_user("alice"), make_user("bob")
+    note = make_note(alice, category="Work")
+
+    result = jobs.execute("reprocess_note", {"user_id": bob.id, "note_id": note.id, "tasks": ["embedding"]})
+    assert "skipped" in result
+    db.session.expire_all()
+    assert db.session.get(Note, note.id).content_fingerprint is None
+
+    result = jobs.execute("reprocess_note", {"user_id": alice.id, "note_id": note.id, "tasks": ["embedding"]})
+    assert result == {"note_id": note.id, "tasks": ["embedding"]}
+    db.session.expire_all()
+    assert db.session.get(Note, note.id).content_fingerprint is not None
+
+
+def test_categorize_batch_only_touches_the_jobs_user(make_user, make_note, login):
+    from app import db
+    from models import Note
+
+    alice, bob = make_user("alice"), make_user("bob")
+    note = make_note(alice, category="Personal")
+
+    response = login(bob).post("/api/jobs", json={"task": "categorize_notes_batch", "payload": {"note_ids": [note.id]}})
+    assert response.status_code == 400
+
+    result = jobs.execute("categorize_notes_batch", {"user_id": bob.id, "note_ids": [note.id]})
+    assert result == {"updated": 0}
+    db.session.expire_all()
+    assert db.session.get(Note, note.id).category == "Personal"
+
+
+def _edit_elsewhere(app, note_id, content):
+    """Save ``content`` from another session, as a concurrent request would."""
+    import fingerprints
+    from app import db
+    from models import Note
+
+    with app.app_context():
+        note = db.session.get(Note, note_id)
+        note.content = content
+        fingerprints.stamp(note)
+        db.session.commit()
+        db.session.remove()
+
+
+def _pending_reprocess_versions(note_id):
+    from models import AIJob
+
+    return [job.payload["version"] for job in AIJob.query.filter_by(task="reprocess_note", status="pending")
+            if job.payload["note_id"] == note_id]
+
+
+def test_reprocess_skips_a_note_saved_since_it_was_queued(app, make_user, make_note):
+    from models import NoteTaskState
+
+    alice = make_user("alice")
+    note = make_note(alice, content="The original text of the note")
+    _edit_elsewhere(app, note.id, "Entirely different words now")
+
+    result = jobs.execute("reprocess_note", {"user_id": alice.id, "note_id": note.id, "tasks": ["embedding"],
+                                             "version": 1})
+
+    assert result["skipped"] == "note changed"
+    assert "embedding" in result["requeued"]
+    assert NoteTaskState.query.filter_by(note_id=note.id).count() == 0
+    assert _pending_reprocess_versions(note.id) == [2]
+
+
+def test_reprocess_does_not_overwrite_an_edit_made_while_it_ran(app, make_user, make_note, monkeypatch):
+    import ai_helper
+    import fingerprints
+    from app import db
+    from models import Note, NoteTaskState
+
+    alice = make_user("alice")
+    note = make_note(alice, content="The original text of the note")
+
+    def slow_analysis(content, model):
+        _edit_elsewhere(app, note.id, "Entirely different words now")
+        return {"category": "Old", "tags": [], "summary": "", "suggestions": ""}
+
+    monkeypatch.setattr(ai_helper, "analyze_note", slow_analysis)
+    result = jobs.execute("reprocess_note", {"user_id": alice.id, "note_id": note.id, "tasks": ["analysis"],
+                                             "version": 1})
+
+    assert result["skipped"] == "note changed"
+    db.session.expire_all()
+    saved = db.session.get(Note, note.id)
+    assert saved.content_fingerprint == fingerprints.fingerprint("Entirely different words now")
+    assert saved.category is None
+    assert NoteTaskState.query.filter_by(note_id=note.id).count() == 0
+    assert _pending_reprocess_versions(note.id) == [2]
+
+
+def test_cancelling_a_pending_transcription_deletes_its_upload(make_user, login):
+    from app import db
+    from models import AIJob
+
+    client = login(make_user())
+    response = client.post("/api/jobs/transcribe", data={"audio": (io.BytesIO(b"RIFF"), "clip.wav")})
+    job = db.session.get(AIJob, response.get_json()["job_id"])
+    audio_path = job.payload["audio_path"]
+    assert os.path.exists(audio_path)
+
+    response = client.post(f"/api/jobs/{job.id}/cancel")
+
+    assert response.get_json()["cancelled"] is True
+    assert not os.path.exists(audio_path)
+
+
+def test_workers_start_with_the_app_and_restart_after_fork(app, monkeypatch):
+    assert jobs.worker_pool.started  # by create_app, without any submission
+
+    pool = jobs.JobWorkerPool()
+    pool.init_app(app)
+    monkeypatch.setattr(jobs, "AI_JOB_WORKERS", 1)
+    monkeypatch.setattr(pool, "_run", lambda requeue_stale: None)
+    pool.start()
+    inherited = pool.threads[0]
+
+    pool.after_fork()
+
+    assert pool.started
+    assert len(pool.threads) == 1 and pool.threads[0] is not inherited
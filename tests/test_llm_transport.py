@@ -0,0 +1,25 @@
+import httpx
+import pytest
+
+import llm_transport
+
+
+def _status_error(status):
+    request = httpx.Request("POST", "https://llm.example/v1/chat")
+    return httpx.HTTPStatusError("error", request=request, response=httpx.Response(status, request=request))
+
+
+def test_client_error_does_not_reset_the_failure_count(monkeypatch):
+    circuit = llm_transport.CircuitBreaker("transport-test")
+    monkeypatch.setattr(llm_transport, "breaker", lambda provider: circuit)
+    circuit.record_failure()
+    circuit.record_failure()
+
+    def bad_request(timeout):
+        raise _status_error(400)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        llm_transport.request("chat", bad_request, provider="transport-test", retries=0)
+
+    assert circuit.failures == 2
+    assert not circuit.trial_in_flight
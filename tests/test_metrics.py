@@ -0,0 +1,22 @@
+import metrics
+
+
+def test_metrics_without_a_token_answer_loopback_only(app, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", None)
+    client = app.test_client()
+
+    assert client.get("/metrics").status_code == 200
+    remote = {"REMOTE_ADDR": "203.0.113.7"}
+    assert client.get("/metrics", environ_base=remote).status_code == 404
+    assert client.get("/metrics/profiles", environ_base=remote).status_code == 404
+
+
+def test_metrics_with_a_token_require_it_from_every_address(app, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "s3cret")
+    client = app.test_client()
+
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics/profiles").status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer s3cret"},
+                          environ_base={"REMOTE_ADDR": "203.0.113.7"})
+    assert response.status_code == 200
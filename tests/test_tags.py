@@ -0,0 +1,67 @@
+from app import db
+from importer import import_notes
+from models import Note, Tag
+from tags import set_note_tags, tag_counts
+
+
+def test_users_can_share_tag_names(make_user, make_note):
+    alice, bob = make_user("alice"), make_user("bob")
+    alice_note, bob_note = make_note(alice), make_note(bob)
+
+    set_note_tags(alice_note, ["work", "ideas"], alice.id)
+    db.session.commit()
+    set_note_tags(bob_note, ["work"], bob.id)
+    db.session.commit()
+
+    alice_tag = Tag.query.filter_by(user_id=alice.id, name="work").one()
+    bob_tag = Tag.query.filter_by(user_id=bob.id, name="work").one()
+    assert alice_tag.id != bob_tag.id
+    assert [tag.name for tag in bob_note.tags] == ["work"]
+    assert tag_counts(bob.id) == [("work", 1)]
+
+
+def test_new_note_form_with_another_users_tag_name(make_user, login):
+    alice, bob = make_user("alice"), make_user("bob")
+    for user in (alice, bob):
+        response = login(user).post("/note/new", data={"title": "Plans", "content": "Quarterly plans", "tags[]": ["work"]})
+        assert response.status_code == 302
+
+    for user in (alice, bob):
+        note = Note.query.filter_by(user_id=user.id).one()
+        assert [(tag.name, tag.user_id) for tag in note.tags] == [("work", user.id)]
+
+
+def test_import_round_trip_for_two_users(make_user):
+    alice, bob = make_user("alice"), make_user("bob")
+    records = [{"title": f"Note {i}", "content": f"Body {i}", "tags": ["work", f"t{i % 2}"]} for i in range(5)]
+
+    for user in (alice, bob):
+        progress = list(import_notes(user.id, [dict(record) for record in records], chunk_size=2))
+        assert progress[-1]["imported"] == 5
+        assert progress[-1]["chunks"] == 3
+
+    for user in (alice, bob):
+        notes = Note.query.filter_by(user_id=user.id).order_by(Note.id).all()
+        assert [note.title for note in notes] == [record["title"] for record in records]
+        assert all(tag.user_id == user.id for note in notes for tag in note.tags)
+        assert dict(tag_counts(user.id)) == {"work": 5, "t0": 3, "t1": 2}
+
+
+def test_failed_import_reports_what_was_committed(make_user, login, monkeypatch):
+    import json
+    import routes
+
+    def records(*args, **kwargs):
+        for i in range(3):
+            yield {"title": f"Note {i}", "content": f"Body {i}", "tags": ["work"]}
+        raise ValueError("truncated upload")
+
+    monkeypatch.setattr(routes, "open_records", records)
+    user = make_user()
+
+    response = login(user).post("/api/import", query_string={"chunk_size": 2}, data=b"")
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert lines[-1]["error"] == "truncated upload"
+    assert lines[-1]["done"] is True
+    assert lines[-1]["imported"] == Note.query.filter_by(user_id=user.id).count() == 2
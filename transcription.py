@@ -0,0 +1,226 @@
+"""Chunked, parallel transcription of long recordings.
+
+Audio is decoded with pydub and split at pauses into segments of at most
+``TRANSCRIBE_SEGMENT_MAX_MS``.  Segments are transcribed concurrently on the
+shared AI pool, each with its own retries, and stitched back together in
+order.  Every request works in its own temporary directory.  Files pydub
+cannot decode are sent to Whisper whole, as before.
+
+Before upload, audio is downmixed to 16 kHz mono and re-encoded at a low
+bitrate, which is all Whisper uses and a fraction of what browsers record.
+Results are cached by a hash of the uploaded bytes, so a retried or
+duplicate upload returns the earlier transcript without another API call.
+"""
+import os
+import time
+import hashlib
+import shutil
+import logging
+import tempfile
+from concurrent.futures import wait, FIRST_COMPLETED
+
+from pydub import AudioSegment
+from pydub.silence import detect_silence
+from pydub.utils import which
+
+import ai_pool
+import llm_cache
+import llm_transport
+import metrics
+import singleflight
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIBE_SEGMENT_MAX_MS = int(os.environ.get("TRANSCRIBE_SEGMENT_MAX_MS", 120_000))
+TRANSCRIBE_SEGMENT_MIN_MS = int(os.environ.get("TRANSCRIBE_SEGMENT_MIN_MS", 20_000))
+TRANSCRIBE_MIN_SILENCE_MS = int(os.environ.get("TRANSCRIBE_MIN_SILENCE_MS", 500))
+TRANSCRIBE_SILENCE_OFFSET_DB = float(os.environ.get("TRANSCRIBE_SILENCE_OFFSET_DB", 16))  # below average loudness
+TRANSCRIBE_CONCURRENCY = int(os.environ.get("TRANSCRIBE_CONCURRENCY", 4))
+TRANSCRIBE_RETRIES = int(os.environ.get("TRANSCRIBE_RETRIES", 3))
+TRANSCRIBE_SEGMENT_TIMEOUT = float(os.environ.get("TRANSCRIBE_SEGMENT_TIMEOUT", 120))  # seconds
+WHISPER_MAX_BYTES = 25 * 1024 * 1024
+WHISPER_MODEL = "whisper-1"
+
+TRANSCRIBE_SAMPLE_RATE = int(os.environ.get("TRANSCRIBE_SAMPLE_RATE", 16000))
+TRANSCRIBE_EXPORT_FORMAT = os.environ.get("TRANSCRIBE_EXPORT_FORMAT", "opus")  # 'opus' or 'mp3'
+TRANSCRIBE_BITRATE = os.environ.get("TRANSCRIBE_BITRATE", "24k")
+TRANSCRIBE_CACHE_TTL = int(os.environ.get("TRANSCRIBE_CACHE_TTL", 7 * 24 * 3600))  # seconds
+TRANSCRIBE_CACHE_VERSION = 1  # Bump when segmentation or normalization changes the output
+
+TEMP_ROOT = "temp_audio"
+
+
+def request_dir() -> str:
+    """Create and return a private temporary directory for one transcription."""
+    os.makedirs(TEMP_ROOT, exist_ok=True)
+    return tempfile.mkdtemp(prefix="req-", dir=TEMP_ROOT)
+
+
+def whisper_request(audio_path: str, retries: int = None) -> str:
+    """Send one file to Whisper and return its text; raises on API errors."""
+    with open(audio_path, "rb") as audio_file, metrics.llm_call("transcribe_audio", "openai", WHISPER_MODEL):
+        response = llm_transport.transcribe(
+            timeout=TRANSCRIBE_SEGMENT_TIMEOUT,
+            retries=retries,
+            model=WHISPER_MODEL,
+            file=audio_file,
+            language="en",
+            response_format="text",
+            temperature=0.2
+        )
+    return (response or "").strip()
+
+
+def plan_segments(audio: AudioSegment, max_ms: int = TRANSCRIBE_SEGMENT_MAX_MS,
+                  min_ms: int = TRANSCRIBE_SEGMENT_MIN_MS) -> list:
+    """Return ``(start_ms, end_ms)`` ranges covering ``audio``, cut at pauses.
+
+    Each cut falls in the middle of the latest pause that keeps the segment
+    within ``max_ms`` (and at least ``min_ms`` long); with no such pause the
+    segment is cut hard at ``max_ms``.
+    """
+    length = len(audio)
+    if length <= max_ms:
+        return [(0, length)]
+    threshold = audio.dBFS - TRANSCRIBE_SILENCE_OFFSET_DB if audio.dBFS != float("-inf") else -60
+    pauses = [
+        (start + end) // 2
+        for start, end in detect_silence(audio, min_silence_len=TRANSCRIBE_MIN_SILENCE_MS,
+                                         silence_thresh=threshold, seek_step=10)
+    ]
+    segments, start = [], 0
+    while length - start > max_ms:
+        candidates = [cut for cut in pauses if start + min_ms <= cut <= start + max_ms]
+        cut = candidates[-1] if candidates else start + max_ms
+        segments.append((start, cut))
+        start = cut
+    segments.append((start, length))
+    return segments
+
+
+def _transcribe_segment(path: str, attempts: int = TRANSCRIBE_RETRIES) -> str:
+    """Transcribe one segment file; the transport retries transient failures with backoff."""
+    return whisper_request(path, retries=max(0, attempts - 1))
+
+
+def _run_bounded(paths: list, concurrency: int) -> list:
+    """Transcribe ``paths`` with at most ``concurrency`` in flight; returns ``(text, error)`` per path."""
+    results = [None] * len(paths)
+    pending, in_flight = list(enumerate(paths)), {}
+    while pending or in_flight:
+        while pending and len(in_flight) < concurrency:
+            index, path = pending.pop(0)
+            in_flight[ai_pool.submit(_transcribe_segment, path)] = index
+        oldest = min(future.submitted_at for future in in_flight)
+        wait(list(in_flight), timeout=max(0.0, oldest + TRANSCRIBE_SEGMENT_TIMEOUT - time.monotonic()),
+             return_when=FIRST_COMPLETED)
+        for future in list(in_flight):
+            overdue = time.monotonic() - future.submitted_at >= TRANSCRIBE_SEGMENT_TIMEOUT
+            if future.done() or overdue:
+                # collect() reports an overdue segment as timed out.
+                text, error = ai_pool.collect(future, TRANSCRIBE_SEGMENT_TIMEOUT)
+                results[in_flight.pop(future)] = (text or "", error)
+    return results
+
+
+def normalize(audio: AudioSegment) -> AudioSegment:
+    """Downmix to 16-bit mono at ``TRANSCRIBE_SAMPLE_RATE``."""
+    return audio.set_channels(1).set_frame_rate(TRANSCRIBE_SAMPLE_RATE).set_sample_width(2)
+
+
+def export_settings():
+    """Return ``(extension, pydub export kwargs)`` for segment files.
+
+    Opus in an Ogg container by default, or MP3; plain WAV when ffmpeg is
+    not installed (still much smaller once normalized).
+    """
+    if not which("ffmpeg"):
+        return "wav", {"format": "wav"}
+    if TRANSCRIBE_EXPORT_FORMAT == "mp3":
+        return "mp3", {"format": "mp3", "bitrate": TRANSCRIBE_BITRATE}
+    return "ogg", {"format": "ogg", "codec": "libopus", "bitrate": TRANSCRIBE_BITRATE}
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(audio_path: str) -> str:
+    return llm_cache.make_key("transcribe_audio", WHISPER_MODEL, TRANSCRIBE_CACHE_VERSION, file_digest(audio_path))
+
+
+def transcribe_file(audio_path: str, concurrency: int = TRANSCRIBE_CONCURRENCY) -> dict:
+    """Transcribe ``audio_path`` and return ``{'text', 'segments', 'errors', 'cached'}``.
+
+    ``segments`` lists ``{'index', 'start', 'end', 'text'}`` with offsets in
+    seconds.  Segments that fail after all retries are left empty and
+    reported in ``errors``; if every segment fails a RuntimeError is raised.
+    Only complete transcripts are cached; concurrent requests for the same
+    audio share one transcription.
+    """
+    key = cache_key(audio_path)
+    hit, cached = llm_cache.lookup(key)
+    if hit:
+        logger.info("Transcription served from cache")
+        return dict(cached, cached=True)
+
+    def compute():
+        result = _transcribe_uncached(audio_path, concurrency)
+        if not result["errors"]:
+            llm_cache.store(key, "transcribe_audio", WHISPER_MODEL, result, TRANSCRIBE_CACHE_TTL)
+        return dict(result, cached=False)
+
+    def recheck():
+        hit, cached = llm_cache.lookup(key)
+        return hit, dict(cached, cached=True) if hit else None
+
+    # A duplicate upload of the same audio while the first is still
+    # transcribing waits for that result instead of transcribing again.
+    return singleflight.do(key, compute, recheck=recheck)
+
+
+def _transcribe_uncached(audio_path: str, concurrency: int) -> dict:
+    try:
+        audio = AudioSegment.from_file(audio_path)
+    except Exception as e:
+        if os.path.getsize(audio_path) > WHISPER_MAX_BYTES:
+            raise RuntimeError(f"Cannot decode audio for splitting: {str(e)}")
+        logger.warning(f"Could not decode {audio_path} for splitting ({str(e)}); sending it whole")
+        text = _transcribe_segment(audio_path)
+        return {"text": text, "segments": [{"index": 0, "start": 0.0, "end": None, "text": text}], "errors": []}
+
+    audio = normalize(audio)
+    ranges = plan_segments(audio)
+    work_dir = request_dir()
+    try:
+        extension, export_kwargs = export_settings()
+        paths = []
+        for index, (start, end) in enumerate(ranges):
+            path = os.path.join(work_dir, f"segment-{index:04d}.{extension}")
+            audio[start:end].export(path, **export_kwargs)
+            paths.append(path)
+        del audio
+        uploaded = sum(os.path.getsize(path) for path in paths)
+        logger.info(f"Normalized {os.path.getsize(audio_path)} bytes to {uploaded} bytes in {len(paths)} segments")
+        started = time.monotonic()
+        results = _run_bounded(paths, max(1, concurrency))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    segments, errors = [], []
+    for index, ((start, end), (text, error)) in enumerate(zip(ranges, results)):
+        segments.append({"index": index, "start": start / 1000.0, "end": end / 1000.0, "text": text})
+        if error:
+            errors.append({"index": index, "error": error})
+    if len(errors) == len(segments):
+        raise RuntimeError(f"All {len(segments)} segments failed: {errors[0]['error']}")
+    logger.info(f"Transcribed {len(segments)} segments in {time.monotonic() - started:.2f}s ({len(errors)} failed)")
+    return {
+        "text": " ".join(segment["text"] for segment in segments if segment["text"]),
+        "segments": segments,
+        "errors": errors
+    }